@@ -0,0 +1,78 @@
+"""Import time budget check. Every module is imported in a fresh interpreter, the best
+of several runs is compared with its budget, and heavy dependencies that should
+only load on first use are reported.
+
+Usage:
+    python benchmarks/import_time.py [--repeat 5] [--scale 1.0]
+
+The exit code is 1 when a budget is exceeded or a heavy dependency is imported.
+"""
+import sys
+import json
+import pathlib
+import argparse
+import subprocess
+from typing import Dict, List, Tuple
+
+ROOT_DIR = pathlib.Path(__file__).parents[1]
+
+BUDGETS_MS: Dict[str, float] = {
+    "ticketreader.config": 50,
+    "ticketreader.strategies": 60,
+    "ticketreader.mercadona": 400,
+    "ticketreader.output": 400,
+    "ticketreader.api": 450,
+    "ticketreader.cli": 450,
+}
+"""Import time budget per module, in milliseconds"""
+
+LAZY_DEPENDENCIES = ["pandas", "numpy", "tabula", "jpype", "pypdf", "openpyxl", "pyarrow", "asyncio",
+                     "logging.config"]
+"""Modules that must not be imported by the modules above"""
+
+PROBE = """
+import sys, json, time
+start = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{"ms": elapsed, "loaded": [name for name in {lazy!r} if name in sys.modules]}}))
+"""
+
+
+def measure(module: str, repeat: int) -> Tuple[float, List[str]]:
+    """Best import time of a module in milliseconds and the heavy dependencies it loaded"""
+    best = float("inf")
+    loaded: List[str] = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, lazy=LAZY_DEPENDENCIES)],
+            cwd=ROOT_DIR, capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        best = min(best, result["ms"])
+        loaded = result["loaded"]
+    return best, loaded
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=5, help="imports per module, the best one counts")
+    parser.add_argument("--scale", type=float, default=1.0, help="budget multiplier for slower machines")
+    args = parser.parse_args()
+
+    failed = False
+    for module, budget in BUDGETS_MS.items():
+        elapsed, loaded = measure(module, repeat=args.repeat)
+        budget *= args.scale
+        status = "ok"
+        if elapsed > budget:
+            status = "over budget"
+        if loaded:
+            status = f"loads {', '.join(loaded)}"
+        failed = failed or status != "ok"
+        print(f"{module:<28} {elapsed:8.1f} ms / {budget:6.0f} ms  {status}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,274 @@
+"""Benchmark suite. A synthetic ticket corpus is generated, every scenario is run on
+it and the end-to-end and per-stage throughput are saved as JSON, so runs can be
+compared for regressions.
+
+Usage:
+    python benchmarks/run.py [--count 50] [--repeat 3] [--scenarios tabula_ticket ...]
+        [--output benchmarks/results/run.json] [--compare benchmarks/results/baseline.json]
+
+Scenarios:
+    tabula_ticket      parse_mercadona_ticket_tabula, file by file, per extraction mode
+    tabula_backend     tabula mode file by file, with the JVM started once through JPype
+                       and with a java subprocess per extraction
+    pypdf_ticket       parse_mercadona_ticket_pypdf, file by file
+    directory          parse_mercadona_tickets on the corpus directory, per worker count
+    excel_handler      ExcelHandler saving every ticket (autosave)
+    excel_batch        ExcelBatchWriter, one workbook write
+    excel_stream       ExcelStreamWriter, write-only workbook
+
+The tabula extraction mode needs Java and is skipped without it. The JPype backend
+is skipped when jpype is not installed. The exit code
+is 1 when a compared scenario is slower than the baseline beyond the tolerance.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import pathlib
+import argparse
+import functools
+import contextlib
+import importlib.util
+import platform
+import datetime
+import tempfile
+import subprocess
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+ROOT_DIR = pathlib.Path(__file__).parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from synthetic import TicketSpec, add_spec_arguments, generate_corpus, spec_from_arguments  # noqa: E402
+
+from ticketreader import config, mercadona, metrics, output  # noqa: E402
+from ticketreader.strategies import ExtractionMode  # noqa: E402
+
+RESULTS_DIR = ROOT_DIR / "benchmarks" / "results"
+TEMPLATE_FILE = config.DATA_DIR / "tickets-template.xlsx"
+SCENARIOS = ["tabula_ticket", "tabula_backend", "pypdf_ticket", "directory", "excel_handler", "excel_batch", "excel_stream"]
+DEFAULT_TOLERANCE = 0.10
+"""Allowed throughput loss against the baseline"""
+EXCEL_HANDLER_LIMIT = 20
+"""Tickets saved with ExcelHandler, which writes the whole workbook per ticket"""
+TABULA_SUBPROCESS_LIMIT = 5
+"""Tickets parsed with a java subprocess per extraction"""
+
+
+@contextlib.contextmanager
+def tabula_backend(backend: str) -> Iterator[None]:
+    """Run tabula-py extractions with the given backend: jpype, the JVM started once in
+    this process, or subprocess, a new java process per extraction"""
+    import tabula.io as tabula_io
+
+    if backend == "jpype":
+        yield
+        return
+
+    read_pdf = tabula_io.read_pdf
+    tabula_io.read_pdf = functools.partial(read_pdf, force_subprocess=True)
+    try:
+        yield
+    finally:
+        tabula_io.read_pdf = read_pdf
+        # Forced subprocess calls replace the cached backend, the next call goes back to JPype
+        tabula_io._tabula_vm = None
+
+
+def _stages(snapshot: metrics.MetricsSnapshot) -> Dict[str, Dict[str, float]]:
+    """Count and seconds of every stage and timed function"""
+    stages = {}
+    for (name, labels), histogram in sorted(snapshot.histograms.items(), key=lambda item: item[0]):
+        label = dict(labels).get("stage") or dict(labels).get("function")
+        if name in (metrics.STAGE_SECONDS, metrics.FUNCTION_SECONDS) and label:
+            stages[label] = {"count": histogram.count, "seconds": round(histogram.sum, 6)}
+    return stages
+
+
+def measure(name: str, run: Callable[[], int], repeat: int, **parameters: Any) -> Dict[str, Any]:
+    """Run a scenario repeat times and keep the fastest run with its stage timings"""
+    best: Optional[Dict[str, Any]] = None
+    for _ in range(repeat):
+        metrics.REGISTRY.reset()
+        start = time.perf_counter()
+        tickets = run()
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best["seconds"]:
+            best = {"name": name, "parameters": parameters, "tickets": tickets, "seconds": round(seconds, 6),
+                    "tickets_per_second": round(tickets / seconds, 3) if seconds else None,
+                    "stages": _stages(metrics.REGISTRY.snapshot())}
+    assert best is not None
+    print(f"{result_key(best):<40} {best['tickets']:6d} tickets {best['seconds']:9.3f} s "
+          f"{best['tickets_per_second'] or 0:9.1f} tickets/s", file=sys.stderr)
+    return best
+
+
+def result_key(result: Dict[str, Any]) -> str:
+    """Scenario name with its parameters, used to match results between runs"""
+    parameters = ",".join(f"{key}={value}" for key, value in sorted(result["parameters"].items()))
+    return f"{result['name']}[{parameters}]" if parameters else result["name"]
+
+
+def run_scenarios(corpus: pathlib.Path, scenarios: List[str], repeat: int, modes: List[ExtractionMode],
+                  workers: List[int], work_dir: pathlib.Path) -> List[Dict[str, Any]]:
+    files = sorted(corpus.glob("*.pdf"))
+    results = []
+
+    # Load the lazily imported modules before timing anything
+    for mode in modes:
+        mercadona.parse_mercadona_ticket_tabula(file_path=files[0], mode=mode)
+    mercadona.parse_mercadona_ticket_pypdf(file_path=files[0])
+
+    if "tabula_ticket" in scenarios:
+        for mode in modes:
+            def parse_tabula(mode: ExtractionMode = mode) -> int:
+                for file_path in files:
+                    mercadona.parse_mercadona_ticket_tabula(file_path=file_path, mode=mode)
+                return len(files)
+            results.append(measure("tabula_ticket", parse_tabula, repeat, mode=mode.value))
+
+    if "tabula_backend" in scenarios and ExtractionMode.TABULA in modes:
+        for backend in tabula_backends():
+            def parse_backend(backend: str = backend) -> int:
+                backend_files = files if backend == "jpype" else files[:TABULA_SUBPROCESS_LIMIT]
+                with tabula_backend(backend):
+                    for file_path in backend_files:
+                        mercadona.parse_mercadona_ticket_tabula(file_path=file_path, mode=ExtractionMode.TABULA)
+                return len(backend_files)
+            results.append(measure("tabula_backend", parse_backend, repeat, backend=backend))
+
+    if "pypdf_ticket" in scenarios:
+        from ticketreader.mercadona.pypdf import MercadonaPyPDFStrategy
+
+        def parse_pypdf() -> int:
+            strategy = MercadonaPyPDFStrategy()
+            for file_path in files:
+                mercadona.parse_mercadona_ticket_pypdf(file_path=file_path, strategy=strategy)
+            return len(files)
+        results.append(measure("pypdf_ticket", parse_pypdf, repeat))
+
+    if "directory" in scenarios:
+        for mode in modes:
+            for count in workers:
+                def parse_directory(mode: ExtractionMode = mode, count: int = count) -> int:
+                    return len(mercadona.parse_mercadona_tickets(directory_path=corpus, mode=mode, workers=count))
+                results.append(measure("directory", parse_directory, repeat, mode=mode.value, workers=count))
+
+    excel_scenarios = [name for name in scenarios if name.startswith("excel_")]
+    if excel_scenarios:
+        tickets = [mercadona.parse_mercadona_ticket_pypdf(file_path=file_path) for file_path in files]
+        destination = work_dir / "tickets.xlsx"
+
+        def save(handler_factory: Callable[[], Any], tickets: List[Any]) -> Callable[[], int]:
+            def run() -> int:
+                shutil.copyfile(TEMPLATE_FILE, destination)
+                handler = handler_factory()
+                saved = handler.save_tickets(tickets)
+                if hasattr(handler, "close"):
+                    handler.close()
+                return saved
+            return run
+
+        if "excel_handler" in excel_scenarios:
+            results.append(measure("excel_handler", save(lambda: output.ExcelHandler(file_name=destination),
+                                                         tickets[:EXCEL_HANDLER_LIMIT]), repeat))
+        if "excel_batch" in excel_scenarios:
+            results.append(measure("excel_batch", save(lambda: output.ExcelBatchWriter(file_name=destination),
+                                                       tickets), repeat))
+        if "excel_stream" in excel_scenarios:
+            results.append(measure("excel_stream", save(lambda: output.ExcelStreamWriter(file_name=destination),
+                                                        tickets), repeat))
+
+    return results
+
+
+def tabula_backends() -> List[str]:
+    """tabula-py backends available"""
+    return (["jpype"] if importlib.util.find_spec("jpype") else []) + ["subprocess"]
+
+
+def environment() -> Dict[str, Any]:
+    """Machine and revision of the run"""
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True,
+                                  text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        "time": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "revision": revision,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "java": shutil.which("java") is not None,
+        "tabula_backend": tabula_backends()[0],
+    }
+
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], tolerance: float) -> bool:
+    """Print the throughput change of every scenario. Returns whether any regressed."""
+    previous = {result_key(result): result for result in baseline["results"]}
+    regressed = False
+    for result in results:
+        key = result_key(result)
+        before = previous.get(key)
+        if before is None or not before["tickets_per_second"] or not result["tickets_per_second"]:
+            print(f"{key:<40} no baseline")
+            continue
+        ratio = result["tickets_per_second"] / before["tickets_per_second"]
+        status = "ok"
+        if ratio < 1 - tolerance:
+            status = "REGRESSION"
+            regressed = True
+        print(f"{key:<40} {before['tickets_per_second']:9.1f} -> {result['tickets_per_second']:9.1f} "
+              f"tickets/s ({ratio - 1:+.1%}) {status}")
+    return regressed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    add_spec_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per scenario, the fastest one counts")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--modes", nargs="+", type=ExtractionMode,
+                        choices=[mode.value for mode in ExtractionMode],
+                        help="tabula extraction modes (default: every mode available)")
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, min(4, os.cpu_count() or 1)],
+                        help="worker counts of the directory scenario")
+    parser.add_argument("--corpus", type=pathlib.Path, help="directory for the generated tickets (default: temporary)")
+    parser.add_argument("--output", type=pathlib.Path, help="results file (default: benchmarks/results/<time>.json)")
+    parser.add_argument("--compare", type=pathlib.Path, metavar="BASELINE", help="results file to compare with")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="throughput loss reported as a regression (default: 0.10)")
+    args = parser.parse_args()
+
+    modes = args.modes or [mode for mode in ExtractionMode
+                           if mode != ExtractionMode.TABULA or shutil.which("java")]
+    spec: TicketSpec = spec_from_arguments(args)
+
+    with tempfile.TemporaryDirectory(prefix="ticketreader-benchmark-") as work_dir:
+        corpus = args.corpus or pathlib.Path(work_dir) / "corpus"
+        generate_corpus(corpus, count=args.count, spec=spec, seed=args.seed)
+        results = run_scenarios(corpus, scenarios=args.scenarios, repeat=args.repeat, modes=modes,
+                                workers=sorted(set(args.workers)), work_dir=pathlib.Path(work_dir))
+
+    report = {
+        "environment": environment(),
+        "corpus": {"count": args.count, "seed": args.seed, **spec._asdict()},
+        "results": results,
+    }
+    output_file = args.output or RESULTS_DIR / f"{datetime.datetime.now():%Y%m%d-%H%M%S}.json"
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    output_file.write_text(json.dumps(report, indent=2))
+    print(f"Results saved to {output_file}", file=sys.stderr)
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        if baseline.get("corpus") != report["corpus"]:
+            print("Warning: the baseline was measured on a different corpus", file=sys.stderr)
+        return 1 if compare(results, baseline, tolerance=args.tolerance) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+"""Synthetic Mercadona ticket generator. Tickets are written as small PDF files with
+the layout of the real ones, with no dependency outside the standard library.
+Totals and IVA lines add up, so the parsed tickets can be checked.
+
+Usage:
+    python benchmarks/synthetic.py data/synthetic --count 100 [--unit-products 20]
+        [--bulk-products 3] [--iva-lines 3] [--pages 1] [--seed 0]
+"""
+import sys
+import zlib
+import random
+import pathlib
+import argparse
+import datetime
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+PAGE_WIDTH = 612
+MIN_PAGE_HEIGHT = 792
+ROW_HEIGHT = 14
+MARGIN = 32
+FONT_SIZE = 9
+
+QUANTITY_X = 20
+NAME_X = 70
+PRICE_X = 400
+AMOUNT_X = 540
+IVA_BASE_X = 250
+IVA_FEE_X = 450
+"""Column positions, inside the column boundaries of MercadonaTabulaStrategy.COLUMNS"""
+
+HEADER_ROWS = 7
+"""Rows before the first product"""
+
+IVA_RATES = (10, 21, 4, 5, 0, 2)
+"""IVA rates in the order they are used"""
+PRODUCT_NAMES = ("LECHE SEMI", "PAN BARRA", "HUEVOS L", "YOGUR NATURAL", "ACEITE OLIVA", "ARROZ REDONDO",
+                 "TOMATE FRITO", "AGUA MINERAL", "CAFE MOLIDO", "GALLETAS MARIA", "QUESO TIERNO", "PASTA HELICES")
+BULK_NAMES = ("PLATANO", "MANZANA GOLDEN", "TOMATE PERA", "PATATA", "CEBOLLA", "NARANJA ZUMO")
+STREETS = (("C/ PORTUGAL 37", "28943 FUENLABRADA"), ("AV. DE LA PAZ 12", "46020 VALENCIA"),
+           ("C/ MAYOR 5", "28013 MADRID"))
+
+Cell = Tuple[float, str]
+Row = List[Cell]
+
+
+class TicketSpec(NamedTuple):
+    """Shape of the generated tickets"""
+    unit_products: int = 20
+    bulk_products: int = 3
+    iva_lines: int = 3
+    pages: int = 1
+
+
+class SyntheticTicket(NamedTuple):
+    """Generated ticket: PDF contents and the values a parser should find"""
+    content: bytes
+    invoice_id: str
+    total: float
+    unit_products: int
+    bulk_products: int
+    iva_lines: int
+
+
+def _amount(value: float) -> str:
+    return f"{value:.2f}".replace(".", ",")
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def render_pdf(pages: Sequence[Sequence[Row]], width: float = PAGE_WIDTH) -> bytes:
+    """Minimal PDF with one text line per row, in a standard Type1 font"""
+    objects: List[bytes] = []
+
+    def add(obj: bytes) -> int:
+        objects.append(obj)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>")
+    pages_id = len(objects) + 1 + 2 * len(pages)
+    kids = []
+    for rows in pages:
+        height = max(MIN_PAGE_HEIGHT, len(rows) * ROW_HEIGHT + 2 * MARGIN)
+        operations = []
+        for index, row in enumerate(rows):
+            y = height - MARGIN - index * ROW_HEIGHT
+            for x, text in row:
+                operations.append(f"BT /F1 {FONT_SIZE} Tf 1 0 0 1 {x} {y} Tm ({_escape(text)}) Tj ET")
+        data = zlib.compress("\n".join(operations).encode("cp1252"))
+        contents = add(b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(data) + data + b"\nendstream")
+        kids.append(add(
+            f"<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 {width} {height}] /Contents {contents} 0 R "
+            f"/Resources << /Font << /F1 {font} 0 R >> >> >>".encode()))
+    add(f"<< /Type /Pages /Kids [{' '.join(f'{kid} 0 R' for kid in kids)}] /Count {len(kids)} >>".encode())
+    catalog = add(f"<< /Type /Catalog /Pages {pages_id} 0 R >>".encode())
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n".encode() + obj + b"\nendobj\n"
+    xref = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    output += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root {catalog} 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(output)
+
+
+def generate_ticket(spec: TicketSpec, rng: random.Random, number: int = 0) -> SyntheticTicket:
+    """Generate one ticket. Products are spread over the IVA rates so every IVA line has a base."""
+    iva_lines = max(1, min(spec.iva_lines, len(IVA_RATES)))
+    street, city = rng.choice(STREETS)
+    purchase = datetime.datetime(2023, 1, 1, 9) + datetime.timedelta(days=rng.randrange(730),
+                                                                     minutes=rng.randrange(720))
+    invoice_id = f"{rng.randrange(10000):04d}-{rng.randrange(1000):03d}-{number % 1000000:06d}"
+
+    rows: List[Row] = [
+        [(QUANTITY_X, "MERCADONA, S.A. A-46103834")],
+        [(QUANTITY_X, street)],
+        [(QUANTITY_X, city)],
+        [(QUANTITY_X, f"TELEFONO: 9{rng.randrange(10 ** 8):08d}")],
+        [(QUANTITY_X, f"{purchase:%d/%m/%Y %H:%M}  OP: {rng.randrange(10 ** 7):07d}")],
+        [(QUANTITY_X, f"FACTURA SIMPLIFICADA: {invoice_id}")],
+        [(NAME_X, "Descripcion"), (PRICE_X, "P. Unit"), (AMOUNT_X, "Importe")],
+    ]
+    amounts: Dict[int, float] = {rate: 0.0 for rate in IVA_RATES[:iva_lines]}
+    products = 0
+
+    for _ in range(spec.unit_products):
+        quantity = rng.choice((1, 1, 1, 2, 3))
+        price = rng.randrange(30, 1500) / 100
+        amount = round(quantity * price, 2)
+        row: Row = [(QUANTITY_X, str(quantity)), (NAME_X, rng.choice(PRODUCT_NAMES))]
+        if quantity > 1:
+            row.append((PRICE_X, _amount(price)))
+        row.append((AMOUNT_X, _amount(amount)))
+        rows.append(row)
+        amounts[IVA_RATES[products % iva_lines]] += amount
+        products += 1
+
+    for _ in range(spec.bulk_products):
+        weight = rng.randrange(100, 3000) / 1000
+        price = rng.randrange(50, 900) / 100
+        amount = round(weight * price, 2)
+        rows.append([(QUANTITY_X, "1"), (NAME_X, rng.choice(BULK_NAMES))])
+        rows.append([(NAME_X, f"{weight:.3f} kg".replace(".", ",")), (PRICE_X, f"{_amount(price)} €/kg"),
+                     (AMOUNT_X, _amount(amount))])
+        amounts[IVA_RATES[products % iva_lines]] += amount
+        products += 1
+
+    total = round(sum(amounts.values()), 2)
+    rows.append([(PRICE_X, "TOTAL (€)"), (AMOUNT_X, _amount(total))])
+    rows.append([(QUANTITY_X, "TARJETA BANCARIA"), (AMOUNT_X, _amount(total))])
+    rows.append([(QUANTITY_X, "IVA"), (IVA_BASE_X, "BASE IMPONIBLE (€)"), (IVA_FEE_X, "CUOTA (€)")])
+
+    total_base = total_fee = 0.0
+    for rate, amount in amounts.items():
+        base = round(amount / (1 + rate / 100), 2)
+        fee = abs(round(amount - base, 2))
+        total_base += base
+        total_fee += fee
+        rows.append([(QUANTITY_X, f"{rate}%"), (IVA_BASE_X, _amount(base)), (IVA_FEE_X, _amount(fee))])
+    rows.append([(QUANTITY_X, "TOTAL"), (IVA_BASE_X, _amount(total_base)), (IVA_FEE_X, _amount(total_fee))])
+
+    return SyntheticTicket(content=render_pdf(_paginate(rows, spec.pages)), invoice_id=invoice_id, total=total,
+                           unit_products=spec.unit_products, bulk_products=spec.bulk_products,
+                           iva_lines=iva_lines)
+
+
+def _paginate(rows: List[Row], pages: int) -> List[List[Row]]:
+    """Split rows in pages of the same size, keeping bulk product rows together"""
+    pages = max(1, min(pages, len(rows)))
+    # The header rows are always on the first page
+    size = max(-(-len(rows) // pages), HEADER_ROWS)
+    result: List[List[Row]] = [[]]
+    for row in rows:
+        # A bulk details row has no quantity, it stays with its description row
+        starts_row = row[0][0] == QUANTITY_X or row[0][0] == PRICE_X
+        if len(result[-1]) >= size and starts_row and len(result) < pages:
+            result.append([])
+        result[-1].append(row)
+    return result
+
+
+def generate_corpus(directory: pathlib.Path, count: int, spec: TicketSpec = TicketSpec(),
+                    seed: int = 0) -> List[SyntheticTicket]:
+    """Write count tickets to a directory. The same seed always writes the same files."""
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    tickets = []
+    for number in range(count):
+        ticket = generate_ticket(spec, rng, number=number)
+        (directory / f"ticket-{number:05d}.pdf").write_bytes(ticket.content)
+        tickets.append(ticket)
+    return tickets
+
+
+def add_spec_arguments(parser: argparse.ArgumentParser) -> None:
+    """Ticket shape options, shared with the benchmark runner"""
+    defaults = TicketSpec()
+    parser.add_argument("--count", type=int, default=50, help="number of tickets")
+    parser.add_argument("--unit-products", type=int, default=defaults.unit_products)
+    parser.add_argument("--bulk-products", type=int, default=defaults.bulk_products)
+    parser.add_argument("--iva-lines", type=int, default=defaults.iva_lines, choices=range(1, len(IVA_RATES) + 1))
+    parser.add_argument("--pages", type=int, default=defaults.pages, help="pages per ticket")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def spec_from_arguments(args: argparse.Namespace) -> TicketSpec:
+    return TicketSpec(unit_products=args.unit_products, bulk_products=args.bulk_products,
+                      iva_lines=args.iva_lines, pages=args.pages)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("directory", type=pathlib.Path)
+    add_spec_arguments(parser)
+    args = parser.parse_args()
+
+    generate_corpus(args.directory, count=args.count, spec=spec_from_arguments(args), seed=args.seed)
+    print(f"Generated {args.count} tickets in {args.directory}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
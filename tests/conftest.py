@@ -0,0 +1,21 @@
+import pytest
+
+from ticketreader import mercadona
+from ticketreader.parser import ParserEngine
+
+import pdfs
+
+
+@pytest.fixture
+def ticket_files(tmp_path):
+    file_paths = []
+    for number in range(5):
+        file_path = tmp_path / f"ticket-{number}.pdf"
+        file_path.write_bytes(pdfs.render_pdf([pdfs.ticket_rows(f"2345-012-{number:06d}")]))
+        file_paths.append(file_path)
+    return file_paths
+
+
+@pytest.fixture
+def tickets(ticket_files):
+    return [mercadona.parse_mercadona_ticket(file_path, engine=ParserEngine.PYPDF) for file_path in ticket_files]
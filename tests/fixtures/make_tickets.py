@@ -0,0 +1,144 @@
+"""Ticket fixtures written by an independent PDF producer. Tickets are drawn with
+matplotlib: proportional DejaVu Sans glyphs with kerning, right aligned amounts, and
+the fonts embedded as Type3 procedures or as TrueType (Type42) subsets. The expected
+tickets and the tabula dataframes of every column layout are captured with
+tabula-java, so the tests compare the single pass layout with them without Java.
+
+Usage:
+    python tests/fixtures/make_tickets.py   # needs matplotlib and Java
+"""
+import sys
+import pathlib
+from typing import List, Tuple
+
+FIXTURES_DIR = pathlib.Path(__file__).parent
+sys.path.insert(0, str(FIXTURES_DIR.parents[1]))
+
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+TOP = 750
+ROW_HEIGHT = 13.5
+FONT_SIZE = 9
+FONT_TYPES = {"type3": 3, "truetype": 42}
+"""Fixture name suffix and matplotlib pdf.fonttype"""
+
+LEFT = "left"
+RIGHT = "right"
+Cell = Tuple[float, str, str]
+"""x, text and horizontal alignment"""
+
+INVOICE_ID = "4127-023-618305"
+UNIT_PRODUCTS = [
+    (1, "LECHE SEMIDESNATADA", 0.89), (2, "PAN DE MOLDE INTEGRAL", 1.35), (1, "YOGUR GRIEGO", 1.60),
+    (6, "AGUA MINERAL 1,5L", 0.25), (1, "ACEITE OLIVA VIRGEN", 8.95), (1, "JAMÓN COCIDO", 2.45),
+    (3, "TOMATE FRITO", 0.70), (1, "PIÑA EN TROZOS", 1.20), (1, "CAFÉ MOLIDO NATURAL", 3.10),
+    (2, "GALLETAS MARÍA", 0.99), (1, "QUESO TIERNO", 4.75), (1, "PASTA HÉLICES", 0.85),
+    (4, "HUEVOS CAMPEROS", 2.19), (1, "ARROZ REDONDO", 1.15), (1, "ZUMO NARANJA 100%", 1.85),
+    (1, "DETERGENTE LÍQUIDO", 5.50), (2, "PAPEL HIGIÉNICO", 3.40), (1, "MAYONESA", 1.05),
+    (1, "ATÚN CLARO PACK-6", 4.30), (1, "ESPINACAS", 1.10), (2, "COLA ZERO 2L", 1.38),
+    (1, "CHOCOLATE 70%", 1.65), (1, "LECHUGA ICEBERG", 0.75), (1, "PECHUGA POLLO", 4.92),
+    (1, "SALMÓN AHUMADO", 3.99), (3, "CERVEZA TOSTADA", 0.79), (1, "PATATAS FRITAS", 1.40),
+    (1, "FREGONA", 1.80), (1, "CEPILLO DENTAL", 1.25), (1, "BOLSA PLÁSTICO", 0.15),
+]
+"""Quantity, name and price per item"""
+BULK_PRODUCTS = [("PLÁTANO", 1.124, 1.99), ("MANZANA GOLDEN", 0.872, 2.29), ("TOMATE PERA", 1.350, 1.79)]
+"""Name, weight in kg and price per kg"""
+IVA_RATES = (4, 10, 21)
+PAGE_BREAK = 34
+"""Rows on the first page"""
+
+
+def _amount(value: float) -> str:
+    return f"{value:.2f}".replace(".", ",")
+
+
+def ticket_rows() -> List[List[Cell]]:
+    """Rows of the ticket, with the real layout: descriptions on the left, prices and
+    amounts right aligned to the edge of their columns"""
+    rows: List[List[Cell]] = [
+        [(20, "MERCADONA, S.A. A-46103834", LEFT)],
+        [(20, "AVDA. DE LA CONSTITUCIÓN 112", LEFT)],
+        [(20, "46009 VALENCIA", LEFT)],
+        [(20, "TELÉFONO: 963471920", LEFT)],
+        [(20, "03/11/2023 18:47  OP: 5021486", LEFT)],
+        [(20, f"FACTURA SIMPLIFICADA: {INVOICE_ID}", LEFT)],
+        [(70, "Descripción", LEFT), (480, "P. Unit", RIGHT), (580, "Importe", RIGHT)],
+    ]
+    amounts = {rate: 0.0 for rate in IVA_RATES}
+    for index, (quantity, name, price) in enumerate(UNIT_PRODUCTS):
+        amount = round(quantity * price, 2)
+        row: List[Cell] = [(20, str(quantity), LEFT), (70, name, LEFT)]
+        if quantity > 1:
+            row.append((480, _amount(price), RIGHT))
+        row.append((580, _amount(amount), RIGHT))
+        rows.append(row)
+        amounts[IVA_RATES[index % len(IVA_RATES)]] += amount
+    for index, (name, weight, price) in enumerate(BULK_PRODUCTS):
+        amount = round(weight * price, 2)
+        rows.append([(20, "1", LEFT), (70, name, LEFT)])
+        rows.append([(70, f"{weight:.3f} kg".replace(".", ","), LEFT), (480, f"{_amount(price)} €/kg", RIGHT),
+                     (580, _amount(amount), RIGHT)])
+        amounts[IVA_RATES[index % len(IVA_RATES)]] += amount
+
+    total = round(sum(amounts.values()), 2)
+    rows.append([(400, "TOTAL (€)", LEFT), (580, _amount(total), RIGHT)])
+    rows.append([(20, "TARJETA BANCARIA", LEFT), (580, _amount(total), RIGHT)])
+    rows.append([(20, "IVA", LEFT), (250, "BASE IMPONIBLE (€)", LEFT), (450, "CUOTA (€)", LEFT)])
+    total_base = total_fee = 0.0
+    for rate, amount in amounts.items():
+        base = round(amount / (1 + rate / 100), 2)
+        fee = round(amount - base, 2)
+        total_base += base
+        total_fee += fee
+        rows.append([(20, f"{rate}%", LEFT), (340, _amount(base), RIGHT), (520, _amount(fee), RIGHT)])
+    rows.append([(20, "TOTAL", LEFT), (340, _amount(total_base), RIGHT), (520, _amount(total_fee), RIGHT)])
+    return rows
+
+
+def render(file_path: pathlib.Path, font_type: int) -> None:
+    """Draw the ticket on two letter pages"""
+    import matplotlib
+    matplotlib.use("pdf")
+    from matplotlib import pyplot
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    matplotlib.rcParams.update({"pdf.fonttype": font_type, "font.family": "DejaVu Sans",
+                                "pdf.compression": 6})
+    rows = ticket_rows()
+    with PdfPages(file_path, metadata={"Creator": "ticketreader fixtures", "CreationDate": None}) as pdf:
+        for page_rows in (rows[:PAGE_BREAK], rows[PAGE_BREAK:]):
+            figure = pyplot.figure(figsize=(PAGE_WIDTH / 72, PAGE_HEIGHT / 72))
+            for index, row in enumerate(page_rows):
+                y = TOP - index * ROW_HEIGHT
+                for x, text, alignment in row:
+                    figure.text(x / PAGE_WIDTH, y / PAGE_HEIGHT, text, fontsize=FONT_SIZE, ha=alignment,
+                                va="baseline")
+            pdf.savefig(figure)
+            pyplot.close(figure)
+
+
+def capture(file_path: pathlib.Path) -> None:
+    """Save the tabula dataframes of every column layout and the parsed ticket"""
+    from ticketreader.mercadona.tabula import MercadonaTabulaStrategy
+    from ticketreader.strategies import ExtractionMode
+
+    strategy = MercadonaTabulaStrategy(mode=ExtractionMode.TABULA, crop_sections=False)
+    strategy.file_path = file_path
+    for index, dataframe in enumerate(strategy.get_dataframes()):
+        dataframe.to_csv(file_path.with_suffix(f".tabula-{index}.csv"), index=False, header=False)
+
+    strategy = MercadonaTabulaStrategy(mode=ExtractionMode.TABULA)
+    strategy.file_path = file_path
+    file_path.with_suffix(".json").write_text(strategy.parse().model_dump_json(indent=2) + "\n")
+
+
+def main() -> None:
+    for name, font_type in FONT_TYPES.items():
+        file_path = FIXTURES_DIR / f"mercadona-{name}.pdf"
+        render(file_path, font_type)
+        capture(file_path)
+        print(f"Written {file_path}")
+
+
+if __name__ == "__main__":
+    main()
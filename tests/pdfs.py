@@ -0,0 +1,115 @@
+"""PDF files for the tests. Unlike the benchmark generator, tickets are written the way
+point of sale software writes them: a proportional font with its own widths, one text
+object per row with relative moves and TJ kerning, and indirect resources."""
+import zlib
+from typing import Dict, List, Sequence, Tuple
+
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+ROW_HEIGHT = 14
+MARGIN = 32
+FONT_SIZE = 9
+
+Row = List[Tuple[float, str]]
+
+TICKET_ROWS: List[Row] = [
+    [(20, "MERCADONA, S.A. A-46103834")],
+    [(20, "C/ PORTUGAL 37")],
+    [(20, "28943 FUENLABRADA")],
+    [(20, "TELEFONO: 916905406")],
+    [(20, "15/01/2024 19:23  OP: 1234567")],
+    [(20, "FACTURA SIMPLIFICADA: 2345-012-345678")],
+    [(70, "Descripcion"), (400, "P. Unit"), (540, "Importe")],
+    [(20, "1"), (70, "LECHE SEMI"), (540, "0,89")],
+    [(20, "2"), (70, "PAN BARRA"), (400, "0,60"), (540, "1,20")],
+    [(20, "1"), (70, "PLATANO")],
+    [(70, "1,250 kg"), (400, "1,99 €/kg"), (540, "2,49")],
+    [(400, "TOTAL (€)"), (540, "4,58")],
+    [(20, "TARJETA BANCARIA"), (540, "4,58")],
+    [(20, "IVA"), (250, "BASE IMPONIBLE (€)"), (450, "CUOTA (€)")],
+    [(20, "4%"), (250, "0,86"), (450, "0,03")],
+    [(20, "10%"), (250, "3,35"), (450, "0,34")],
+    [(20, "TOTAL"), (250, "4,21"), (450, "0,37")],
+]
+"""Rows of a small Mercadona ticket: invoice 2345-012-345678, total 4,58, three products
+and two IVA lines"""
+
+
+def ticket_rows(invoice_id: str) -> List[Row]:
+    """Rows of the ticket with another invoice id"""
+    rows = [list(row) for row in TICKET_ROWS]
+    rows[5] = [(20, f"FACTURA SIMPLIFICADA: {invoice_id}")]
+    return rows
+
+
+def _widths() -> List[int]:
+    """Widths of the WinAnsi codes 32 to 255, close to Helvetica"""
+    widths = []
+    for code in range(32, 256):
+        char = bytes([code]).decode("cp1252", "replace")
+        if char == " " or char in ",.:/":
+            widths.append(278)
+        elif char in "-()":
+            widths.append(333)
+        elif char == "%":
+            widths.append(889)
+        elif char.isupper():
+            widths.append(667)
+        else:
+            widths.append(556)
+    return widths
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _show(row: Row) -> str:
+    """One text object per row. Cells are placed with Td relative to the row start and
+    the first cell is kerned, as in TJ arrays written by layout engines."""
+    (x, text), *cells = row
+    middle = len(text) // 2
+    operations = [f"[({_escape(text[:middle])}) -20 ({_escape(text[middle:])})] TJ"]
+    for cell_x, cell_text in cells:
+        operations.append(f"{cell_x - x} 0 Td ({_escape(cell_text)}) Tj")
+        x = cell_x
+    return " ".join(operations)
+
+
+def render_pdf(pages: Sequence[Sequence[Row]]) -> bytes:
+    """PDF file with every page, font and resource dictionary as an indirect object"""
+    objects: Dict[int, bytes] = {}
+    widths = 1
+    font = 2
+    resources = 3
+    objects[widths] = f"[{' '.join(str(width) for width in _widths())}]".encode()
+    objects[font] = (f"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding "
+                     f"/FirstChar 32 /LastChar 255 /Widths {widths} 0 R >>").encode()
+    objects[resources] = f"<< /Font << /F1 {font} 0 R >> >>".encode()
+    pages_id = 4
+    kids = []
+    for rows in pages:
+        lines = []
+        for index, row in enumerate(rows):
+            y = PAGE_HEIGHT - MARGIN - index * ROW_HEIGHT
+            lines.append(f"BT /F1 {FONT_SIZE} Tf 1 0 0 1 {row[0][0]} {y} Tm {_show(row)} ET")
+        data = zlib.compress("\n".join(lines).encode("cp1252"))
+        contents = len(objects) + 2
+        objects[contents] = b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(data) + data + b"\nendstream"
+        kids.append(contents + 1)
+        objects[contents + 1] = (f"<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+                                 f"/Contents {contents} 0 R /Resources {resources} 0 R >>").encode()
+    objects[pages_id] = f"<< /Type /Pages /Kids [{' '.join(f'{kid} 0 R' for kid in kids)}] /Count {len(kids)} >>".encode()
+    catalog = len(objects) + 1
+    objects[catalog] = f"<< /Type /Catalog /Pages {pages_id} 0 R >>".encode()
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = len(output)
+        output += f"{number} 0 obj\n".encode() + objects[number] + b"\nendobj\n"
+    xref = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    output += b"".join(f"{offsets[number]:010d} 00000 n \n".encode() for number in sorted(objects))
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root {catalog} 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(output)
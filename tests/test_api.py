@@ -0,0 +1,37 @@
+import json
+import sqlite3
+
+import pytest
+
+from ticketreader import api, cli, mercadona
+
+
+@pytest.mark.parametrize("backend", ["jsonl", "sql"])
+def test_interrupted_incremental_run_writes_no_duplicates(ticket_files, tmp_path, monkeypatch, backend):
+    destination = tmp_path / f"tickets.{backend}"
+    argv = ["file", *map(str, ticket_files), "-o", backend, "-d", str(destination),
+            "--engine", "pypdf", "--incremental", "-q"]
+    parse_file = mercadona._parse_file
+    parsed = []
+
+    def interrupted_parse_file(**kwargs):
+        if len(parsed) == 3:
+            raise KeyboardInterrupt
+        parsed.append(kwargs["file_path"])
+        return parse_file(**kwargs)
+
+    monkeypatch.setattr(cli.config, "configure_logging", lambda: None)
+    monkeypatch.setattr(mercadona, "_parse_file", interrupted_parse_file)
+    with pytest.raises(KeyboardInterrupt):
+        cli.main(argv)
+    monkeypatch.setattr(mercadona, "_parse_file", parse_file)
+    assert cli.main(argv) == 0
+
+    manifest = json.loads(api.manifest_path(destination).read_text())
+    assert len(manifest["files"]) == 5
+    if backend == "jsonl":
+        invoice_ids = [json.loads(line)["invoice_id"] for line in destination.read_text().splitlines()]
+        assert sorted(invoice_ids) == [f"2345-012-{number:06d}" for number in range(5)]
+    else:
+        with sqlite3.connect(destination) as connection:
+            assert connection.execute("SELECT COUNT(*) FROM tickets").fetchone()[0] == 5
@@ -0,0 +1,59 @@
+import os
+
+from ticketreader import mercadona, utils
+from ticketreader.cache import ParseCache
+from ticketreader.mercadona.schemas import MercadonaTicket
+from ticketreader.parser import ParserEngine
+from ticketreader.strategies import ExtractionMode
+
+
+def _age(cache, key, seconds):
+    """Move the last access of an entry back in time"""
+    path = cache._entry_path(key)
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns - seconds * 10 ** 9))
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, ticket_files, tickets):
+    cache = ParseCache(directory=tmp_path / "cache")
+    keys = [cache.key(file_path) for file_path in ticket_files[:3]]
+    for age, (key, ticket) in enumerate(zip(keys, tickets), start=1):
+        cache.set(key, ticket)
+        _age(cache, key, 100 - age)
+    entry_size = cache.size // 3
+
+    assert cache.get(keys[0], MercadonaTicket) == tickets[0]
+    cache.max_size = entry_size * 2
+    cache.set(keys[2], tickets[2])
+
+    assert cache.get(keys[1], MercadonaTicket) is None
+    assert cache.get(keys[0], MercadonaTicket) == tickets[0]
+    assert cache.size <= cache.max_size
+    assert (cache.hits, cache.misses) == (2, 1)
+    assert ParseCache(directory=tmp_path / "cache").size == cache.size
+
+
+def test_key_changes_with_the_namespace(tmp_path, ticket_files, tickets):
+    file_path = ticket_files[0]
+    cache = ParseCache(directory=tmp_path, namespace=mercadona.cache_namespace(engine=ParserEngine.PYPDF))
+    cache.set(cache.key(file_path), tickets[0])
+
+    for namespace in (mercadona.cache_namespace(ExtractionMode.SINGLE_PASS),
+                      mercadona.cache_namespace(ExtractionMode.TABULA)):
+        other = ParseCache(directory=tmp_path, namespace=namespace)
+        assert other.get(other.key(file_path), MercadonaTicket) is None
+
+    again = ParseCache(directory=tmp_path, namespace=cache.namespace)
+    assert again.key(file_path, digest=utils.file_digest(file_path)) == cache.key(file_path)
+    assert again.get(again.key(file_path), MercadonaTicket) == tickets[0]
+
+
+def test_corrupted_entries_are_discarded(tmp_path, ticket_files, tickets):
+    cache = ParseCache(directory=tmp_path)
+    key = cache.key(ticket_files[0])
+    cache.set(key, tickets[0])
+    cache._entry_path(key).write_text("{")
+
+    assert cache.get(key, MercadonaTicket) is None
+    assert not cache._entry_path(key).exists()
+    assert cache.size == 0
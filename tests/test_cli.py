@@ -0,0 +1,25 @@
+import pytest
+
+from ticketreader import cli
+from ticketreader.cli import OutputBackend
+from ticketreader.parser import ParserEngine
+from ticketreader.strategies import ExtractionMode
+
+
+def test_help_lists_choice_values(capsys):
+    with pytest.raises(SystemExit):
+        cli.build_parser().parse_args(["file", "--help"])
+    usage = capsys.readouterr().out
+
+    assert "{excel,sql,jsonl}" in usage
+    assert "{tabula,pypdf}" in usage
+    assert "{tabula,single_pass}" in usage
+
+
+def test_choices_are_parsed_as_enums():
+    args = cli.build_parser().parse_args(
+        ["file", "ticket.pdf", "-o", "sql", "--engine", "pypdf", "--mode", "single_pass"])
+
+    assert args.output is OutputBackend.SQL
+    assert args.engine is ParserEngine.PYPDF
+    assert args.mode is ExtractionMode.SINGLE_PASS
@@ -0,0 +1,61 @@
+import pathlib
+from collections import defaultdict
+from datetime import datetime
+
+import pytest
+
+from ticketreader.columnar import TicketBatch
+from ticketreader.mercadona.schemas import MercadonaTicket
+
+FIXTURE = pathlib.Path(__file__).parent / "fixtures" / "mercadona-type3.json"
+
+
+@pytest.fixture
+def batch_tickets(tickets):
+    """Tickets of two stores and two months, with unit and bulk products"""
+    fixture = MercadonaTicket.model_validate_json(FIXTURE.read_text())
+    other_store = fixture.supermarket.model_copy(update={
+        "address": fixture.supermarket.address.model_copy(update={"street": "C/ COLON 10", "postal_code": 46004})})
+    return [*tickets[:2], fixture,
+            fixture.model_copy(update={"invoice_id": "4127-023-618306", "supermarket": other_store,
+                                       "purchase_datetime": datetime(2024, 2, 1, 10, 30)})]
+
+
+def _spend(tickets, key):
+    spend = defaultdict(float)
+    for ticket in tickets:
+        for product in ticket.products:
+            spend[key(ticket, product)] += product.total
+    return spend
+
+
+def test_round_trip(batch_tickets):
+    batch = TicketBatch.from_tickets(batch_tickets)
+
+    assert len(batch) == 4
+    assert batch.item_count == sum(len(ticket.products) for ticket in batch_tickets)
+    assert batch.is_bulk.sum() == 1 + 1 + 3 + 3
+    assert [ticket.model_dump() for ticket in batch.to_tickets()] == [ticket.model_dump() for ticket in batch_tickets]
+    assert len(batch.stores) == 3
+
+
+def test_aggregates(batch_tickets):
+    batch = TicketBatch.from_tickets(batch_tickets)
+
+    assert batch.total_iva.tolist() == pytest.approx([ticket.total_iva for ticket in batch_tickets])
+    assert batch.spend_per_month().to_dict() == pytest.approx(
+        _spend(batch_tickets, lambda ticket, product: ticket.purchase_datetime.strftime("%Y-%m")))
+    assert batch.spend_per_product().to_dict() == pytest.approx(
+        _spend(batch_tickets, lambda ticket, product: product.name))
+    assert batch.spend_per_store().to_dict() == pytest.approx(_spend(batch_tickets, lambda ticket, product: (
+        f"{ticket.supermarket.address.street}, {ticket.supermarket.address.postal_code} "
+        f"{ticket.supermarket.address.city}")))
+
+
+def test_empty_batch():
+    batch = TicketBatch.from_tickets([])
+
+    assert len(batch) == 0
+    assert batch.to_tickets() == []
+    assert batch.total_iva.tolist() == []
+    assert batch.spend_per_month().empty
@@ -0,0 +1,112 @@
+import shutil
+from datetime import datetime, timedelta
+
+import pytest
+from openpyxl import Workbook, load_workbook
+from openpyxl.worksheet.table import Table
+
+from ticketreader import config, output
+from ticketreader.output import WriteMode
+
+TEMPLATE_FILE = config.DATA_DIR / "tickets-template.xlsx"
+
+
+@pytest.fixture
+def workbook_file(tmp_path):
+    file_path = tmp_path / "tickets.xlsx"
+    shutil.copyfile(TEMPLATE_FILE, file_path)
+    return file_path
+
+
+def _dated(tickets):
+    """Tickets bought one day after the other"""
+    start = datetime(2024, 1, 15, 19, 23)
+    return [ticket.model_copy(update={"purchase_datetime": start + timedelta(days=index)})
+            for index, ticket in enumerate(tickets)]
+
+
+def _column(sheet, column, first_row=4):
+    values = []
+    for (value,) in sheet.iter_rows(min_row=first_row, min_col=column, max_col=column, values_only=True):
+        if value is None:
+            break
+        values.append(value)
+    return values
+
+
+def test_append_fills_the_next_empty_rows(workbook_file, tickets):
+    with output.ExcelBatchWriter(file_name=workbook_file, write_mode=WriteMode.APPEND) as writer:
+        writer.save_tickets(tickets[:2])
+    with output.ExcelBatchWriter(file_name=workbook_file, write_mode=WriteMode.APPEND) as writer:
+        writer.save_tickets(tickets[2:])
+
+    workbook = load_workbook(workbook_file)
+    invoice_ids = [ticket.invoice_id for ticket in tickets]
+    assert _column(workbook["Tickets"], 6) == invoice_ids
+    assert _column(workbook["Productos unitarios"], 6) == [invoice_id for invoice_id in invoice_ids for _ in range(2)]
+    assert _column(workbook["Productos a granel"], 6) == invoice_ids
+    assert workbook["Tickets"].tables["Tabla1"].ref == "C3:H1702"
+
+
+def test_append_sorts_newest_first_on_close(workbook_file, tickets):
+    tickets = _dated(tickets)
+    with output.ExcelBatchWriter(file_name=workbook_file, write_mode=WriteMode.APPEND,
+                                 sort_newest_first=True, checkpoint_interval=2) as writer:
+        writer.save_tickets(tickets[:3])
+        checkpoint = load_workbook(workbook_file)
+        writer.save_tickets(tickets[3:])
+
+    assert _column(checkpoint["Tickets"], 6) == [ticket.invoice_id for ticket in tickets[:2]]
+    workbook = load_workbook(workbook_file)
+    newest_first = [ticket.invoice_id for ticket in reversed(tickets)]
+    assert _column(workbook["Tickets"], 6) == newest_first
+    assert _column(workbook["Productos unitarios"], 6)[::2] == newest_first
+    assert _column(workbook["Productos unitarios"], 7) == [1, 2] * len(tickets)
+
+
+def test_append_extends_the_table(tmp_path, tickets):
+    file_path = tmp_path / "tickets.xlsx"
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "Tickets"
+    sheet.append([])
+    sheet.append([])
+    sheet.append([None, None, "Supermercado", "Dirección", "Fecha de compra", "ID factura", "IVA", "total", "Notas",
+                  None, "Mes", "Gasto"])
+    sheet.append([None, None, "MERCADONA", "", "01/01/2024 10:00:00", "0000-000-000000", 0.1, 1.0, None,
+                  None, "Enero", 10.0])
+    sheet.append([None] * 10 + ["Febrero", 20.0])
+    sheet.add_table(Table(displayName="Tabla1", ref="C3:I4"))
+    sheet.add_table(Table(displayName="Resumen", ref="K3:L5"))
+    workbook.save(file_path)
+
+    with output.ExcelBatchWriter(file_name=file_path, write_mode=WriteMode.APPEND, sort_newest_first=True) as writer:
+        writer.save_tickets(_dated(tickets[:2]))
+
+    sheet = load_workbook(file_path)["Tickets"]
+    assert sheet.tables["Tabla1"].ref == "C3:I6"
+    assert sheet.tables["Tabla1"].autoFilter.ref == "C3:I6"
+    assert _column(sheet, 6) == [tickets[1].invoice_id, tickets[0].invoice_id, "0000-000-000000"]
+    assert _column(sheet, 11) == ["Enero", "Febrero"]
+    assert sheet.tables["Resumen"].ref == "K3:L5"
+
+
+def _table_rows(sheet):
+    table = next(iter(sheet.tables.values()))
+    rows = sheet.iter_rows(min_row=3, min_col=3, max_col=3 + len(table.tableColumns) - 1,
+                           values_only=True)
+    return [row for row in rows if any(value is not None for value in row)]
+
+
+def test_stream_writer_matches_batch_writer(workbook_file, tmp_path, tickets):
+    stream_file = tmp_path / "stream.xlsx"
+    with output.ExcelBatchWriter(file_name=workbook_file, write_mode=WriteMode.APPEND) as writer:
+        writer.save_tickets(tickets)
+    with output.ExcelStreamWriter(file_name=stream_file) as writer:
+        writer.save_tickets(tickets)
+
+    batch, stream = load_workbook(workbook_file), load_workbook(stream_file)
+    for sheet_name in ("Tickets", "Productos unitarios", "Productos a granel"):
+        assert _table_rows(stream[sheet_name]) == _table_rows(batch[sheet_name])
+        assert stream[sheet_name]["C2"].value == batch[sheet_name]["C2"].value
+    assert stream["Tickets"].tables["Tabla1"].ref == "C3:H8"
@@ -0,0 +1,15 @@
+import pytest
+
+from benchmarks.import_time import BUDGETS_MS, LAZY_DEPENDENCIES, measure
+
+BUDGET_SCALE = 2.0
+"""Margin over the benchmark budgets, for loaded test machines"""
+
+
+@pytest.mark.parametrize("module", list(BUDGETS_MS))
+def test_import_budget(module):
+    elapsed, loaded = measure(module, repeat=3)
+
+    assert loaded == [], f"{module} imports {', '.join(loaded)}"
+    assert elapsed <= BUDGETS_MS[module] * BUDGET_SCALE
+
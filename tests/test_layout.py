@@ -0,0 +1,85 @@
+import io
+import json
+import shutil
+import pathlib
+
+import pandas as pd
+import pytest
+
+from ticketreader import mercadona
+from ticketreader.mercadona.tabula import MercadonaTabulaStrategy
+from ticketreader.parser import ParserEngine
+from ticketreader.strategies import DocumentLayout, ExtractionMode
+
+import pdfs
+
+FIXTURES = sorted((pathlib.Path(__file__).parent / "fixtures").glob("mercadona-*.pdf"))
+
+
+@pytest.fixture
+def ticket_file(tmp_path):
+    file_path = tmp_path / "ticket.pdf"
+    file_path.write_bytes(pdfs.render_pdf([pdfs.TICKET_ROWS]))
+    return file_path
+
+
+def test_rows_with_indirect_resources(ticket_file):
+    layout = DocumentLayout.from_pdf(ticket_file)
+
+    rows = [row.text for row in layout.pages[0].text_rows]
+    assert rows[0] == "MERCADONA, S.A. A-46103834"
+    assert rows[8] == "2 PAN BARRA 0,60 1,20"
+    assert len(rows) == len(pdfs.TICKET_ROWS)
+
+
+def test_cells_split_by_columns(ticket_file):
+    dataframe = DocumentLayout.from_pdf(ticket_file).to_dataframe(columns=[64, 345, 508, 612])
+
+    assert dataframe.iloc[8].tolist() == ["2", "PAN BARRA", "0,60", "1,20"]
+    assert dataframe.iloc[10].tolist()[1:] == ["1,250 kg", "1,99 €/kg", "2,49"]
+
+
+def test_single_pass_matches_pypdf(ticket_file):
+    single_pass = mercadona.parse_mercadona_ticket(ticket_file, mode=ExtractionMode.SINGLE_PASS)
+    pypdf = mercadona.parse_mercadona_ticket(ticket_file, engine=ParserEngine.PYPDF)
+
+    assert single_pass == pypdf
+    assert single_pass.total == 4.58
+
+
+@pytest.mark.skipif(shutil.which("java") is None, reason="tabula needs a Java runtime")
+def test_single_pass_matches_tabula(ticket_file):
+    single_pass = mercadona.parse_mercadona_ticket(ticket_file, mode=ExtractionMode.SINGLE_PASS)
+    tabula = mercadona.parse_mercadona_ticket(ticket_file, mode=ExtractionMode.TABULA)
+
+    assert single_pass == tabula
+
+
+def _cells(csv_text: str) -> list:
+    return pd.read_csv(io.StringIO(csv_text), header=None, dtype=str, keep_default_na=False).values.tolist()
+
+
+@pytest.mark.parametrize("fixture", FIXTURES, ids=lambda path: path.stem)
+def test_single_pass_matches_tabula_dataframes(fixture):
+    strategy = MercadonaTabulaStrategy(mode=ExtractionMode.SINGLE_PASS, crop_sections=False)
+    strategy.file_path = fixture
+
+    dataframes = strategy.get_dataframes()
+
+    assert len(dataframes) == 3
+    for index, dataframe in enumerate(dataframes):
+        golden = fixture.with_suffix(f".tabula-{index}.csv").read_text()
+        assert _cells(dataframe.to_csv(index=False, header=False)) == _cells(golden)
+
+
+@pytest.mark.parametrize("mode", [ExtractionMode.SINGLE_PASS, pytest.param(
+    ExtractionMode.TABULA, marks=pytest.mark.skipif(shutil.which("java") is None,
+                                                    reason="tabula needs a Java runtime"))])
+@pytest.mark.parametrize("fixture", FIXTURES, ids=lambda path: path.stem)
+def test_fixture_tickets(fixture, mode):
+    expected = json.loads(fixture.with_suffix(".json").read_text())
+
+    ticket = mercadona.parse_mercadona_ticket(fixture, mode=mode)
+
+    assert json.loads(ticket.model_dump_json()) == expected
+    assert len(ticket.products) == 33
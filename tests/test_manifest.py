@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+from ticketreader import api, mercadona, output, utils
+from ticketreader.cache import ParseCache
+from ticketreader.manifest import Manifest
+from ticketreader.parser import ParserEngine
+
+
+@pytest.fixture
+def hashed_files(monkeypatch):
+    """Files hashed by utils.file_digest"""
+    hashed = []
+    file_digest = utils.file_digest
+
+    def counting_file_digest(file_path, *args, **kwargs):
+        hashed.append(file_path)
+        return file_digest(file_path, *args, **kwargs)
+
+    monkeypatch.setattr(utils, "file_digest", counting_file_digest)
+    return hashed
+
+
+def _touch(file_path, seconds=10):
+    stat = file_path.stat()
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + seconds * 10 ** 9))
+
+
+def test_unchanged_files(tmp_path, ticket_files, tickets):
+    manifest = Manifest(tmp_path / "manifest.json")
+    file_path = ticket_files[0]
+    assert not manifest.is_unchanged(file_path)
+
+    manifest.record(file_path, tickets[0])
+    manifest.save()
+
+    manifest = Manifest.load(manifest.path)
+    assert manifest.is_unchanged(file_path)
+    assert manifest.has_invoice(tickets[0].invoice_id)
+
+
+def test_touched_files_are_hashed_once(tmp_path, ticket_files, tickets, hashed_files):
+    manifest = Manifest(tmp_path / "manifest.json")
+    file_path = ticket_files[0]
+    manifest.record(file_path, tickets[0])
+    _touch(file_path)
+
+    assert manifest.is_unchanged(file_path)
+    assert manifest.is_unchanged(file_path)
+    assert hashed_files == [file_path, file_path]
+
+
+def test_changed_files(tmp_path, ticket_files, tickets):
+    manifest = Manifest(tmp_path / "manifest.json")
+    resized, rewritten = ticket_files[:2]
+    for file_path, ticket in zip((resized, rewritten), tickets):
+        manifest.record(file_path, ticket)
+
+    resized.write_bytes(resized.read_bytes() + b"\n")
+    contents = bytearray(rewritten.read_bytes())
+    contents[-2:] = b"%%"
+    stat = rewritten.stat()
+    rewritten.write_bytes(bytes(contents))
+    os.utime(rewritten, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    assert not manifest.is_unchanged(resized)
+    assert not manifest.is_unchanged(rewritten)
+    assert not manifest.is_unchanged(ticket_files[2])
+
+
+def test_files_are_hashed_once_per_parse(tmp_path, ticket_files, hashed_files):
+    manifest = Manifest(tmp_path / "manifest.json")
+    cache = ParseCache(directory=tmp_path / "cache", namespace=mercadona.cache_namespace(engine=ParserEngine.PYPDF))
+
+    with api.closing_with_manifest(output.JSONLinesHandler(file_name=tmp_path / "tickets.jsonl"),
+                                   manifest) as writer:
+        report = api.ingest_mercadona_tickets(ticket_files, writer=writer, manifest=manifest, cache=cache,
+                                              engine=ParserEngine.PYPDF)
+
+    assert report.new == len(ticket_files)
+    assert sorted(hashed_files) == sorted(ticket_files)
+    assert all(manifest.is_unchanged(file_path) for file_path in ticket_files)
@@ -0,0 +1,115 @@
+import pathlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ticketreader.mercadona.tabula import MercadonaTabulaStrategy
+from ticketreader.strategies import ExtractionMode, tabulastrategy
+
+import pdfs
+
+FIXTURE = pathlib.Path(__file__).parent / "fixtures" / "mercadona-type3.pdf"
+
+
+@pytest.fixture
+def ticket_file(tmp_path):
+    file_path = tmp_path / "ticket.pdf"
+    file_path.write_bytes(pdfs.render_pdf([pdfs.TICKET_ROWS]))
+    return file_path
+
+
+def _strategy(file_path, **kwargs) -> MercadonaTabulaStrategy:
+    strategy = MercadonaTabulaStrategy(**kwargs)
+    strategy.file_path = file_path
+    return strategy
+
+
+def test_sections_with_indirect_resources(ticket_file):
+    strategy = _strategy(ticket_file, mode=ExtractionMode.SINGLE_PASS)
+
+    ticket = strategy.parse()
+
+    assert strategy.sections is not None
+    assert list(strategy.sections.products) == [1]
+    assert ticket.total == 4.58
+    assert [iva.type for iva in ticket.iva] == ["4%", "10%", "TOTAL"]
+
+
+def test_cropped_sections_match_whole_pages(ticket_file):
+    cropped = _strategy(ticket_file, mode=ExtractionMode.SINGLE_PASS).parse()
+    whole = _strategy(ticket_file, mode=ExtractionMode.SINGLE_PASS, crop_sections=False).parse()
+
+    assert cropped == whole
+
+
+def test_sections_fall_back_to_whole_pages(ticket_file, monkeypatch):
+    def broken_layout(file_path):
+        raise AttributeError("'IndirectObject' object has no attribute 'get'")
+
+    monkeypatch.setattr(tabulastrategy.DocumentLayout, "from_pdf", broken_layout)
+    strategy = _strategy(ticket_file, mode=ExtractionMode.TABULA)
+
+    assert strategy.sections is None
+    assert strategy.layout_areas(1) == strategy.selection_areas(strategy.PAGES[1])
+
+
+@pytest.mark.parametrize("mode", [ExtractionMode.TABULA, ExtractionMode.SINGLE_PASS])
+def test_dataframe_of_pages_without_tables(ticket_file, monkeypatch, mode):
+    monkeypatch.setattr(tabulastrategy.tabula, "read_pdf", lambda **kwargs: [])
+    strategy = _strategy(ticket_file, mode=mode, crop_sections=False)
+
+    columns = strategy.COLUMNS[1]
+    dataframe = strategy._get_dataframe(columns=columns, areas={1: (0, 0, 1, 612)})
+
+    assert dataframe.empty
+    assert list(dataframe.columns) == list(range(len(columns)))
+
+
+def _classified(products: pd.DataFrame):
+    strategy = MercadonaTabulaStrategy(mode=ExtractionMode.SINGLE_PASS, crop_sections=False)
+    strategy.sections = None
+    strategy.dataframes = [None, products, None]
+    strategy._classify_product_rows()
+    return (list(strategy.tmp['unit_product_rows'].index), list(strategy.tmp['bulk_product_rows'].index),
+            strategy.tmp['total_row_index'])
+
+
+def _classified_by_rows(products: pd.DataFrame):
+    """Row by row classification, as a reference"""
+    unit, bulk = [], []
+    for index, row in products.iloc[MercadonaTabulaStrategy.PRODUCTS_START_ROW:].iterrows():
+        if row[2] == MercadonaTabulaStrategy.TOTAL_LABEL:
+            return unit, bulk, index
+        (bulk if bulk or pd.isna(row[3]) else unit).append(index)
+    raise ValueError("Total row not found")
+
+
+def _products(*rows):
+    header = [[np.nan, f"HEADER {line}", np.nan, np.nan] for line in range(MercadonaTabulaStrategy.PRODUCTS_START_ROW)]
+    return pd.DataFrame(header + [list(row) for row in rows])
+
+
+@pytest.mark.parametrize("products", [
+    pd.read_csv(FIXTURE.with_suffix(".tabula-1.csv"), header=None),
+    _products(["1", "LECHE", np.nan, "0,89"], ["2", "PAN", "0,60", "1,20"], [np.nan, np.nan, "TOTAL (€)", "2,09"],
+              ["TARJETA", "BANCARIA", np.nan, "2,09"]),
+    _products(["1", "PLATANO", np.nan, np.nan], [np.nan, "1,250 kg", "1,99 €/kg", "2,49"],
+              ["1", "LECHE", np.nan, "0,89"], [np.nan, np.nan, "TOTAL (€)", "3,38"]),
+    _products([np.nan, np.nan, "TOTAL (€)", "0,00"], [np.nan, np.nan, np.nan, np.nan]),
+], ids=["fixture", "unit_only", "bulk_first", "empty"])
+def test_product_rows_classification(products):
+    assert _classified(products) == _classified_by_rows(products)
+
+
+def test_fixture_product_rows():
+    unit, bulk, total = _classified(pd.read_csv(FIXTURE.with_suffix(".tabula-1.csv"), header=None))
+
+    assert len(unit) == 30
+    assert len(bulk) == 6
+    assert total == bulk[-1] + 1
+
+
+def test_product_rows_without_total():
+    with pytest.raises(ValueError, match="Total row not found"):
+        _classified(_products(["1", "LECHE", np.nan, "0,89"]))
@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+from ticketreader import metrics
+from ticketreader.metrics import Histogram, MetricsRegistry
+
+BUCKETS = (0.1, 1, 10)
+
+EXPOSITION = """\
+# TYPE ticketreader_tickets_total counter
+ticketreader_tickets_total{status="failed"} 1
+ticketreader_tickets_total{status="new"} 3
+# TYPE ticketreader_stage_seconds histogram
+ticketreader_stage_seconds_bucket{stage="pdf_open",le="0.1"} 1
+ticketreader_stage_seconds_bucket{stage="pdf_open",le="1"} 2
+ticketreader_stage_seconds_bucket{stage="pdf_open",le="10"} 2
+ticketreader_stage_seconds_bucket{stage="pdf_open",le="+Inf"} 3
+ticketreader_stage_seconds_sum{stage="pdf_open"} 20.550000
+ticketreader_stage_seconds_count{stage="pdf_open"} 3
+"""
+
+
+def _registry():
+    registry = MetricsRegistry(buckets=BUCKETS)
+    registry.increment("ticketreader_tickets_total", 2, status="new")
+    registry.increment("ticketreader_tickets_total", status="new")
+    registry.increment("ticketreader_tickets_total", status="failed")
+    for seconds in (0.05, 0.5, 20):
+        registry.observe(metrics.STAGE_SECONDS, seconds, stage="pdf_open")
+    return registry
+
+
+def test_prometheus_exposition():
+    assert metrics.render_prometheus(_registry().snapshot()) == EXPOSITION
+
+
+def test_histogram_merge():
+    histogram, other = Histogram(BUCKETS), Histogram(BUCKETS)
+    histogram.observe(0.1)
+    other.observe(5)
+    other.observe(50)
+
+    histogram.merge(other)
+
+    assert histogram.cumulative() == [("0.1", 1), ("1", 1), ("10", 2), ("+Inf", 3)]
+    assert (histogram.count, histogram.sum) == (3, 55.1)
+    assert other.count == 2
+    with pytest.raises(ValueError):
+        histogram.merge(Histogram((1, 2)))
+
+
+def test_merge_worker_snapshots():
+    registry = _registry()
+    worker = _registry()
+    first = worker.snapshot(reset=True)
+    worker.observe(metrics.STAGE_SECONDS, 0.5, stage="text_extract")
+    second = worker.snapshot(reset=True)
+
+    registry.merge(first)
+    registry.merge(second)
+    snapshot = registry.snapshot()
+
+    assert worker.snapshot() == metrics.MetricsSnapshot(counters={}, histograms={})
+    assert snapshot.counters[("ticketreader_tickets_total", (("status", "new"),))] == 6
+    pdf_open = snapshot.histograms[(metrics.STAGE_SECONDS, (("stage", "pdf_open"),))]
+    assert pdf_open.cumulative() == [("0.1", 2), ("1", 4), ("10", 4), ("+Inf", 6)]
+    assert snapshot.histograms[(metrics.STAGE_SECONDS, (("stage", "text_extract"),))].count == 1
+
+    first.histograms[(metrics.STAGE_SECONDS, (("stage", "pdf_open"),))].observe(1)
+    assert registry.snapshot().histograms[(metrics.STAGE_SECONDS, (("stage", "pdf_open"),))].count == 6
+
+
+def test_open_sink(tmp_path):
+    snapshot = _registry().snapshot()
+    prometheus = metrics.open_sink(tmp_path / "metrics.prom")
+    json_lines = metrics.open_sink(tmp_path / "metrics.jsonl")
+
+    for sink in (prometheus, json_lines):
+        sink.write(snapshot)
+        sink.write(snapshot)
+
+    assert isinstance(prometheus, metrics.PrometheusSink)
+    assert (tmp_path / "metrics.prom").read_text() == EXPOSITION
+    assert isinstance(json_lines, metrics.JSONLinesSink)
+    records = [json.loads(line) for line in (tmp_path / "metrics.jsonl").read_text().splitlines()]
+    assert len(records) == 2
+    assert records[0]["histograms"][0]["buckets"] == {"0.1": 1, "1": 2, "10": 2, "+Inf": 3}
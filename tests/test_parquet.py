@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from ticketreader.output import ParquetHandler
+from ticketreader.output.parquet import PARTITION_COLUMN
+
+pytest.importorskip("pyarrow")
+
+
+@pytest.fixture
+def monthly_tickets(tickets):
+    """Tickets bought twenty days after each other, over four months"""
+    start = datetime(2024, 1, 15, 19, 23)
+    return [ticket.model_copy(update={"purchase_datetime": start + timedelta(days=20 * index)})
+            for index, ticket in enumerate(tickets)]
+
+
+def test_tickets_round_trip(tmp_path, monthly_tickets):
+    with ParquetHandler(directory=tmp_path, batch_size=2) as handler:
+        assert handler.save_tickets(monthly_tickets[:3]) == 3
+    with ParquetHandler(directory=tmp_path) as handler:
+        handler.save_tickets(monthly_tickets[3:])
+
+        tickets = handler.read("tickets").sort_by("purchase_datetime").to_pylist()
+        unit_products = handler.read("unit_products").to_pylist()
+        iva = handler.read("iva").to_pylist()
+
+    assert [row["invoice_id"] for row in tickets] == [ticket.invoice_id for ticket in monthly_tickets]
+    assert [row["purchase_datetime"] for row in tickets] == [ticket.purchase_datetime for ticket in monthly_tickets]
+    assert [row["total"] for row in tickets] == [ticket.total for ticket in monthly_tickets]
+    assert tickets[0]["supermarket_address_city"] == monthly_tickets[0].supermarket.address.city
+    assert len(unit_products) == 2 * len(monthly_tickets)
+    assert len(iva) == sum(len(ticket.iva) for ticket in monthly_tickets)
+    assert {row[PARTITION_COLUMN] for row in unit_products} == {"2024-01", "2024-02", "2024-03", "2024-04"}
+
+
+def test_datasets_are_partitioned_by_month(tmp_path, monthly_tickets):
+    with ParquetHandler(directory=tmp_path) as handler:
+        handler.save_tickets(monthly_tickets)
+        handler.save_tickets(monthly_tickets[:1])
+
+    partitions = sorted(path.name for path in (tmp_path / "tickets").iterdir())
+    assert partitions == [f"{PARTITION_COLUMN}=2024-0{month}" for month in range(1, 5)]
+    assert len(list((tmp_path / "bulk_products" / f"{PARTITION_COLUMN}=2024-01").glob("*.parquet"))) == 2
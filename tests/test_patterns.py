@@ -0,0 +1,55 @@
+from datetime import datetime
+
+import pytest
+
+from ticketreader.mercadona.schemas import PATTERNS, PatternsEnum
+from ticketreader.patterns import TICKET_DATETIME_FORMAT, parse_ticket_datetime
+
+import pdfs
+
+HEADER_FIELDS = ["ADDRESS", "PHONE", "PURCHASE_DATETIME", "INVOICE_NUMBER"]
+
+
+def _search_every_pattern(lines):
+    """First match of every header field, searching each pattern on its own"""
+    matches = {}
+    for name in HEADER_FIELDS:
+        for index, line in enumerate(lines):
+            match = PATTERNS[name].search(line)
+            if match is not None:
+                matches[name] = (match.groups(), index)
+                break
+    return matches
+
+
+@pytest.mark.parametrize("value", [
+    "15/01/2024 19:23", "29/02/2024 00:00", "31/12/1999 23:59", "1/02/2024 10:00", "15/01/2024 9:05",
+    "31/02/2024 10:00", "15/13/2024 10:00", "15-01-2024 10:00", "15/01/2024 24:00", "aa/bb/cccc dd:ee", "",
+])
+def test_ticket_datetimes_parse_like_strptime(value):
+    try:
+        expected = datetime.strptime(value, TICKET_DATETIME_FORMAT)
+    except ValueError:
+        with pytest.raises(ValueError):
+            parse_ticket_datetime(value)
+    else:
+        assert parse_ticket_datetime(value) == expected
+
+
+@pytest.mark.parametrize("lines", [
+    [text for row in pdfs.TICKET_ROWS[:7] for _, text in row],
+    ["MERCADONA, S.A. A-46103834", "46009 VALENCIA 963471920", "03/11/2023 18:47  OP: 5021486",
+     "FACTURA SIMPLIFICADA: 4127-023-618305 963471921"],
+    ["FACTURA SIMPLIFICADA: 4127-023-618305", "15/01/2024 19:23 15/01/2024 19:24", "TELEFONO: 916905406"],
+    ["MERCADONA, S.A. A-46103834", "TARJETA BANCARIA"],
+    [],
+], ids=["ticket", "shared_lines", "out_of_order", "missing_fields", "empty"])
+def test_header_scan_matches_every_pattern_search(lines):
+    matches = PATTERNS.header.scan(lines)
+
+    assert {name: (match.groups, match.line) for name, match in matches.items()} == _search_every_pattern(lines)
+
+
+def test_patterns_are_compiled_once():
+    assert PATTERNS["TOTAL"] is PATTERNS["TOTAL"]
+    assert set(PATTERNS.compiled) == {pattern.name for pattern in PatternsEnum}
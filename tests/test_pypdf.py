@@ -0,0 +1,62 @@
+import json
+import shutil
+import pathlib
+
+import pytest
+
+from ticketreader import mercadona
+from ticketreader.mercadona.pypdf import EndState, MercadonaPyPDFStrategy
+from ticketreader.parser import ParserEngine
+from ticketreader.strategies import ExtractionMode
+
+import pdfs
+
+FIXTURES = sorted((pathlib.Path(__file__).parent / "fixtures").glob("mercadona-*.pdf"))
+
+
+@pytest.mark.parametrize("fixture", FIXTURES, ids=lambda path: path.stem)
+def test_fixture_tickets(fixture):
+    ticket = mercadona.parse_mercadona_ticket(fixture, engine=ParserEngine.PYPDF)
+
+    assert json.loads(ticket.model_dump_json()) == json.loads(fixture.with_suffix(".json").read_text())
+
+
+@pytest.mark.parametrize("mode", [ExtractionMode.SINGLE_PASS, pytest.param(
+    ExtractionMode.TABULA, marks=pytest.mark.skipif(shutil.which("java") is None,
+                                                    reason="tabula needs a Java runtime"))])
+def test_pypdf_matches_tabula_strategy(ticket_files, mode):
+    for file_path in ticket_files[:2]:
+        pypdf = mercadona.parse_mercadona_ticket(file_path, engine=ParserEngine.PYPDF)
+        tabula = mercadona.parse_mercadona_ticket(file_path, mode=mode)
+
+        assert pypdf.model_dump() == tabula.model_dump()
+
+
+def test_reused_strategy_matches_fresh_strategies(ticket_files, tmp_path):
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(pdfs.render_pdf([pdfs.TICKET_ROWS[:9]]))
+    file_paths = [FIXTURES[0], ticket_files[0], broken, *FIXTURES[1:], ticket_files[1]]
+    strategy = MercadonaPyPDFStrategy()
+
+    results = list(strategy.parse_many(file_paths))
+    assert len(results) == len(file_paths)
+
+    for file_path, result in zip(file_paths, results):
+        fresh = MercadonaPyPDFStrategy()
+        fresh.file_path = file_path
+        if file_path == broken:
+            assert "Ticket incomplete" in result.error
+            continue
+        assert result.ticket.model_dump() == fresh.parse().model_dump()
+
+
+def test_states_are_created_once(ticket_files):
+    strategy = MercadonaPyPDFStrategy()
+    list(strategy.parse_many(ticket_files[:1]))
+    states = dict(strategy.context._states)
+
+    list(strategy.parse_many(ticket_files[1:]))
+
+    assert strategy.context._states == states
+    assert all(state.context is strategy.context for state in states.values())
+    assert isinstance(strategy.context.state, EndState)
@@ -0,0 +1,62 @@
+from ticketreader import registry
+from ticketreader.parser import ParserEngine
+from ticketreader.schemas import SuperMarketType
+from ticketreader.strategies import ExtractionMode
+
+import pdfs
+
+
+def test_iter_tickets_detects_lazily_in_file_order(tmp_path, monkeypatch):
+    unknown = [[(20, "SUPERMERCADO DESCONOCIDO")]]
+    pages = [pdfs.ticket_rows("2345-012-000000"), unknown, pdfs.ticket_rows("2345-012-000002")]
+    file_paths = []
+    for number, rows in enumerate(pages):
+        file_path = tmp_path / f"ticket-{number}.pdf"
+        file_path.write_bytes(pdfs.render_pdf([rows]))
+        file_paths.append(file_path)
+
+    detect_supermarket = registry.detect_supermarket
+    detected = []
+
+    def counted_detect_supermarket(file_path):
+        detected.append(file_path)
+        return detect_supermarket(file_path)
+
+    monkeypatch.setattr(registry, "detect_supermarket", counted_detect_supermarket)
+    results = registry.iter_tickets(file_paths, engine=ParserEngine.PYPDF)
+
+    first = next(results)
+    assert first.ticket.invoice_id == "2345-012-000000"
+    assert detected == file_paths[:1]
+
+    rest = list(results)
+    assert [result.file_path for result in rest] == file_paths[1:]
+    assert not rest[0].ok and "UnknownSupermarket" in rest[0].error
+    assert rest[1].ticket.invoice_id == "2345-012-000002"
+
+
+def test_iter_tickets_opens_one_pool_per_supermarket(tmp_path, monkeypatch):
+    unknown = [[(20, "SUPERMERCADO DESCONOCIDO")]]
+    pages = [pdfs.ticket_rows("2345-012-000000"), unknown, pdfs.ticket_rows("2345-012-000002"), unknown,
+             pdfs.ticket_rows("2345-012-000004")]
+    file_paths = []
+    for number, rows in enumerate(pages):
+        file_path = tmp_path / f"ticket-{number}.pdf"
+        file_path.write_bytes(pdfs.render_pdf([rows]))
+        file_paths.append(file_path)
+
+    parser = registry._registry[SuperMarketType.MERCADONA]
+    pools = []
+
+    def counted_worker_pool(*args):
+        pools.append(args)
+        return parser.worker_pool(*args)
+
+    monkeypatch.setitem(registry._registry, SuperMarketType.MERCADONA,
+                        parser._replace(worker_pool=counted_worker_pool))
+    results = list(registry.iter_tickets(file_paths, engine=ParserEngine.PYPDF, workers=2))
+
+    assert pools == [(2, ParserEngine.PYPDF, ExtractionMode.TABULA)]
+    assert [result.file_path for result in results] == file_paths
+    assert [result.ticket.invoice_id for result in results[::2]] == [
+        "2345-012-000000", "2345-012-000002", "2345-012-000004"]
@@ -0,0 +1,41 @@
+import pathlib
+
+import pydantic
+import pytest
+
+from ticketreader.mercadona.tabula import MercadonaTabulaStrategy
+from ticketreader.schemas import VALIDATION_SAMPLE_RATE, UnitProduct, ValidationMode, build_model
+from ticketreader.strategies import ExtractionMode
+
+FIXTURE = pathlib.Path(__file__).parent / "fixtures" / "mercadona-type3.pdf"
+
+
+def _parse(validation):
+    strategy = MercadonaTabulaStrategy(mode=ExtractionMode.SINGLE_PASS, validation=validation)
+    strategy.file_path = FIXTURE
+    return strategy.parse()
+
+
+def test_validation_modes_give_equal_tickets():
+    full = _parse(ValidationMode.FULL).model_dump()
+
+    assert _parse(ValidationMode.SAMPLED).model_dump() == full
+    assert _parse(ValidationMode.OFF).model_dump() == full
+
+
+def test_full_validation_rejects_bad_values():
+    with pytest.raises(pydantic.ValidationError):
+        build_model(UnitProduct, validation=ValidationMode.FULL, name="LECHE", quantity="uno", price_per_item=0.89)
+
+    product = build_model(UnitProduct, validation=ValidationMode.OFF, name="LECHE", quantity="uno",
+                          price_per_item=0.89)
+    assert product.quantity == "uno"
+
+
+def test_sampled_validation_checks_one_of_every_rate():
+    values = dict(name="LECHE", quantity=1, price_per_item="0,89")
+
+    assert build_model(UnitProduct, validation=ValidationMode.SAMPLED, index=0, **values).price_per_item == 0.89
+    assert build_model(UnitProduct, validation=ValidationMode.SAMPLED, index=VALIDATION_SAMPLE_RATE,
+                       **values).price_per_item == 0.89
+    assert build_model(UnitProduct, validation=ValidationMode.SAMPLED, index=1, **values).price_per_item == "0,89"
@@ -0,0 +1,141 @@
+import asyncio
+import shutil
+from concurrent.futures import Executor, Future
+
+import pytest
+
+from ticketreader import output, service
+from ticketreader.manifest import Manifest
+from ticketreader.parser import ParserEngine
+from ticketreader.service import IngestionService
+
+
+class InlineExecutor(Executor):
+    """Executor running every call in the caller thread"""
+
+    def submit(self, fn, /, *args, **kwargs):
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+
+class ListWriter:
+    """Writer keeping the saved tickets in memory"""
+
+    def __init__(self, fail: bool = False):
+        self.tickets = []
+        self.flushes = 0
+        self.fail = fail
+
+    def save_tickets(self, tickets):
+        if self.fail:
+            raise OSError("disk full")
+        self.tickets.extend(tickets)
+        return len(tickets)
+
+    def flush(self):
+        self.flushes += 1
+
+
+def _ingest(writer, file_paths, manifest=None, **kwargs):
+    async def run():
+        async with IngestionService(writer=writer, engine=ParserEngine.PYPDF, executor=InlineExecutor(),
+                                    manifest=manifest, batch_timeout=0.01, **kwargs) as ingestion:
+            for file_path in file_paths:
+                await ingestion.enqueue(file_path)
+            await ingestion.join()
+        return ingestion.report
+
+    return asyncio.run(run())
+
+
+def test_writers_without_flush_are_rejected(tmp_path):
+    with output.ExcelStreamWriter(file_name=tmp_path / "tickets.xlsx") as writer:
+        with pytest.raises(TypeError, match="flush"):
+            IngestionService(writer=writer)
+
+
+def test_writers_with_flush_are_accepted(tmp_path):
+    with output.JSONLinesHandler(file_name=tmp_path / "tickets.jsonl") as writer:
+        assert IngestionService(writer=writer).writer is writer
+
+
+def test_tickets_are_written_in_order(ticket_files, tmp_path):
+    writer = ListWriter()
+    manifest = Manifest(tmp_path / "manifest.json")
+
+    report = _ingest(writer, ticket_files, manifest=manifest, batch_size=2)
+
+    assert [ticket.invoice_id for ticket in writer.tickets] == [f"2345-012-{number:06d}" for number in range(5)]
+    assert (report.new, report.skipped, report.duplicates, report.failed) == (5, 0, 0, 0)
+    assert writer.flushes >= 3
+    assert all(Manifest.load(manifest.path).is_unchanged(file_path) for file_path in ticket_files)
+
+
+def test_processed_files_are_skipped(ticket_files, tmp_path):
+    manifest = Manifest(tmp_path / "manifest.json")
+    _ingest(ListWriter(), ticket_files[:3], manifest=manifest)
+
+    writer = ListWriter()
+    report = _ingest(writer, ticket_files, manifest=manifest)
+
+    assert [ticket.invoice_id for ticket in writer.tickets] == ["2345-012-000003", "2345-012-000004"]
+    assert (report.new, report.skipped) == (2, 3)
+
+
+def test_duplicate_invoices_in_one_batch(ticket_files, tmp_path):
+    copy = tmp_path / "copy.pdf"
+    shutil.copyfile(ticket_files[0], copy)
+    writer = ListWriter()
+    manifest = Manifest(tmp_path / "manifest.json")
+
+    report = _ingest(writer, [ticket_files[0], copy, ticket_files[1]], manifest=manifest)
+
+    assert [ticket.invoice_id for ticket in writer.tickets] == ["2345-012-000000", "2345-012-000001"]
+    assert (report.new, report.duplicates) == (2, 1)
+    assert manifest.is_unchanged(copy)
+
+
+def test_failed_writes_are_not_recorded(ticket_files, tmp_path):
+    manifest = Manifest(tmp_path / "manifest.json")
+
+    report = _ingest(ListWriter(fail=True), ticket_files, manifest=manifest)
+
+    assert report.failed == 5
+    assert report.new == 0
+    assert not any(manifest.is_unchanged(file_path) for file_path in ticket_files)
+    assert not manifest.path.exists()
+
+
+def test_watch_enqueues_files_once_they_are_stable(tmp_path, monkeypatch):
+    first, second = tmp_path / "a.pdf", tmp_path / "b.pdf"
+    polls = iter([
+        {first: (1, 1), second: (1, 1)},
+        {first: (1, 1), second: (2, 2)},
+        {first: (1, 1), second: (2, 2)},
+        {first: (3, 3), second: (2, 2)},
+        {first: (3, 3), second: (2, 2)},
+    ])
+    enqueued = []
+
+    class Stop(Exception):
+        pass
+
+    def scan_inbox(inbox, recursive):
+        try:
+            return next(polls)
+        except StopIteration:
+            raise Stop
+
+    async def enqueue(file_path):
+        enqueued.append(file_path)
+        return True
+
+    monkeypatch.setattr(service, "_scan_inbox", scan_inbox)
+    ingestion = IngestionService(writer=ListWriter())
+    monkeypatch.setattr(ingestion, "enqueue", enqueue)
+
+    with pytest.raises(Stop):
+        asyncio.run(ingestion.watch(tmp_path, interval=0))
+
+    assert enqueued == [first, second, first]
@@ -0,0 +1,55 @@
+import pytest
+
+from ticketreader.output import SQLHandler
+
+
+def _count(handler, table):
+    return handler.connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_stored_tickets_are_skipped_across_runs(tmp_path, tickets):
+    database = tmp_path / "tickets.sqlite3"
+    with SQLHandler(database=database) as handler:
+        assert handler.save_tickets(tickets[:3]) == 3
+
+    with SQLHandler(database=database, batch_size=2) as handler:
+        assert handler.save_tickets([tickets[0], *tickets[2:], tickets[4]]) == 2
+        invoice_ids = [row[0] for row in handler.connection.execute("SELECT invoice_id FROM tickets ORDER BY id")]
+        assert invoice_ids == [ticket.invoice_id for ticket in tickets]
+        assert _count(handler, "supermarkets") == 1
+        assert _count(handler, "unit_products") == 2 * len(tickets)
+        assert _count(handler, "bulk_products") == len(tickets)
+        assert _count(handler, "iva") == sum(len(ticket.iva) for ticket in tickets)
+
+
+def test_failing_batch_is_rolled_back(tmp_path, tickets, monkeypatch):
+    handler = SQLHandler(database=tmp_path / "tickets.sqlite3", batch_size=2)
+    handler.save_ticket(tickets[0])
+    insert_tickets = handler._insert_tickets
+
+    def failing_insert_tickets(cursor, batch):
+        insert_tickets(cursor, batch)
+        raise OSError("disk full")
+
+    monkeypatch.setattr(handler, "_insert_tickets", failing_insert_tickets)
+    with pytest.raises(OSError):
+        handler.save_tickets(tickets[1:3])
+
+    assert _count(handler, "tickets") == 1
+    assert _count(handler, "unit_products") == 2
+    assert not handler._supermarket_ids
+
+    monkeypatch.setattr(handler, "_insert_tickets", insert_tickets)
+    assert handler.save_tickets(tickets) == 4
+    handler.close()
+
+
+def test_taken_tickets_are_saved_when_the_iterable_fails(tmp_path, tickets):
+    def failing_tickets():
+        yield from tickets[:3]
+        raise ValueError("Ticket incomplete")
+
+    with SQLHandler(database=tmp_path / "tickets.sqlite3", batch_size=2) as handler:
+        with pytest.raises(ValueError):
+            handler.save_tickets(failing_tickets())
+        assert _count(handler, "tickets") == 3
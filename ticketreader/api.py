@@ -1,25 +1,139 @@
 """Main script for ticketreader"""
 import os
+import logging
 import pathlib
+import contextlib
+from typing import Callable, Iterable, Iterator, Optional, TypeVar
 from ticketreader import config
+from ticketreader import metrics
+from ticketreader.cache import ParseCache
+from ticketreader.manifest import IngestReport, Manifest
+from ticketreader.parser import ParserEngine
+from ticketreader.schemas import ParseResult, Ticket
+from ticketreader.strategies import ExtractionMode
 
 from ticketreader import mercadona
 from ticketreader import output
 
+logger = logging.getLogger(__name__)
 
-def parse_one_mercadona_ticket(ticket_path: pathlib.Path, destination: pathlib.Path) -> None:
+TICKETS_TOTAL = "ticketreader_tickets_total"
+"""Counter of ingested ticket files by status: new, skipped, duplicated or failed"""
+
+WriterType = TypeVar("WriterType", bound=output.TicketWriter)
+
+
+def parse_one_mercadona_ticket(ticket_path: pathlib.Path, destination: pathlib.Path,
+                               engine: ParserEngine = ParserEngine.TABULA) -> None:
     """Parse one ticket"""
-    ticket = mercadona.parse_mercadona_ticket_tabula(file_path=ticket_path)
+    ticket = mercadona.parse_mercadona_ticket(file_path=ticket_path, engine=engine)
     excel_handler = output.ExcelHandler(file_name=destination)
     excel_handler.save_ticket(ticket)
-    excel_handler.save_workbook()
 
 
-def parse_mercadona_directory(ticket_directory: pathlib.Path, destination: pathlib.Path) -> None:
-    """Parse directory"""
-    tickets = mercadona.parse_mercadona_tickets(
-        directory_path=ticket_directory)
-    for ticket in tickets:
-        excel_handler = output.ExcelHandler(file_name=destination)
-        excel_handler.save_ticket(ticket)
-        excel_handler.save_workbook()
+def parse_mercadona_directory(ticket_directory: pathlib.Path, destination: pathlib.Path,
+                              recursive: bool = False, workers: int = 1,
+                              checkpoint_interval: Optional[int] = None,
+                              write_mode: output.WriteMode = output.WriteMode.INSERT,
+                              sort_newest_first: bool = False,
+                              cache: Optional[ParseCache] = None,
+                              incremental: bool = False,
+                              engine: ParserEngine = ParserEngine.TABULA) -> IngestReport:
+    """Parse directory. Tickets are added to the workbook as soon as they are parsed and
+    the workbook is written once at the end, or every checkpoint_interval tickets.
+    With a parse cache (see mercadona.open_parse_cache), unchanged files are not parsed again.
+
+    In incremental mode a manifest is kept next to the destination. Files already
+    processed are skipped before parsing and invoices already written are refused."""
+    if not os.path.isdir(ticket_directory):
+        raise ValueError(f"File path {ticket_directory} is not a directory")
+
+    manifest = Manifest.load(manifest_path(destination)) if incremental else None
+    writer = output.ExcelBatchWriter(file_name=destination, checkpoint_interval=checkpoint_interval,
+                                     write_mode=write_mode, sort_newest_first=sort_newest_first,
+                                     on_flush=manifest.save if manifest is not None else None)
+    with closing_with_manifest(writer, manifest):
+        report = ingest_mercadona_tickets(
+            file_paths=mercadona.iter_ticket_files(ticket_directory, recursive=recursive),
+            writer=writer, manifest=manifest, workers=workers, cache=cache, engine=engine)
+
+    logger.info(f"Parsed {ticket_directory}: {report}")
+    return report
+
+
+def ingest_mercadona_tickets(file_paths: Iterable[pathlib.Path], writer: output.TicketWriter,
+                             manifest: Optional[Manifest] = None, workers: int = 1,
+                             cache: Optional[ParseCache] = None,
+                             engine: ParserEngine = ParserEngine.TABULA,
+                             mode: ExtractionMode = ExtractionMode.TABULA,
+                             progress: Optional[Callable[[IngestReport], None]] = None) -> IngestReport:
+    """Parse ticket files and save the tickets with any output handler. With a manifest,
+    files already processed are skipped and invoices already written are refused.
+    A file is recorded once the writer has taken its ticket; saving the manifest is
+    left to the caller, once the writer has been closed (see closing_with_manifest).
+    The progress callback is called after every file."""
+    report = IngestReport()
+
+    def pending_files() -> Iterator[pathlib.Path]:
+        for file_path in file_paths:
+            if manifest is not None and manifest.is_unchanged(file_path):
+                logger.debug(f"Skipping file {file_path}. Already processed")
+                report.skipped += 1
+                metrics.increment(TICKETS_TOTAL, status="skipped")
+                continue
+            yield file_path
+
+    def new_tickets(results: Iterator[ParseResult]) -> Iterator[Ticket]:
+        for result in results:
+            ticket = _accept_result(result, manifest, report)
+            if progress is not None:
+                progress(report)
+            if ticket is not None:
+                yield ticket
+                # The writer asked for the next ticket, so it has taken this one
+                if manifest is not None:
+                    manifest.record(result.file_path, ticket, sha256=result.sha256)
+
+    results = mercadona.iter_mercadona_ticket_files(
+        file_paths=pending_files(), workers=workers, cache=cache, engine=engine, mode=mode)
+    writer.save_tickets(new_tickets(results))
+    return report
+
+
+def _accept_result(result: ParseResult, manifest: Optional[Manifest], report: IngestReport) -> Optional[Ticket]:
+    """Count a parse result in the report and return its ticket if it has to be written"""
+    if result.ticket is None:
+        report.failed += 1
+        metrics.increment(TICKETS_TOTAL, status="failed")
+        return None
+    if manifest is not None and manifest.has_invoice(result.ticket.invoice_id):
+        manifest.record(result.file_path, result.ticket, sha256=result.sha256)
+        logger.info(f"Skipping ticket {result.ticket.invoice_id}. Already written")
+        report.duplicates += 1
+        metrics.increment(TICKETS_TOTAL, status="duplicated")
+        return None
+    report.new += 1
+    metrics.increment(TICKETS_TOTAL, status="new")
+    return result.ticket
+
+
+@contextlib.contextmanager
+def closing_with_manifest(writer: WriterType, manifest: Optional[Manifest]) -> Iterator[WriterType]:
+    """Close the writer and then save the manifest, also when the ingestion is
+    interrupted. Writers store every ticket they have taken when they are closed,
+    so the manifest always matches the output. If closing fails the manifest is
+    not saved and the files are processed again on the next run."""
+    try:
+        yield writer
+    finally:
+        close = getattr(writer, "close", None)
+        if close is not None:
+            close()
+        if manifest is not None:
+            manifest.save()
+
+
+def manifest_path(destination: os.PathLike) -> pathlib.Path:
+    """Manifest path of an output file"""
+    destination = pathlib.Path(destination)
+    return destination.with_name(f"{destination.name}.manifest.json")
@@ -0,0 +1,116 @@
+"""Parse cache module. Parsed tickets are stored on disk as JSON, keyed on a hash of
+the ticket file contents and the parser that produced them."""
+import os
+import hashlib
+import logging
+import pathlib
+from typing import Dict, Optional, Type
+
+from ticketreader import utils
+from ticketreader.parser import TicketType
+
+logger = logging.getLogger(__name__)
+
+
+class ParseCache:
+    """On-disk parse cache with a size bound and least recently used eviction.
+
+    The namespace identifies the parser (name, version, column layouts...). Entries
+    written by a different namespace are never returned, so changing it
+    invalidates the cache. Old entries are evicted once the size bound is reached.
+
+    Usage:
+        cache = ParseCache(directory=config.CACHE_DIR, namespace="mercadona-tabula:1")
+        key = cache.key(file_path, digest=utils.file_digest(file_path))
+        ticket = cache.get(key, MercadonaTicket)
+        if ticket is None:
+            ticket = parse(file_path)
+            cache.set(key, ticket)
+    """
+
+    DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+    """Default size bound in bytes"""
+    SUFFIX = ".json"
+
+    def __init__(self, directory: os.PathLike, namespace: str = "",
+                 max_size: int = DEFAULT_MAX_SIZE) -> None:
+        self.directory = pathlib.Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.namespace = namespace
+        self.max_size = max_size
+        self._sizes: Dict[pathlib.Path, int] = {
+            path: path.stat().st_size for path in self.directory.glob(f"*/*{self.SUFFIX}")}
+        self._size = sum(self._sizes.values())
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def size(self) -> int:
+        """Size of the cached entries in bytes"""
+        return self._size
+
+    def key(self, file_path: os.PathLike, digest: Optional[str] = None) -> str:
+        """Cache key of a ticket file: hash of the namespace and its contents digest.
+        The digest given by utils.file_digest can be passed to avoid reading the file again."""
+        if digest is None:
+            digest = utils.file_digest(file_path)
+        return hashlib.sha256(f"{self.namespace}:{digest}".encode()).hexdigest()
+
+    def _entry_path(self, key: str) -> pathlib.Path:
+        """Entry path. Entries are spread in subdirectories by key prefix."""
+        return self.directory / key[:2] / f"{key}{self.SUFFIX}"
+
+    def get(self, key: str, model: Type[TicketType]) -> Optional[TicketType]:
+        """Get cached ticket, or None if it is not cached"""
+        path = self._entry_path(key)
+        try:
+            ticket = model.model_validate_json(path.read_bytes())
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except ValueError:
+            logger.warning(f"Discarding corrupted cache entry {path}")
+            self._remove(path)
+            self.misses += 1
+            return None
+
+        # Touch the entry so it is evicted last
+        os.utime(path)
+        self.hits += 1
+        return ticket
+
+    def set(self, key: str, ticket: TicketType) -> None:
+        """Store ticket, evicting the least recently used entries if the cache is full"""
+        path = self._entry_path(key)
+        path.parent.mkdir(exist_ok=True)
+        data = ticket.model_dump_json().encode()
+
+        # Write and rename so readers never see a partial entry
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        self._size += len(data) - self._sizes.get(path, 0)
+        self._sizes[path] = len(data)
+
+        if self.size > self.max_size:
+            self._evict()
+
+    def _evict(self) -> None:
+        """Remove least recently used entries until the cache fits in its size bound"""
+        by_access = sorted(self._sizes, key=lambda path: path.stat().st_mtime if path.exists() else 0)
+        for path in by_access:
+            if self._size <= self.max_size:
+                break
+            self._remove(path)
+        logger.debug(f"Parse cache evicted down to {self._size} bytes")
+
+    def _remove(self, path: pathlib.Path) -> None:
+        """Remove an entry"""
+        path.unlink(missing_ok=True)
+        self._size -= self._sizes.pop(path, 0)
+
+    def clear(self) -> None:
+        """Remove every entry"""
+        for path in list(self._sizes):
+            self._remove(path)
+        logger.info(f"Parse cache {self.directory} cleared")
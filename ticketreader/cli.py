@@ -0,0 +1,191 @@
+"""Command line interface for ticketreader.
+
+Usage:
+    ticketreader file TICKET [TICKET ...] [options]
+    ticketreader dir DIRECTORY [--recursive] [options]
+    ticketreader glob PATTERN [options]
+    ticketreader watch INBOX [--interval SECONDS] [options]
+"""
+import os
+import sys
+import glob
+import logging
+import time
+import pathlib
+import argparse
+from enum import Enum
+from typing import Iterator, List, Optional
+
+from ticketreader import config
+from ticketreader import metrics
+from ticketreader.manifest import IngestReport
+from ticketreader.parser import ParserEngine
+from ticketreader.strategies import ExtractionMode
+
+
+class OutputBackend(str, Enum):
+    """Output backend"""
+    EXCEL = 'excel'
+    SQL = 'sql'
+    JSONL = 'jsonl'
+
+
+DEFAULT_DESTINATIONS = {
+    OutputBackend.EXCEL: config.DATA_DIR / "tickets.xlsx",
+    OutputBackend.SQL: config.DATA_DIR / "tickets.sqlite3",
+    OutputBackend.JSONL: config.DATA_DIR / "tickets.jsonl",
+}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Argument parser"""
+    options = argparse.ArgumentParser(add_help=False)
+    options.add_argument("-w", "--workers", type=int, default=1,
+                         help="parallel worker processes (default: 1)")
+    options.add_argument("-o", "--output", type=OutputBackend, choices=[backend.value for backend in OutputBackend],
+                         default=OutputBackend.EXCEL, help="output backend (default: excel)")
+    options.add_argument("-d", "--destination", type=pathlib.Path,
+                         help="output file (default: data/tickets.xlsx, .sqlite3 or .jsonl)")
+    options.add_argument("--engine", type=ParserEngine, choices=[engine.value for engine in ParserEngine],
+                         default=ParserEngine.TABULA, help="ticket reader (default: tabula)")
+    options.add_argument("--mode", type=ExtractionMode, choices=[mode.value for mode in ExtractionMode],
+                         default=ExtractionMode.TABULA, help="tabula extraction mode (default: tabula)")
+    options.add_argument("--cache", action="store_true", help="reuse tickets parsed in previous runs")
+    options.add_argument("--cache-dir", type=pathlib.Path, default=config.CACHE_DIR,
+                         help="parse cache directory (default: data/.cache)")
+    options.add_argument("--incremental", action="store_true",
+                         help="skip files already processed and invoices already written")
+    options.add_argument("-q", "--quiet", action="store_true", help="do not print progress")
+    options.add_argument("--metrics", type=pathlib.Path, metavar="FILE",
+                         help="write stage timings and counters, Prometheus text format for .prom files "
+                              "and JSON lines otherwise")
+    options.add_argument("--log-level", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                         help="ticketreader log level (default: from config/logging.ini)")
+
+    parser = argparse.ArgumentParser(prog="ticketreader", description="Read supermarket tickets.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    file_parser = subparsers.add_parser("file", parents=[options], help="parse ticket files")
+    file_parser.add_argument("paths", nargs="+", type=pathlib.Path, metavar="TICKET")
+
+    dir_parser = subparsers.add_parser("dir", parents=[options], help="parse a directory of tickets")
+    dir_parser.add_argument("directory", type=pathlib.Path)
+    dir_parser.add_argument("-r", "--recursive", action="store_true", help="walk into subdirectories")
+
+    glob_parser = subparsers.add_parser("glob", parents=[options], help="parse the tickets matching a pattern")
+    glob_parser.add_argument("pattern", help="glob pattern, ** matches subdirectories")
+
+    watch_parser = subparsers.add_parser("watch", parents=[options],
+                                         help="keep parsing the tickets copied to an inbox directory")
+    watch_parser.add_argument("inbox", type=pathlib.Path)
+    watch_parser.add_argument("-r", "--recursive", action="store_true", help="watch subdirectories too")
+    watch_parser.add_argument("--interval", type=float, default=2.0, help="seconds between polls (default: 2)")
+    watch_parser.add_argument("--batch-size", type=int, default=50, help="tickets per write (default: 50)")
+
+    return parser
+
+
+def _file_paths(args: argparse.Namespace) -> Iterator[pathlib.Path]:
+    """Ticket files of the command"""
+    from ticketreader import mercadona
+
+    if args.command == "file":
+        yield from args.paths
+    elif args.command == "dir":
+        if not os.path.isdir(args.directory):
+            raise ValueError(f"File path {args.directory} is not a directory")
+        yield from mercadona.iter_ticket_files(args.directory, recursive=args.recursive)
+    else:
+        for path in sorted(glob.iglob(args.pattern, recursive=True)):
+            if pathlib.Path(path).suffix in mercadona.VALID_EXTENSIONS:
+                yield pathlib.Path(path)
+
+
+def _open_writer(backend: OutputBackend, destination: pathlib.Path):
+    """Output handler of the backend"""
+    from ticketreader import output
+
+    if backend == OutputBackend.SQL:
+        return output.SQLHandler(database=destination)
+    if backend == OutputBackend.JSONL:
+        return output.JSONLinesHandler(file_name=destination)
+    return output.ExcelBatchWriter(file_name=destination)
+
+
+def _watch(args: argparse.Namespace, writer, manifest, cache, progress) -> IngestReport:
+    """Run the ingestion service on the inbox until interrupted"""
+    import asyncio
+    from ticketreader.service import IngestionService
+
+    service = IngestionService(writer=writer, workers=args.workers, engine=args.engine, mode=args.mode,
+                               cache=cache, manifest=manifest, batch_size=args.batch_size, progress=progress)
+
+    async def run() -> None:
+        async with service:
+            await service.watch(args.inbox, interval=args.interval, recursive=args.recursive)
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return service.report
+
+
+class Progress:
+    """Progress line on stderr, rewritten after every file"""
+
+    def __init__(self, enabled: bool) -> None:
+        self.enabled = enabled and sys.stderr.isatty()
+        self.start = time.perf_counter()
+
+    def __call__(self, report: IngestReport) -> None:
+        if self.enabled:
+            print(f"\r{report}", end="", file=sys.stderr, flush=True)
+
+    def finish(self, report: IngestReport) -> str:
+        """Summary with the throughput"""
+        if self.enabled:
+            print(file=sys.stderr)
+        elapsed = time.perf_counter() - self.start
+        parsed = report.new + report.duplicates
+        return (f"{report} in {elapsed:.2f} s "
+                f"({parsed / elapsed if elapsed else 0:.1f} tickets/s)")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the command line interface. Returns the exit code."""
+    args = build_parser().parse_args(argv)
+    config.configure_logging()
+    if args.log_level:
+        logging.getLogger("ticketreader").setLevel(args.log_level)
+
+    from ticketreader import api, mercadona
+    from ticketreader.manifest import Manifest
+
+    destination = args.destination or DEFAULT_DESTINATIONS[args.output]
+    cache = mercadona.open_parse_cache(mode=args.mode, directory=args.cache_dir, engine=args.engine) \
+        if args.cache else None
+    manifest = Manifest.load(api.manifest_path(destination)) if args.incremental else None
+    progress = Progress(enabled=not args.quiet)
+
+    try:
+        with api.closing_with_manifest(_open_writer(args.output, destination), manifest) as writer:
+            if args.command == "watch":
+                report = _watch(args, writer=writer, manifest=manifest, cache=cache, progress=progress)
+            else:
+                report = api.ingest_mercadona_tickets(
+                    file_paths=_file_paths(args), writer=writer, manifest=manifest, workers=args.workers,
+                    cache=cache, engine=args.engine, mode=args.mode, progress=progress)
+    except (ValueError, OSError) as e:
+        print(f"ticketreader: error: {e}", file=sys.stderr)
+        return 2
+
+    if args.metrics:
+        metrics.REGISTRY.export(metrics.open_sink(args.metrics))
+
+    print(progress.finish(report))
+    return 1 if report.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
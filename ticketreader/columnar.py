@@ -0,0 +1,214 @@
+"""Columnar ticket store. Products of many tickets are packed in typed NumPy arrays
+so aggregates run vectorized instead of looping over pydantic objects."""
+import logging
+from typing import Dict, Iterable, List, Tuple, Type
+
+import numpy as np
+import pandas as pd
+
+from ticketreader.schemas import (
+    Address, BulkProduct, IVA, SuperMarket, Ticket, UnitProduct, ValidationMode, build_model)
+from ticketreader.mercadona.schemas import MercadonaTicket
+
+logger = logging.getLogger(__name__)
+
+StoreKey = Tuple[str, str, int, str]
+
+NO_UNIT = -1
+"""Unit of measure code of products sold by unit"""
+
+
+class TicketBatch:
+    """Tickets packed in columns. Ticket columns have one value per ticket and item
+    columns one value per product; ticket_index links every item to its ticket.
+
+    Usage:
+        batch = TicketBatch.from_tickets(tickets)
+        batch.spend_per_month()
+        tickets = batch.to_tickets()
+    """
+
+    def __init__(self,
+                 invoice_ids: np.ndarray,
+                 purchase_datetimes: np.ndarray,
+                 ticket_totals: np.ndarray,
+                 store_index: np.ndarray,
+                 stores: List[SuperMarket],
+                 ticket_index: np.ndarray,
+                 names: np.ndarray,
+                 brands: np.ndarray,
+                 prices: np.ndarray,
+                 quantities: np.ndarray,
+                 totals: np.ndarray,
+                 unit_codes: np.ndarray,
+                 units: np.ndarray,
+                 iva_ticket_index: np.ndarray,
+                 iva_types: np.ndarray,
+                 iva_taxable_bases: np.ndarray,
+                 iva_fees: np.ndarray) -> None:
+        # Ticket columns
+        self.invoice_ids = invoice_ids
+        self.purchase_datetimes = purchase_datetimes
+        """Purchase datetimes as datetime64[s]"""
+        self.ticket_totals = ticket_totals
+        self.store_index = store_index
+        """Index of the ticket supermarket in stores"""
+        self.stores = stores
+
+        # Item columns
+        self.ticket_index = ticket_index
+        self.names = names
+        self.brands = brands
+        self.prices = prices
+        """Price per item or per unit of measure"""
+        self.quantities = quantities
+        self.totals = totals
+        self.unit_codes = unit_codes
+        """Index of the unit of measure in units, NO_UNIT for products sold by unit"""
+        self.units = units
+
+        # IVA columns
+        self.iva_ticket_index = iva_ticket_index
+        self.iva_types = iva_types
+        self.iva_taxable_bases = iva_taxable_bases
+        self.iva_fees = iva_fees
+
+    def __len__(self) -> int:
+        """Number of tickets"""
+        return len(self.invoice_ids)
+
+    @property
+    def item_count(self) -> int:
+        """Number of products"""
+        return len(self.ticket_index)
+
+    @property
+    def is_bulk(self) -> np.ndarray:
+        """Mask of the products sold by unit of measure"""
+        return self.unit_codes != NO_UNIT
+
+    @classmethod
+    def from_tickets(cls, tickets: Iterable[Ticket]) -> "TicketBatch":
+        """Pack tickets in columns"""
+        invoice_ids, purchase_datetimes, ticket_totals, store_index = [], [], [], []
+        stores: List[SuperMarket] = []
+        store_ids: Dict[StoreKey, int] = {}
+        ticket_index, names, brands, prices, quantities, totals, unit_codes = [], [], [], [], [], [], []
+        units: Dict[str, int] = {}
+        iva_ticket_index, iva_types, iva_taxable_bases, iva_fees = [], [], [], []
+
+        for index, ticket in enumerate(tickets):
+            invoice_ids.append(ticket.invoice_id)
+            purchase_datetimes.append(ticket.purchase_datetime)
+            ticket_totals.append(ticket.total)
+
+            address = ticket.supermarket.address
+            key = (ticket.supermarket.cif, address.street, address.postal_code, address.city)
+            if key not in store_ids:
+                store_ids[key] = len(stores)
+                stores.append(ticket.supermarket)
+            store_index.append(store_ids[key])
+
+            for product in ticket.products:
+                ticket_index.append(index)
+                names.append(product.name)
+                brands.append(product.brand)
+                quantities.append(product.quantity)
+                totals.append(product.total)
+                if isinstance(product, BulkProduct):
+                    prices.append(product.price_per_unit)
+                    unit_codes.append(units.setdefault(product.unit_of_measure, len(units)))
+                else:
+                    prices.append(product.price_per_item)
+                    unit_codes.append(NO_UNIT)
+
+            for iva in ticket.iva:
+                iva_ticket_index.append(index)
+                iva_types.append(iva.type)
+                iva_taxable_bases.append(iva.taxable_base)
+                iva_fees.append(iva.fee)
+
+        return cls(
+            invoice_ids=np.array(invoice_ids, dtype=object),
+            purchase_datetimes=np.array(purchase_datetimes, dtype="datetime64[s]"),
+            ticket_totals=np.array(ticket_totals, dtype=np.float64),
+            store_index=np.array(store_index, dtype=np.int32),
+            stores=stores,
+            ticket_index=np.array(ticket_index, dtype=np.int32),
+            names=np.array(names, dtype=object),
+            brands=np.array(brands, dtype=object),
+            prices=np.array(prices, dtype=np.float64),
+            quantities=np.array(quantities, dtype=np.float64),
+            totals=np.array(totals, dtype=np.float64),
+            unit_codes=np.array(unit_codes, dtype=np.int16),
+            units=np.array(list(units), dtype=object),
+            iva_ticket_index=np.array(iva_ticket_index, dtype=np.int32),
+            iva_types=np.array(iva_types, dtype=object),
+            iva_taxable_bases=np.array(iva_taxable_bases, dtype=np.float64),
+            iva_fees=np.array(iva_fees, dtype=np.float64),
+        )
+
+    def to_tickets(self, model: Type[Ticket] = MercadonaTicket,
+                   validation: ValidationMode = ValidationMode.OFF) -> List[Ticket]:
+        """Unpack the columns into ticket models. The values come from validated
+        models, so validation is off by default."""
+        item_bounds = np.searchsorted(self.ticket_index, np.arange(len(self) + 1))
+        iva_bounds = np.searchsorted(self.iva_ticket_index, np.arange(len(self) + 1))
+
+        tickets = []
+        for index in range(len(self)):
+            products = [self._product(item, validation) for item in range(item_bounds[index], item_bounds[index + 1])]
+            iva = [build_model(IVA, validation=validation, type=self.iva_types[item],
+                               taxable_base=float(self.iva_taxable_bases[item]), fee=float(self.iva_fees[item]))
+                   for item in range(iva_bounds[index], iva_bounds[index + 1])]
+            tickets.append(build_model(
+                model,
+                validation=validation,
+                invoice_id=self.invoice_ids[index],
+                supermarket=self.stores[self.store_index[index]],
+                purchase_datetime=self.purchase_datetimes[index].item(),
+                products=products,
+                iva=iva,
+                total=float(self.ticket_totals[index]),
+            ))
+        return tickets
+
+    def _product(self, item: int, validation: ValidationMode) -> UnitProduct | BulkProduct:
+        """Build one product model"""
+        if self.unit_codes[item] == NO_UNIT:
+            return build_model(UnitProduct, validation=validation, name=self.names[item], brand=self.brands[item],
+                               price_per_item=float(self.prices[item]), quantity=int(self.quantities[item]))
+        return build_model(BulkProduct, validation=validation, name=self.names[item], brand=self.brands[item],
+                           price_per_unit=float(self.prices[item]), unit_of_measure=self.units[self.unit_codes[item]],
+                           quantity=float(self.quantities[item]))
+
+    @property
+    def total_iva(self) -> np.ndarray:
+        """IVA fees per ticket, as Ticket.total_iva"""
+        return np.bincount(self.iva_ticket_index, weights=self.iva_fees, minlength=len(self))
+
+    def _group_spend(self, keys: np.ndarray) -> pd.Series:
+        """Sum item totals by key"""
+        labels, inverse = np.unique(keys, return_inverse=True)
+        spend = np.bincount(inverse.ravel(), weights=self.totals, minlength=len(labels))
+        return pd.Series(spend, index=labels, name="spend", dtype=np.float64)
+
+    def spend_per_month(self) -> pd.Series:
+        """Spend per purchase month, labelled YYYY-MM"""
+        months = self.purchase_datetimes.astype("datetime64[M]")[self.ticket_index]
+        return self._group_spend(months.astype(str))
+
+    def spend_per_product(self) -> pd.Series:
+        """Spend per product name"""
+        return self._group_spend(self.names.astype(str))
+
+    def spend_per_store(self) -> pd.Series:
+        """Spend per supermarket address"""
+        spend = np.bincount(self.store_index[self.ticket_index], weights=self.totals, minlength=len(self.stores))
+        return pd.Series(spend, index=[_store_label(store.address) for store in self.stores],
+                         name="spend", dtype=np.float64)
+
+
+def _store_label(address: Address) -> str:
+    """Store label"""
+    return f"{address.street}, {address.postal_code} {address.city}"
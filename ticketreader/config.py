@@ -1,10 +1,15 @@
 """Configuration file for ticketreader app."""
 import pathlib
-import logging.config
 
 ROOT_DIR = pathlib.Path(__file__).parents[1]
 DATA_DIR = ROOT_DIR / "data"
 CONFIG_DIR = ROOT_DIR / "config"
+CACHE_DIR = DATA_DIR / ".cache"
+LOGGING_CONFIG_FILE = CONFIG_DIR / "logging.ini"
 
-# Logging
-logging.config.fileConfig(CONFIG_DIR / "logging.ini")
+
+def configure_logging(config_file: pathlib.Path = LOGGING_CONFIG_FILE) -> None:
+    """Configure logging from an ini file. Importing ticketreader has no logging side
+    effects, so applications call this once at startup."""
+    import logging.config
+    logging.config.fileConfig(config_file, disable_existing_loggers=False)
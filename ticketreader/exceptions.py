@@ -2,4 +2,9 @@
 
 class WrongFileExtension(Exception):
     """Wrong file extension"""
-    pass
\ No newline at end of file
+    pass
+
+
+class UnknownSupermarket(Exception):
+    """Ticket of no registered supermarket"""
+    pass
@@ -0,0 +1,111 @@
+"""Manifest module. It keeps track of the ticket files already ingested into an
+output so that later runs only process new or changed files."""
+import os
+import logging
+import pathlib
+from typing import Dict, List, Optional, Set
+
+from pydantic import BaseModel, Field
+
+from ticketreader import utils
+from ticketreader.schemas import Ticket
+
+logger = logging.getLogger(__name__)
+
+
+class FileRecord(BaseModel):
+    """Processed file record"""
+    size: int = Field(title="File size in bytes")
+    mtime_ns: int = Field(title="File modification time in nanoseconds")
+    sha256: str = Field(title="File contents hash")
+    invoice_ids: List[str] = Field(title="Invoice ids read from the file", default_factory=list)
+
+
+class ManifestData(BaseModel):
+    """Manifest file contents"""
+    files: Dict[str, FileRecord] = Field(title="Processed files by path", default_factory=dict)
+
+
+class IngestReport(BaseModel):
+    """Incremental ingestion report"""
+    new: int = Field(title="Files parsed and written", default=0)
+    skipped: int = Field(title="Unchanged files skipped", default=0)
+    duplicates: int = Field(title="Files whose invoice was already written", default=0)
+    failed: int = Field(title="Files that could not be parsed", default=0)
+
+    def __str__(self) -> str:
+        return (f"{self.new} new, {self.skipped} skipped, "
+                f"{self.duplicates} duplicated, {self.failed} failed")
+
+
+class Manifest:
+    """Processed files manifest. Files are identified by path, size, modification
+    time and contents hash, and every written invoice id is remembered.
+
+    Usage:
+        manifest = Manifest.load(destination.with_suffix(".manifest.json"))
+        if not manifest.is_unchanged(file_path):
+            ticket = parse(file_path)
+            if not manifest.has_invoice(ticket.invoice_id):
+                save(ticket)
+            manifest.record(file_path, ticket)
+        manifest.save()
+    """
+
+    def __init__(self, path: os.PathLike, data: Optional[ManifestData] = None) -> None:
+        self.path = pathlib.Path(path)
+        self.data = data or ManifestData()
+        self._invoice_ids: Set[str] = {
+            invoice_id for record in self.data.files.values() for invoice_id in record.invoice_ids}
+
+    @classmethod
+    def load(cls, path: os.PathLike) -> "Manifest":
+        """Load manifest. A missing file gives an empty manifest."""
+        path = pathlib.Path(path)
+        if not path.exists():
+            return cls(path=path)
+        return cls(path=path, data=ManifestData.model_validate_json(path.read_bytes()))
+
+    def save(self) -> None:
+        """Write manifest. The file is replaced at once so a crash never leaves it half written."""
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(self.data.model_dump_json(indent=2))
+        os.replace(tmp_path, self.path)
+        logger.debug(f"Manifest saved to {self.path} with {len(self.data.files)} files")
+
+    @staticmethod
+    def _key(file_path: os.PathLike) -> str:
+        """Manifest key of a file"""
+        return str(pathlib.Path(file_path).resolve())
+
+    def is_unchanged(self, file_path: os.PathLike, sha256: Optional[str] = None) -> bool:
+        """Whether the file was already processed and has not changed since. The
+        contents are only hashed when the size matches but the file was touched,
+        unless their hash is given."""
+        record = self.data.files.get(self._key(file_path))
+        if record is None:
+            return False
+
+        stat = os.stat(file_path)
+        if stat.st_size != record.size:
+            return False
+        if stat.st_mtime_ns == record.mtime_ns:
+            return True
+
+        if (sha256 or utils.file_digest(file_path)) != record.sha256:
+            return False
+        record.mtime_ns = stat.st_mtime_ns
+        return True
+
+    def has_invoice(self, invoice_id: str) -> bool:
+        """Whether the invoice was already written"""
+        return invoice_id in self._invoice_ids
+
+    def record(self, file_path: os.PathLike, ticket: Ticket, sha256: Optional[str] = None) -> None:
+        """Record a processed file and the invoice read from it. The contents are
+        hashed unless their hash is given."""
+        stat = os.stat(file_path)
+        self.data.files[self._key(file_path)] = FileRecord(
+            size=stat.st_size, mtime_ns=stat.st_mtime_ns, sha256=sha256 or utils.file_digest(file_path),
+            invoice_ids=[ticket.invoice_id])
+        self._invoice_ids.add(ticket.invoice_id)
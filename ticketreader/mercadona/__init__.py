@@ -1,25 +1,68 @@
-"""Package for Mercadona ticket reader."""
+"""Package for Mercadona ticket reader. Strategy modules are imported on first use."""
 import os
 import logging
 import pathlib
-from typing import List
+import contextlib
+import collections
+import multiprocessing
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from typing import TYPE_CHECKING, Deque, Iterable, Iterator, List, Optional, Tuple
 
+from ticketreader import config
+from ticketreader import metrics
+from ticketreader import registry
 from ticketreader import utils
-from ticketreader.parser import FileParser
+from ticketreader.cache import ParseCache
+from ticketreader.parser import FileParser, ParserEngine
+from ticketreader.schemas import ParseResult, SuperMarketType, ValidationMode
+from ticketreader.strategies import ExtractionMode
 
-from .schemas import MercadonaTicket
-from .tabula import MercadonaTabulaStrategy
+from .schemas import Mercadona, MercadonaTicket
+
+if TYPE_CHECKING:
+    from .tabula import MercadonaTabulaStrategy
+    from .pypdf import MercadonaPyPDFStrategy
+
+__getattr__, __dir__ = utils.lazy_attributes(__name__, {
+    "MercadonaTabulaStrategy": ".tabula",
+    "MercadonaPyPDFStrategy": ".pypdf",
+})
 
 logger = logging.getLogger(__name__)
 
+VALID_EXTENSIONS = [".pdf", ".PDF"]
+"""Ticket file extensions, the ones accepted by the Mercadona strategies"""
+
+_worker_strategy: Optional["MercadonaPyPDFStrategy"] = None
+"""PyPDF strategy of a process pool worker, reused for every file"""
+
 
 @utils.log_time(logger_name=__name__)
-def parse_mercadona_ticket_tabula(file_path: os.PathLike) -> MercadonaTicket:
-    """Parse Mercadona tickets"""
+def parse_mercadona_ticket_tabula(file_path: os.PathLike,
+                                  mode: ExtractionMode = ExtractionMode.TABULA,
+                                  validation: ValidationMode = ValidationMode.FULL) -> MercadonaTicket:
+    """Parse Mercadona tickets. With validation sampled or off, parsed values are trusted
+    and models are built without running the pydantic validators."""
+    from .tabula import MercadonaTabulaStrategy
     logger.info(f"Parsing Mercadona ticket {file_path}")
 
     # Stablish strategy and file path
-    strategy = MercadonaTabulaStrategy()
+    strategy = MercadonaTabulaStrategy(mode=mode, validation=validation)
+    strategy.file_path = file_path
+
+    parser = FileParser(parse_strategy=strategy)
+
+    return parser.parse()
+
+
+@utils.log_time(logger_name=__name__)
+def parse_mercadona_ticket_pypdf(file_path: os.PathLike,
+                                 strategy: Optional["MercadonaPyPDFStrategy"] = None) -> MercadonaTicket:
+    """Parse Mercadona ticket without Java. A strategy can be given to reuse its parse context."""
+    from .pypdf import MercadonaPyPDFStrategy
+    logger.info(f"Parsing Mercadona ticket {file_path}")
+
+    strategy = strategy or MercadonaPyPDFStrategy()
     strategy.file_path = file_path
 
     parser = FileParser(parse_strategy=strategy)
@@ -27,24 +70,222 @@ def parse_mercadona_ticket_tabula(file_path: os.PathLike) -> MercadonaTicket:
     return parser.parse()
 
 
+def parse_mercadona_ticket(file_path: os.PathLike,
+                           engine: ParserEngine = ParserEngine.TABULA,
+                           mode: ExtractionMode = ExtractionMode.TABULA,
+                           strategy: Optional["MercadonaPyPDFStrategy"] = None) -> MercadonaTicket:
+    """Parse Mercadona ticket with the given engine. Mode only applies to tabula,
+    strategy only to pypdf."""
+    if engine == ParserEngine.PYPDF:
+        return parse_mercadona_ticket_pypdf(file_path=file_path, strategy=strategy)
+    return parse_mercadona_ticket_tabula(file_path=file_path, mode=mode)
+
+
+def _init_worker(engine: ParserEngine, mode: ExtractionMode) -> None:
+    """Create the pypdf strategy of a process pool worker"""
+    global _worker_strategy
+    if engine == ParserEngine.PYPDF:
+        from .pypdf import MercadonaPyPDFStrategy
+        _worker_strategy = MercadonaPyPDFStrategy()
+
+
+def _worker_pool(workers: int, engine: ParserEngine, mode: ExtractionMode) -> ProcessPoolExecutor:
+    """Process pool of parse workers. Workers are forked from a fresh server process, never
+    from this one: a JVM started here by tabula-py through JPype does not survive a fork."""
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("forkserver"),
+                               initializer=_init_worker, initargs=(engine, mode))
+
+
+def _parse_file(file_path: pathlib.Path, engine: ParserEngine, mode: ExtractionMode,
+                strategy: Optional["MercadonaPyPDFStrategy"] = None) -> ParseResult:
+    """Parse one file. Errors are captured in the result so the batch goes on."""
+    try:
+        ticket = parse_mercadona_ticket(
+            file_path=file_path, engine=engine, mode=mode, strategy=strategy or _worker_strategy)
+        return ParseResult(file_path=file_path, ticket=ticket)
+    except Exception as e:
+        logger.error(f"Error parsing ticket {file_path}: {e}")
+        return ParseResult(file_path=file_path, error=f"{type(e).__name__}: {e}")
+
+
+def _parse_worker_file(file_path: pathlib.Path, engine: ParserEngine,
+                       mode: ExtractionMode) -> Tuple[ParseResult, metrics.MetricsSnapshot]:
+    """Parse one file in a process pool worker. The worker metrics are sent back with
+    the result and reset, so the parent registry sees every stage timing once."""
+    result = _parse_file(file_path=file_path, engine=engine, mode=mode)
+    return result, metrics.REGISTRY.snapshot(reset=True)
+
+
+def iter_ticket_files(directory_path: os.PathLike, recursive: bool = False) -> Iterator[pathlib.Path]:
+    """Iterate ticket files in name order, optionally walking into subdirectories"""
+    for entry in sorted(os.scandir(directory_path), key=lambda entry: entry.name):
+        file_path = pathlib.Path(entry.path)
+
+        if entry.is_dir():
+            if recursive:
+                yield from iter_ticket_files(file_path, recursive=recursive)
+            else:
+                logger.info(f"Skipping directory {file_path}. Not a file")
+            continue
+
+        if file_path.suffix not in VALID_EXTENSIONS:
+            logger.info(f"Skipping file {file_path}. Not a ticket")
+            continue
+
+        yield file_path
+
+
+def cache_namespace(mode: ExtractionMode = ExtractionMode.TABULA,
+                    engine: ParserEngine = ParserEngine.TABULA) -> str:
+    """Parse cache namespace. It changes with the parser version and column layouts,
+    so cached tickets are invalidated whenever they change."""
+    if engine == ParserEngine.PYPDF:
+        from .pypdf import MercadonaPyPDFStrategy
+        return f"{MercadonaPyPDFStrategy.__name__}:{MercadonaPyPDFStrategy.VERSION}"
+
+    from .tabula import MercadonaTabulaStrategy
+    strategy = MercadonaTabulaStrategy
+    return f"{strategy.__name__}:{strategy.VERSION}:{mode.value}:{strategy.COLUMNS}"
+
+
+def open_parse_cache(mode: ExtractionMode = ExtractionMode.TABULA,
+                     directory: os.PathLike = config.CACHE_DIR,
+                     max_size: int = ParseCache.DEFAULT_MAX_SIZE,
+                     engine: ParserEngine = ParserEngine.TABULA) -> ParseCache:
+    """Open the parse cache for Mercadona tickets"""
+    return ParseCache(directory=directory, namespace=cache_namespace(mode, engine), max_size=max_size)
+
+
+def _cached_result(file_path: pathlib.Path, cache: Optional[ParseCache]) -> Tuple[Optional[str], Optional[ParseResult]]:
+    """Contents hash of the file and the cached result, if any. The file is only
+    hashed with a cache, and the hash goes with the result so the manifest can
+    record it without reading the file again."""
+    if cache is None:
+        return None, None
+
+    digest = utils.file_digest(file_path)
+    ticket = cache.get(cache.key(file_path, digest=digest), MercadonaTicket)
+    if ticket is None:
+        metrics.increment("ticketreader_parse_cache_total", result="miss")
+        return digest, None
+
+    metrics.increment("ticketreader_parse_cache_total", result="hit")
+    logger.debug(f"Ticket {file_path} found in parse cache")
+    return digest, ParseResult(file_path=file_path, ticket=ticket, sha256=digest)
+
+
+def _worker_result(digest: Optional[str], future: Future, cache: Optional[ParseCache]) -> ParseResult:
+    """Result of a process pool future. Worker metrics are merged in this process."""
+    result, snapshot = future.result()
+    if snapshot is not None:
+        metrics.REGISTRY.merge(snapshot)
+    return _store_result(digest, result, cache)
+
+
+def _store_result(digest: Optional[str], result: ParseResult, cache: Optional[ParseCache]) -> ParseResult:
+    """Store a parsed ticket in the cache"""
+    if cache is not None and digest is not None:
+        result.sha256 = digest
+        if result.ticket is not None:
+            cache.set(cache.key(result.file_path, digest=digest), result.ticket)
+    return result
+
+
+def iter_mercadona_tickets(directory_path: os.PathLike,
+                           recursive: bool = False,
+                           mode: ExtractionMode = ExtractionMode.TABULA,
+                           workers: int = 1,
+                           cache: Optional[ParseCache] = None,
+                           engine: ParserEngine = ParserEngine.TABULA) -> Iterator[ParseResult]:
+    """Parse Mercadona tickets lazily, yielding one result per file as soon as it is ready.
+
+    Files are yielded in name order. With more workers, at most two files per
+    worker are in flight so memory stays flat on large archives. With a cache,
+    files whose contents were already parsed are not parsed again."""
+    if not os.path.isdir(directory_path):
+        raise ValueError(f"File path {directory_path} is not a directory")
+
+    return iter_mercadona_ticket_files(
+        file_paths=iter_ticket_files(directory_path, recursive=recursive),
+        mode=mode, workers=workers, cache=cache, engine=engine)
+
+
+def iter_mercadona_ticket_files(file_paths: Iterable[pathlib.Path],
+                                mode: ExtractionMode = ExtractionMode.TABULA,
+                                workers: int = 1,
+                                cache: Optional[ParseCache] = None,
+                                engine: ParserEngine = ParserEngine.TABULA,
+                                executor: Optional[Executor] = None) -> Iterator[ParseResult]:
+    """Parse the given Mercadona ticket files lazily, in order. See iter_mercadona_tickets.
+    With more workers, an executor from _worker_pool can be given so that many calls
+    share one process pool; it is left open."""
+    if workers > 1:
+        pool = contextlib.nullcontext(executor) if executor is not None else _worker_pool(workers, engine, mode)
+        with pool as executor:
+            pending: Deque[Tuple[Optional[str], Future]] = collections.deque()
+            try:
+                for file_path in file_paths:
+                    digest, result = _cached_result(file_path, cache)
+                    if result is not None:
+                        future: Future = Future()
+                        future.set_result((result, None))
+                    else:
+                        future = executor.submit(_parse_worker_file, file_path=file_path, engine=engine, mode=mode)
+                    pending.append((digest, future))
+
+                    if len(pending) >= workers * 2:
+                        digest, future = pending.popleft()
+                        yield _worker_result(digest, future, cache)
+                while pending:
+                    digest, future = pending.popleft()
+                    yield _worker_result(digest, future, cache)
+            finally:
+                for _, future in pending:
+                    future.cancel()
+        return
+
+    strategy = None
+    if engine == ParserEngine.PYPDF:
+        from .pypdf import MercadonaPyPDFStrategy
+        strategy = MercadonaPyPDFStrategy()
+    for file_path in file_paths:
+        digest, result = _cached_result(file_path, cache)
+        if result is None:
+            result = _parse_file(file_path=file_path, engine=engine, mode=mode, strategy=strategy)
+            result = _store_result(digest, result, cache)
+        yield result
+
+
 @utils.log_time(logger_name=__name__)
-def parse_mercadona_tickets(directory_path: os.PathLike) -> List[MercadonaTicket]:
-    """Parse Mercadona tickets"""
+def parse_mercadona_tickets(directory_path: os.PathLike,
+                            mode: ExtractionMode = ExtractionMode.TABULA,
+                            workers: int = 1,
+                            recursive: bool = False,
+                            cache: Optional[ParseCache] = None,
+                            engine: ParserEngine = ParserEngine.TABULA) -> List[MercadonaTicket]:
+    """Parse Mercadona tickets in file name order. Files that fail are logged and skipped.
+    With more workers, files are parsed in a process pool."""
     if not os.path.isdir(directory_path):
         raise ValueError(f"File path {directory_path} is not a directory")
 
     if not os.listdir(directory_path):
         raise ValueError(f"Directory {directory_path} is empty")
 
-    tickets = []
-    for file_name in os.listdir(directory_path):
-        file_path = pathlib.Path(os.path.join(directory_path, file_name))
+    results = list(iter_mercadona_tickets(
+        directory_path=directory_path, recursive=recursive, mode=mode, workers=workers,
+        cache=cache, engine=engine))
 
-        if not file_path.is_file():
-            logger.info(f"Skipping directory {file_path}. Not a file")
-            continue
+    failed = [result for result in results if not result.ok]
+    if failed:
+        logger.warning(f"{len(failed)} of {len(results)} tickets could not be parsed")
+
+    return [result.ticket for result in results if result.ticket is not None]  # type: ignore
 
-        ticket = parse_mercadona_ticket_tabula(file_path=file_path)
-        tickets.append(ticket)
 
-    return tickets
+registry.register_supermarket(registry.SupermarketParser(
+    supermarket=SuperMarketType.MERCADONA,
+    detector=registry.cif_detector(Mercadona.model_fields["cif"].default),
+    parse=parse_mercadona_ticket,
+    iter_results=iter_mercadona_ticket_files,
+    worker_pool=_worker_pool,
+    valid_extensions=tuple(VALID_EXTENSIONS)))
@@ -0,0 +1,233 @@
+"""PyPDF state machine reader for Mercadona tickets. It needs no Java runtime."""
+import os
+import re
+import logging
+import functools
+from typing import Any, Dict, Iterable, Iterator, List
+
+from ticketreader.schemas import Address, UnitProduct, BulkProduct, IVA, ParseResult
+from ticketreader.strategies import StateParserStrategy, PyPDFParseContext
+from ticketreader.strategies.statestrategy import ParseState
+from ticketreader.utils import FileHandlerMixin
+from ticketreader.patterns import parse_ticket_datetime
+from ticketreader.mercadona.schemas import Mercadona, MercadonaTicket, PATTERNS
+
+logger = logging.getLogger(__name__)
+
+
+class MercadonaParseState(ParseState):
+    """Mercadona parse state"""
+
+    @property
+    def context(self) -> "MercadonaParseContext":
+        """Parse context"""
+        return self._context  # type: ignore
+
+    @context.setter
+    def context(self, context: "MercadonaParseContext") -> None:
+        """Parse context"""
+        if not isinstance(context, MercadonaParseContext):
+            raise TypeError(f"Context must be a {MercadonaParseContext.__name__}")
+        self._context = context
+
+
+class HeaderState(MercadonaParseState):
+    """Supermarket info, purchase datetime and invoice id. The header lines are the
+    same ones read by index in MercadonaTabulaStrategy."""
+
+    STREET_LINE = 1
+    ADDRESS_LINE = 2
+    PHONE_LINE = 3
+    PURCHASE_DATETIME_LINE = 4
+    INVOICE_NUMBER_LINE = 5
+    COLUMNS_HEADER_LINE = 6
+
+    def parse(self, line: str, line_num: int, **kwargs) -> None:
+        data = self.context.data
+        if line_num == self.STREET_LINE:
+            data['street'] = line
+        elif line_num == self.ADDRESS_LINE:
+            matches = _match('ADDRESS', line, "Address")
+            data['address'] = Address(
+                street=data['street'],
+                postal_code=int(matches.groups()[0]),
+                city=matches.groups()[1],
+            )
+        elif line_num == self.PHONE_LINE:
+            data['phone'] = _match('PHONE', line, "Phone").groups()[0]
+        elif line_num == self.PURCHASE_DATETIME_LINE:
+            purchase_datetime = _match('PURCHASE_DATETIME', line, "Purchase datetime").groups()[0]
+            data['purchase_datetime'] = parse_ticket_datetime(purchase_datetime)
+        elif line_num == self.INVOICE_NUMBER_LINE:
+            data['invoice_id'] = _match('INVOICE_NUMBER', line, "Invoice id").groups()[0]
+        elif line_num == self.COLUMNS_HEADER_LINE:
+            self.context.change_state(UnitProductsState)
+
+
+class UnitProductsState(MercadonaParseState):
+    """Products sold by unit. A product line without price starts the bulk products."""
+
+    def parse(self, line: str, **kwargs) -> None:
+        if PATTERNS['TOTAL'].search(line):
+            self.context.change_state(TotalState)
+            self.context.state.parse(line=line, **kwargs)
+            return
+
+        matches = PATTERNS['UNIT_PRODUCT'].search(line)
+        if matches:
+            quantity, name, price_per_item, _ = matches.groups()
+            self.context.unit_products.append(UnitProduct(
+                quantity=quantity,
+                name=name,
+                price_per_item=price_per_item,
+            ))
+            return
+
+        if PATTERNS['BULK_PRODUCT_NAME'].search(line):
+            self.context.change_state(BulkProductsState)
+            self.context.state.parse(line=line, **kwargs)
+            return
+
+        logger.debug(f"Skipping line '{line}'. Not a unit product")
+
+
+class BulkProductsState(MercadonaParseState):
+    """Products sold by weight. Each one takes two lines: name, then quantity and prices."""
+
+    def parse(self, line: str, **kwargs) -> None:
+        if PATTERNS['TOTAL'].search(line):
+            self.context.change_state(TotalState)
+            self.context.state.parse(line=line, **kwargs)
+            return
+
+        matches = PATTERNS['BULK_PRODUCT_DETAILS'].search(line)
+        if matches:
+            quantity, unit_of_measure, price_per_unit, _ = matches.groups()
+            self.context.bulk_products.append(BulkProduct(
+                name=self.context.data['bulk_product_name'],
+                quantity=quantity,
+                unit_of_measure=unit_of_measure,
+                price_per_unit=price_per_unit,
+            ))
+            return
+
+        matches = PATTERNS['BULK_PRODUCT_NAME'].search(line)
+        if matches:
+            self.context.data['bulk_product_name'] = matches.groups()[1]
+            return
+
+        logger.debug(f"Skipping line '{line}'. Not a bulk product")
+
+
+class TotalState(MercadonaParseState):
+    """Total price and payment lines, up to the IVA table header"""
+
+    def parse(self, line: str, **kwargs) -> None:
+        matches = PATTERNS['TOTAL'].search(line)
+        if matches:
+            self.context.data['total'] = matches.groups()[0]
+        elif PATTERNS['IVA_HEADER'].search(line):
+            self.context.change_state(IVAState)
+
+
+class IVAState(MercadonaParseState):
+    """IVA table. The TOTAL row is kept, as MercadonaTabulaStrategy does."""
+
+    def parse(self, line: str, **kwargs) -> None:
+        matches = PATTERNS['IVA'].search(line)
+        if not matches:
+            logger.debug(f"Skipping line '{line}'. Not an IVA item")
+            return
+
+        iva_type, taxable_base, fee = matches.groups()
+        self.context.iva.append(IVA(type=iva_type, taxable_base=taxable_base, fee=fee))
+        if iva_type == 'TOTAL':
+            self.context.change_state(EndState)
+
+
+class EndState(MercadonaParseState):
+    """Everything after the IVA table is ignored"""
+
+    def parse(self, *args, **kwargs) -> None:
+        pass
+
+
+class MercadonaParseContext(PyPDFParseContext):
+    """Mercadona parse context. States store the captured data here."""
+
+    INITIAL_STATE = HeaderState
+    VALID_EXTENSIONS = [".pdf", ".PDF"]
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.data: Dict[str, Any] = dict()
+        """Captured header data and totals"""
+        self.unit_products: List[UnitProduct] = []
+        self.bulk_products: List[BulkProduct] = []
+        self.iva: List[IVA] = []
+
+    def reset(self) -> None:
+        """Clear the captured data and go back to the header state"""
+        super().reset()
+        self.data = dict()
+        self.unit_products = []
+        self.bulk_products = []
+        self.iva = []
+
+    def get_ticket(self) -> MercadonaTicket:
+        """Build the ticket from the captured data"""
+        if not isinstance(self.state, EndState):
+            raise ValueError(f"Ticket incomplete. Parsing stopped in {type(self.state).__name__}")
+
+        logger.info(f'Captured {len(self.unit_products)} unit products, '
+                    f'{len(self.bulk_products)} bulk products and {len(self.iva)} IVA items')
+        return MercadonaTicket(
+            supermarket=Mercadona(address=self.data['address'], phone=self.data['phone']),
+            invoice_id=self.data['invoice_id'],
+            purchase_datetime=self.data['purchase_datetime'],
+            products=self.unit_products + self.bulk_products,
+            iva=self.iva,
+            total=self.data['total'],
+        )
+
+
+class MercadonaPyPDFStrategy(StateParserStrategy, FileHandlerMixin):
+    """Mercadona parser strategy based on a pypdf state machine"""
+
+    VALID_EXTENSIONS = [".pdf", ".PDF"]
+
+    VERSION = 1
+    """Parser version. Bump it when the captured data changes, to invalidate parse caches."""
+
+    @functools.cached_property
+    def context(self) -> MercadonaParseContext:
+        """Parse context, reset and reused for every file parsed by this strategy"""
+        return MercadonaParseContext()
+
+    def parse(self, *args, **kwargs) -> MercadonaTicket:
+        context = self.context
+        context.reset()
+        context.file_path = self.file_path
+        try:
+            super().parse(context)
+            return context.get_ticket()
+        except Exception as e:
+            logger.error(f"Error parsing ticket.", exc_info=True)
+            raise e
+
+    def parse_many(self, file_paths: Iterable[os.PathLike]) -> Iterator[ParseResult]:
+        """Parse many files with the same context. Errors are captured in the results."""
+        for file_path in file_paths:
+            try:
+                self.file_path = file_path
+                yield ParseResult(file_path=file_path, ticket=self.parse())
+            except Exception as e:
+                yield ParseResult(file_path=file_path, error=f"{type(e).__name__}: {e}")
+
+
+def _match(pattern: str, line: str, name: str) -> re.Match:
+    """Search a registered pattern in a line"""
+    matches = PATTERNS[pattern].search(line)
+    if matches:
+        return matches
+    raise ValueError(f"{name} does not match pattern")
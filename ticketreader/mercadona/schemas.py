@@ -3,6 +3,7 @@ from enum import StrEnum
 from datetime import datetime
 from pydantic import Field, field_validator
 from ticketreader.schemas import SuperMarket, SuperMarketType, Ticket
+from ticketreader.patterns import parse_ticket_datetime, register_patterns
 
 
 class Mercadona(SuperMarket):
@@ -20,7 +21,11 @@ class MercadonaTicket(Ticket):
     def cast_purchase_datetime(cls, value: str) -> datetime:
         """Cast purchase datetime"""
         if isinstance(value, str):
-            return datetime.strptime(value, "%d/%m/%Y %H:%M")
+            try:
+                return parse_ticket_datetime(value)
+            except ValueError:
+                # ISO format, as serialized by model_dump_json
+                return datetime.fromisoformat(value)
         elif isinstance(value, datetime):
             return value
         raise TypeError("Wrong type for purchase datetime")
@@ -32,3 +37,15 @@ class PatternsEnum(StrEnum):
     PHONE = r'(\d{9})'
     PURCHASE_DATETIME = r'(\d{2}/\d{2}/\d{4} \d{2}:\d{2})'
     INVOICE_NUMBER = r'(\d{4}-\d{3}-\d{6})'
+    UNIT_PRODUCT = r'^(\d+) (.+?) (\d+,\d{2})(?: (\d+,\d{2}))?$'
+    BULK_PRODUCT_NAME = r'^(\d+) (\D.*)$'
+    BULK_PRODUCT_DETAILS = r'^(\d+,\d+) (\S+) (\d+,\d{2}) €/\S+ (\d+,\d{2})$'
+    TOTAL = r'^TOTAL \( ?€\) (\d+,\d{2})$'
+    IVA_HEADER = r'^IVA BASE IMPONIBLE'
+    IVA = r'^(\d+%|TOTAL) (\d+,\d{2}) (\d+,\d{2})$'
+
+
+PATTERNS = register_patterns(
+    SuperMarketType.MERCADONA, PatternsEnum,
+    header_fields=['ADDRESS', 'PHONE', 'PURCHASE_DATETIME', 'INVOICE_NUMBER'])
+"""Compiled Mercadona patterns"""
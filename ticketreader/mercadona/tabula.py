@@ -1,30 +1,67 @@
 """Tabula PDF reader for Mercadona tickets"""
 import re
-import math
 import logging
-from typing import List
+import functools
+from typing import Dict, List, NamedTuple, Optional, Tuple
 from datetime import datetime
 
-from pandas import Series
+import numpy as np
+import pandas as pd
 
-from ticketreader.schemas import Address, UnitProduct, BulkProduct, IVA
-from ticketreader.strategies import TabulaParserStrategy
-from ticketreader.mercadona.schemas import Mercadona, PatternsEnum, MercadonaTicket
+from ticketreader import metrics
+from ticketreader.schemas import (
+    Address, UnitProduct, BulkProduct, IVA, ValidationMode, build_model, comma_separated_float)
+from ticketreader.strategies import TabulaParserStrategy, ExtractionMode, PageSelection
+from ticketreader.strategies.tabulastrategy import PageArea
+from ticketreader.patterns import HeaderMatch, parse_ticket_datetime
+from ticketreader.mercadona.schemas import Mercadona, MercadonaTicket, PATTERNS
 
 logger = logging.getLogger(__name__)
 
+RowPosition = Tuple[int, int]
+"""Page index and row index of a layout row"""
+
+
+class TicketSections(NamedTuple):
+    """Areas of the ticket sections, by page number, one per column layout"""
+    header: Dict[int, PageArea]
+    """Top of the first page, down to the products table header"""
+    products: Dict[int, PageArea]
+    """From the first product down to the TOTAL (€) row"""
+    iva: Dict[int, PageArea]
+    """From the IVA table header down to its TOTAL row"""
+
 
 class MercadonaTabulaStrategy(TabulaParserStrategy):
 
     VALID_EXTENSIONS = [".pdf", ".PDF"]
 
-    def __init__(self):
-        columns = [
-            [612],
-            [64, 345, 508, 612],
-            [205.5, 405.5, 612],
-        ]
-        super().__init__(columns=columns)
+    VERSION = 2
+    """Parser version. Bump it when the captured data changes, to invalidate parse caches."""
+    COLUMNS = [
+        [612],
+        [64, 345, 508, 612],
+        [205.5, 405.5, 612],
+    ]
+    PAGES = [PageSelection.FIRST, PageSelection.ALL, PageSelection.LAST]
+    """Pages of every column layout: header on the first page, IVA on the last one"""
+    PRODUCTS_START_ROW = 7
+    """First product row of the products table"""
+    TOTAL_LABEL = 'TOTAL (€)'
+    IVA_HEADER_LABEL = 'IVA'
+    """First cell of the IVA table header"""
+    IVA_START_OFFSET = 3
+    """Rows from the total row to the first IVA row, when the IVA header is not found"""
+
+    def __init__(self, mode: ExtractionMode = ExtractionMode.TABULA,
+                 validation: ValidationMode = ValidationMode.FULL, crop_sections: bool = True):
+        super().__init__(columns=self.COLUMNS, mode=mode, pages=self.PAGES)
+
+        self.crop_sections = crop_sections
+        """Read every column layout only from the area of its section"""
+
+        self.validation = validation
+        """Validation of the captured models. Values are normalized before building them"""
 
         self.tmp = dict()
         """Temporary data"""
@@ -33,163 +70,251 @@ class MercadonaTabulaStrategy(TabulaParserStrategy):
 
         self.dataframes = self.get_dataframes()
         try:
-            return MercadonaTicket(
+            return build_model(
+                MercadonaTicket,
+                validation=self._header_validation,
                 supermarket=self._capture_supermarket_info(),
                 invoice_id=self._capture_invoice_id(),
                 purchase_datetime=self._capture_purchase_datetime(),
                 products=self._capture_unit_products() + self._capture_bluk_products(),
                 iva=self._capture_iva(),
-                total=self._capture_total(),  # type: ignore
+                total=comma_separated_float(self._capture_total()),
             )
         except Exception as e:
             logger.error(f"Error parsing ticket.", exc_info=True)
             raise e
 
+    def layout_areas(self, index: int) -> Dict[int, PageArea]:
+        """Section areas when they are found, whole pages otherwise"""
+        if self.sections is None:
+            return super().layout_areas(index)
+        return self.sections[index]
+
+    @functools.cached_property
+    def sections(self) -> Optional[TicketSections]:
+        """Locate the sections from the TOTAL (€) row and the IVA table header, using the
+        text layout. None when they are not found or the layout cannot be read, then
+        whole pages are read."""
+        if not self.crop_sections:
+            return None
+
+        try:
+            with metrics.stage("section_detection"):
+                return self._locate_sections()
+        except Exception:
+            logger.warning('Ticket sections could not be located, reading whole pages', exc_info=True)
+            return None
+
+    def _locate_sections(self) -> Optional[TicketSections]:
+        """Sections from the text rows of every page"""
+        pages = self.layout.pages
+        if len(pages[0].text_rows) <= self.PRODUCTS_START_ROW:
+            return None
+        total = self._find_row(lambda text: PATTERNS['TOTAL'].search(text) is not None)
+        iva_header = None
+        if total is not None:
+            iva_header = self._find_row(lambda text: PATTERNS['IVA_HEADER'].search(text) is not None,
+                                        after=total)
+        if total is None or iva_header is None:
+            logger.debug('Ticket sections not found, reading whole pages')
+            return None
+        iva_total = self._find_row(lambda text: _is_iva_total(PATTERNS['IVA'].search(text)), after=iva_header)
+
+        products_top = pages[0].gap_above(self.PRODUCTS_START_ROW)
+        header = {1: self._crop(1, bottom=products_top)}
+        products = {number: self._crop(number) for number in range(1, total[0] + 2)}
+        products[1] = self._crop(1, top=products_top)
+        products[total[0] + 1] = self._crop(total[0] + 1, top=products[total[0] + 1][0],
+                                            bottom=pages[total[0]].gap_below(total[1]))
+        iva = {number: self._crop(number) for number in range(iva_header[0] + 1, len(pages) + 1)}
+        iva[iva_header[0] + 1] = self._crop(iva_header[0] + 1, top=pages[iva_header[0]].gap_above(iva_header[1]))
+        if iva_total is not None:
+            iva = {number: area for number, area in iva.items() if number <= iva_total[0] + 1}
+            iva[iva_total[0] + 1] = self._crop(iva_total[0] + 1, top=iva[iva_total[0] + 1][0],
+                                               bottom=pages[iva_total[0]].gap_below(iva_total[1]))
+        return TicketSections(header=header, products=products, iva=iva)
+
+    def _find_row(self, matches, after: Optional[RowPosition] = None) -> Optional[RowPosition]:
+        """First layout row whose text matches, optionally after a given row"""
+        if after is None:
+            after = (0, -1)
+        for page_index, page in enumerate(self.layout.pages[after[0]:], start=after[0]):
+            start = after[1] + 1 if page_index == after[0] else 0
+            for row_index, row in enumerate(page.text_rows[start:], start=start):
+                if matches(row.text):
+                    return page_index, row_index
+        return None
+
+    def _crop(self, number: int, top: Optional[float] = None, bottom: Optional[float] = None) -> PageArea:
+        """Area of a page, optionally cropped to a vertical band"""
+        page_top, left, page_bottom, right = self.page_areas[number - 1]
+        return (page_top if top is None else top, left, page_bottom if bottom is None else bottom, right)
+
+    @property
+    def _products_start_row(self) -> int:
+        """First product row. The products area starts at the first product when it is cropped."""
+        return 0 if self.sections is not None else self.PRODUCTS_START_ROW
+
+    @property
+    def _header_validation(self) -> ValidationMode:
+        """Validation of the ticket and supermarket. Sampling only applies to list items."""
+        return ValidationMode.OFF if self.validation == ValidationMode.OFF else ValidationMode.FULL
+
     def _capture_supermarket_info(self) -> Mercadona:
         """Capture supermarket info"""
-        return Mercadona(
+        return build_model(
+            Mercadona,
+            validation=self._header_validation,
             address=self._capture_address(),
             phone=self._capture_phone(),
         )
 
+    def _scan_header(self) -> Dict[str, HeaderMatch]:
+        """Match every header field in one scan of the header rows"""
+        if 'header' not in self.tmp:
+            rows = self.dataframes[0][0].iloc[:self.PRODUCTS_START_ROW]
+            self.tmp['header_rows'] = [row if isinstance(row, str) else "" for row in rows]
+            self.tmp['header'] = PATTERNS.header.scan(self.tmp['header_rows'])
+        return self.tmp['header']
+
+    def _capture_header_item(self, name: str) -> HeaderMatch:
+        """Capture header item"""
+        match = self._scan_header().get(name)
+        if match is None:
+            raise ValueError(f"{name.capitalize()} does not match pattern")
+        return match
+
     def _capture_address(self) -> Address:
-        """Capture address."""
-        fragment = self.dataframes[0].iloc[2, 0]
-        street = self.dataframes[0].iloc[1, 0]
-
-        if isinstance(fragment, str) and isinstance(street, str):
-            matches = re.search(PatternsEnum.ADDRESS, fragment)
-            if matches:
-                return Address(
-                    street=street,
-                    postal_code=int(matches.groups()[0]),
-                    city=matches.groups()[1],
-                )
-            raise ValueError("Address does not match pattern")
-        raise TypeError("Wrong type for address")
-
-    def _capture_supermarket_info_item(self, fragment: str, pattern: str) -> str:
-        """Capture supermarket info item"""
-        if isinstance(fragment, str):
-            match = re.search(pattern, fragment)
-            if match:
-                return match.groups()[0]
-            raise ValueError("Fragment does not match pattern")
-        raise TypeError("Wrong type for fragment")
+        """Capture address. The street is the row above the postal code and city."""
+        match = self._capture_header_item('ADDRESS')
+        if match.line == 0:
+            raise ValueError("Street not found above address")
+        return build_model(
+            Address,
+            validation=self._header_validation,
+            street=self.tmp['header_rows'][match.line - 1],
+            postal_code=int(match.groups[0]),
+            city=match.groups[1],
+        )
 
     def _capture_phone(self) -> str:
         """Capture phone"""
-        return self._capture_supermarket_info_item(
-            fragment=str(self.dataframes[0].iloc[3, 0]),
-            pattern=PatternsEnum.PHONE
-        )
+        return self._capture_header_item('PHONE').groups[0]
 
     def _capture_purchase_datetime(self) -> datetime:
         """Capture purchase datetime"""
-        purchase_datetime = self._capture_supermarket_info_item(
-            fragment=str(self.dataframes[0].iloc[4, 0]),
-            pattern=PatternsEnum.PURCHASE_DATETIME
-        )
-        return datetime.strptime(purchase_datetime, "%d/%m/%Y %H:%M")
+        return parse_ticket_datetime(self._capture_header_item('PURCHASE_DATETIME').groups[0])
 
     def _capture_invoice_id(self) -> str:
         """Capture invoice id"""
-        return self._capture_supermarket_info_item(
-            fragment=str(self.dataframes[0].iloc[5, 0]),
-            pattern=PatternsEnum.INVOICE_NUMBER
-        )
+        return self._capture_header_item('INVOICE_NUMBER').groups[0]
 
-    def _capture_unit_products(self) -> List[UnitProduct]:
-        """Capture unit products"""
-        unit_products = []
-        for index, row in self.dataframes[1][7:].iterrows():
+    def _classify_product_rows(self) -> None:
+        """Split the product table rows in unit products, bulk products and total in
+        one vectorized pass. Unit products go first; the first row without an
+        amount starts the bulk products, and the TOTAL row ends them."""
+        if 'total_row_index' in self.tmp:
+            return
 
-            if isinstance(row[3], float) and math.isnan(row[3]):
-                self.tmp['bulk_products_start_index'] = index
-                break
+        with metrics.stage("row_classification"):
+            rows = self.dataframes[1].iloc[self._products_start_row:]
+            total_positions = np.flatnonzero((rows[2] == self.TOTAL_LABEL).to_numpy())
+            if not len(total_positions):
+                raise ValueError("Total row not found")
+            total_position = total_positions[0]
 
-            if isinstance(row[2], str) and row[2] == 'TOTAL (€)':
-                self.tmp['total_row_index'] = index
-                break
+            bulk_positions = np.flatnonzero(rows[3].isna().to_numpy()[:total_position])
+            bulk_position = bulk_positions[0] if len(bulk_positions) else total_position
 
-            product = self._capture_uproduct(row)
-            unit_products.append(product)
+        self.tmp['unit_product_rows'] = rows.iloc[:bulk_position]
+        self.tmp['bulk_product_rows'] = rows.iloc[bulk_position:total_position]
+        self.tmp['total_row_index'] = rows.index[total_position]
+
+    def _capture_unit_products(self) -> List[UnitProduct]:
+        """Capture unit products"""
+        self._classify_product_rows()
+        rows = self.tmp['unit_product_rows']
+
+        # Single items only have the amount, which is also the price per item
+        prices = rows[2].where(rows[2].notna(), rows[3])
+        unit_products = [
+            build_model(UnitProduct, validation=self.validation, index=index, quantity=int(quantity),
+                        name=name, price_per_item=comma_separated_float(price))
+            for index, (quantity, name, price) in enumerate(zip(rows[0], rows[1], prices))
+        ]
 
         logger.info(f'Captured {len(unit_products)} unit products')
         return unit_products
 
-    def _capture_uproduct(self, row: Series) -> UnitProduct:
-        """Capture unit product"""
-        return UnitProduct(
-            quantity=row[0],
-            name=row[1],
-            price_per_item=row[3] if isinstance(row[2], float) else row[2],
-        )
-
     def _capture_bluk_products(self) -> List[BulkProduct]:
-        """Capture bulk products"""
-
-        bulk_products = []
+        """Capture bulk products. Each one is a description row followed by a details row."""
+        self._classify_product_rows()
+        rows = self.tmp['bulk_product_rows']
 
-        if 'bulk_products_start_index' not in self.tmp:
+        if rows.empty:
             logger.info('No bulk products found')
-            return bulk_products
-
-        for index, row in self.dataframes[1][self.tmp['bulk_products_start_index']:].iterrows():
-
-            if isinstance(row[2], str) and row[2] == 'TOTAL (€)':
-                self.tmp['total_row_index'] = index
-                break
-
-            if isinstance(row[2], float) and math.isnan(row[2]):
-                self._capture_bprouct_description(row)
-            else:
-                product = self._capture_bproduct_details(row)
-                bulk_products.append(product)
+            return []
+
+        is_description = rows[2].isna()
+        names = rows[1].where(is_description).ffill()[~is_description]
+        details = rows[~is_description]
+        quantities = details[1].str.split(" ", expand=True)
+        prices = details[2].str.split(" ").str[0]
+
+        bulk_products = [
+            build_model(BulkProduct, validation=self.validation, index=index, name=name,
+                        quantity=comma_separated_float(quantity), unit_of_measure=unit,
+                        price_per_unit=comma_separated_float(price))
+            for index, (name, quantity, unit, price) in enumerate(zip(names, quantities[0], quantities[1], prices))
+        ]
 
         logger.info(f'Captured {len(bulk_products)} bulk products')
         return bulk_products
 
-    def _capture_bprouct_description(self, row: Series) -> None:
-        """Capture bulk product description"""
-        self.tmp['tmp_bulk_product_name'] = row[1]
-
-    def _capture_bproduct_details(self, row: Series) -> BulkProduct:
-        """Capture bulk product details"""
-        quantity, unit = row[1].split(" ")
-        return BulkProduct(
-            name=self.tmp['tmp_bulk_product_name'],
-            quantity=quantity,
-            unit_of_measure=unit,
-            price_per_unit=row[2].split(" ")[0],
-        )
-
     def _capture_total(self) -> str:
         """Capture total"""
+        self._classify_product_rows()
         total = self.dataframes[1].iloc[self.tmp['total_row_index'], 3]
         if isinstance(total, str):
             return total
         raise TypeError("Wrong type for total")
 
-    def _capture_iva(self) -> List[IVA]:
-        """Capture IVA"""
-        iva_start_row_index = self.tmp['total_row_index'] + 3
-        iva_items = []
-
-        for _, row in self.dataframes[2][iva_start_row_index:].iterrows():
-            iva_type_item = self._capture_iva_item(row)
-            iva_items.append(iva_type_item)
+    def _iva_rows(self) -> pd.DataFrame:
+        """IVA rows after the table header. The IVA columns are only read from the last
+        page; if the header is not there, they are read from every page and the rows
+        are located from the total row instead."""
+        rows = self.dataframes[2]
+        header_positions = np.flatnonzero((rows[0] == self.IVA_HEADER_LABEL).to_numpy())
+        if len(header_positions):
+            return rows.iloc[header_positions[0] + 1:]
+
+        logger.debug('IVA header not found in the IVA area')
+        if self.sections is not None:
+            raise ValueError("IVA header not found")
+        if len(self.page_areas) > 1:
+            rows = self._get_dataframe(columns=self.COLUMNS[2], areas=self.selection_areas(PageSelection.ALL))
+        self._classify_product_rows()
+        return rows.iloc[self.tmp['total_row_index'] + self.IVA_START_OFFSET:]
 
-            if row[0] == 'TOTAL':
-                break
+    def _capture_iva(self) -> List[IVA]:
+        """Capture IVA. Rows go from the table header to the TOTAL row, both included."""
+        rows = self._iva_rows()
+
+        total_positions = np.flatnonzero((rows[0] == 'TOTAL').to_numpy())
+        if len(total_positions):
+            rows = rows.iloc[:total_positions[0] + 1]
+
+        iva_items = [
+            build_model(IVA, validation=self.validation, index=index, type=iva_type,
+                        taxable_base=comma_separated_float(taxable_base), fee=comma_separated_float(fee))
+            for index, (iva_type, taxable_base, fee) in enumerate(
+                rows[[0, 1, 2]].itertuples(index=False, name=None))
+        ]
 
         logger.info(f'Captured {len(iva_items)} IVA items')
         return iva_items
 
-    def _capture_iva_item(self, row: Series) -> IVA:
-        """Capture IVA item"""
-        return IVA(
-            type=row[0],
-            taxable_base=row[1],
-            fee=row[2]
-        )
+
+def _is_iva_total(matches: Optional[re.Match]) -> bool:
+    """Whether an IVA line is the TOTAL one"""
+    return matches is not None and matches.group(1) == 'TOTAL'
@@ -0,0 +1,308 @@
+"""Metrics module. Stage timings are recorded as histograms and events as counters
+in a registry, which is exported through pluggable sinks.
+
+Usage:
+    with metrics.stage("tabula_extract"):
+        dataframe = read_pdf(...)
+    metrics.increment("ticketreader_tickets_total", status="new")
+
+    metrics.REGISTRY.export(metrics.PrometheusSink(config.DATA_DIR / "metrics.prom"))
+"""
+import os
+import json
+import time
+import bisect
+import logging
+import pathlib
+import datetime
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Protocol, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+STAGE_SECONDS = "ticketreader_stage_seconds"
+"""Histogram of the pipeline stages: pdf_open, tabula_extract, row_classification..."""
+FUNCTION_SECONDS = "ticketreader_function_seconds"
+"""Histogram of the functions decorated with utils.log_time"""
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+"""Histogram upper bounds in seconds"""
+
+Labels = Tuple[Tuple[str, str], ...]
+MetricKey = Tuple[str, Labels]
+"""Metric name and sorted label pairs"""
+
+
+class Histogram:
+    """Histogram with fixed buckets. Counts are kept per bucket, the last one
+    holds the values above every bound."""
+
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Add one value"""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def merge(self, other: "Histogram") -> None:
+        """Add the values of a histogram with the same buckets"""
+        if other.buckets != self.buckets:
+            raise ValueError("Histograms with different buckets can not be merged")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """Cumulative counts per upper bound, ending with +Inf"""
+        bounds = [format(bound, "g") for bound in self.buckets] + ["+Inf"]
+        total = 0
+        counts = []
+        for bound, count in zip(bounds, self.counts):
+            total += count
+            counts.append((bound, total))
+        return counts
+
+    def copy(self) -> "Histogram":
+        histogram = Histogram(self.buckets)
+        histogram.merge(self)
+        return histogram
+
+
+class MetricsSnapshot(NamedTuple):
+    """Copy of the registry values. It can be pickled, so process pool workers
+    send their metrics back with their results."""
+    counters: Dict[MetricKey, float]
+    histograms: Dict[MetricKey, Histogram]
+
+
+class _Timer:
+    """Context manager that observes its elapsed time"""
+
+    __slots__ = ("registry", "key", "start")
+
+    def __init__(self, registry: "MetricsRegistry", key: MetricKey) -> None:
+        self.registry = registry
+        self.key = key
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.registry._observe(self.key, time.perf_counter() - self.start)
+
+
+class _NullTimer:
+    """Timer of a disabled registry"""
+
+    def __enter__(self) -> "_NullTimer":
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def _key(name: str, labels: Dict[str, Any]) -> MetricKey:
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+class MetricsRegistry:
+    """Counters and histograms of one process. Recording a value is a dictionary
+    lookup and a few additions under a lock, cheap enough to leave enabled."""
+
+    def __init__(self, enabled: bool = True, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self._counters: Dict[MetricKey, float] = {}
+        self._histograms: Dict[MetricKey, Histogram] = {}
+        self._lock = threading.Lock()
+        self._stage_keys: Dict[str, MetricKey] = {}
+
+    def increment(self, name: str, value: float = 1, **labels: Any) -> None:
+        """Add a value to a counter"""
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        """Add a value to a histogram"""
+        if self.enabled:
+            self._observe(_key(name, labels), value)
+
+    def _observe(self, key: MetricKey, value: float) -> None:
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def timer(self, name: str, **labels: Any) -> _Timer | _NullTimer:
+        """Context manager that observes its elapsed seconds in a histogram"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, _key(name, labels))
+
+    def stage(self, stage: str) -> _Timer | _NullTimer:
+        """Time a pipeline stage"""
+        if not self.enabled:
+            return _NULL_TIMER
+        key = self._stage_keys.get(stage)
+        if key is None:
+            key = self._stage_keys[stage] = _key(STAGE_SECONDS, {"stage": stage})
+        return _Timer(self, key)
+
+    def snapshot(self, reset: bool = False) -> MetricsSnapshot:
+        """Copy of the current values. With reset, the registry starts again from zero."""
+        with self._lock:
+            snapshot = MetricsSnapshot(
+                counters=dict(self._counters),
+                histograms={key: histogram.copy() for key, histogram in self._histograms.items()})
+            if reset:
+                self._counters.clear()
+                self._histograms.clear()
+        return snapshot
+
+    def merge(self, snapshot: MetricsSnapshot) -> None:
+        """Add the values of a snapshot, e.g. the metrics of a worker process"""
+        with self._lock:
+            for key, value in snapshot.counters.items():
+                self._counters[key] = self._counters.get(key, 0) + value
+            for key, histogram in snapshot.histograms.items():
+                if key in self._histograms:
+                    self._histograms[key].merge(histogram)
+                else:
+                    self._histograms[key] = histogram.copy()
+
+    def reset(self) -> None:
+        """Drop every value"""
+        self.snapshot(reset=True)
+
+    def export(self, sink: "MetricsSink") -> None:
+        """Write the current values to a sink"""
+        sink.write(self.snapshot())
+
+
+class MetricsSink(Protocol):
+    """Destination of the metrics"""
+
+    def write(self, snapshot: MetricsSnapshot) -> None:
+        ...
+
+
+class InMemorySink:
+    """Keeps every exported snapshot, for tests and interactive sessions"""
+
+    def __init__(self) -> None:
+        self.snapshots: List[MetricsSnapshot] = []
+
+    def write(self, snapshot: MetricsSnapshot) -> None:
+        self.snapshots.append(snapshot)
+
+    @property
+    def latest(self) -> Optional[MetricsSnapshot]:
+        """Last exported snapshot"""
+        return self.snapshots[-1] if self.snapshots else None
+
+
+class JSONLinesSink:
+    """Appends one JSON object per export to a file, so runs can be compared later"""
+
+    def __init__(self, file_name: os.PathLike) -> None:
+        self.file_name = pathlib.Path(file_name)
+
+    def write(self, snapshot: MetricsSnapshot) -> None:
+        with open(self.file_name, "a", encoding="utf-8") as file:
+            file.write(json.dumps(to_dict(snapshot)))
+            file.write("\n")
+        logger.debug(f"Metrics appended to {self.file_name}")
+
+
+class PrometheusSink:
+    """Writes the Prometheus text format, replacing the file on every export.
+    The file can be served by the node exporter textfile collector."""
+
+    def __init__(self, file_name: os.PathLike) -> None:
+        self.file_name = pathlib.Path(file_name)
+
+    def write(self, snapshot: MetricsSnapshot) -> None:
+        temporary = self.file_name.with_name(f"{self.file_name.name}.tmp")
+        temporary.write_text(render_prometheus(snapshot), encoding="utf-8")
+        os.replace(temporary, self.file_name)
+        logger.debug(f"Metrics written to {self.file_name}")
+
+
+def open_sink(file_name: os.PathLike) -> MetricsSink:
+    """Sink for a file: Prometheus text format for .prom files, JSON lines otherwise"""
+    if pathlib.Path(file_name).suffix == ".prom":
+        return PrometheusSink(file_name)
+    return JSONLinesSink(file_name)
+
+
+def to_dict(snapshot: MetricsSnapshot) -> Dict[str, Any]:
+    """JSON serializable snapshot"""
+    return {
+        "time": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "counters": [
+            {"name": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in sorted(snapshot.counters.items())
+        ],
+        "histograms": [
+            {"name": name, "labels": dict(labels), "count": histogram.count, "sum": histogram.sum,
+             "buckets": dict(histogram.cumulative())}
+            for (name, labels), histogram in sorted(snapshot.histograms.items(), key=lambda item: item[0])
+        ],
+    }
+
+
+def _format_labels(labels: Labels, extra: Labels = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    values = ",".join(f'{label}="{value}"' for label, value in pairs)
+    return f"{{{values}}}"
+
+
+def render_prometheus(snapshot: MetricsSnapshot) -> str:
+    """Snapshot in the Prometheus text exposition format"""
+    lines: List[str] = []
+    typed = set()
+    for (name, labels), value in sorted(snapshot.counters.items()):
+        if name not in typed:
+            lines.append(f"# TYPE {name} counter")
+            typed.add(name)
+        lines.append(f"{name}{_format_labels(labels)} {value:g}")
+    for (name, labels), histogram in sorted(snapshot.histograms.items(), key=lambda item: item[0]):
+        if name not in typed:
+            lines.append(f"# TYPE {name} histogram")
+            typed.add(name)
+        for bound, count in histogram.cumulative():
+            lines.append(f"{name}_bucket{_format_labels(labels, (('le', bound),))} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum:.6f}")
+        lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+    return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+"""Process wide registry used by the ticketreader pipeline"""
+
+
+def stage(name: str) -> _Timer | _NullTimer:
+    """Time a pipeline stage in the process wide registry"""
+    return REGISTRY.stage(name)
+
+
+def increment(name: str, value: float = 1, **labels: Any) -> None:
+    """Add a value to a counter of the process wide registry"""
+    REGISTRY.increment(name, value, **labels)
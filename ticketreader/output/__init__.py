@@ -1,16 +1,58 @@
-"""Output package for ticketreader."""
+"""Output package for ticketreader. Handlers are imported on first use."""
 import logging
-from .excel import ExcelHandler
+from typing import TYPE_CHECKING, Iterable, Optional, Protocol
+
+from .modes import WriteMode
 
 from ticketreader import config
 from ticketreader.schemas import Ticket
+from ticketreader.utils import lazy_attributes
+
+__getattr__, __dir__ = lazy_attributes(__name__, {
+    "ExcelHandler": ".excel",
+    "ExcelBatchWriter": ".excel",
+    "ExcelStreamWriter": ".excel",
+    "SQLHandler": ".sql",
+    "ParquetHandler": ".parquet",
+    "JSONLinesHandler": ".jsonl",
+})
+
+if TYPE_CHECKING:
+    from .excel import ExcelHandler, ExcelBatchWriter, ExcelStreamWriter
+    from .sql import SQLHandler
+    from .parquet import ParquetHandler
+    from .jsonl import JSONLinesHandler
 
 logger = logging.getLogger(__name__)
 
 
+class TicketWriter(Protocol):
+    """Output handler that saves tickets as they are consumed from an iterable"""
+
+    def save_tickets(self, tickets: Iterable[Ticket]) -> int:
+        ...
+
+
 def save_ticket(ticket: Ticket, destination: str = 'tickets.xlsx') -> None:
     """Save ticket to Excel file."""
+    from .excel import ExcelHandler
     excel_handler = ExcelHandler(config.DATA_DIR / destination)
     logging.info(f"Saving ticket {ticket.invoice_id}")
     excel_handler.save_ticket(ticket)
-    excel_handler.save_workbook()
+
+
+def save_tickets(tickets: Iterable[Ticket], destination: str = 'tickets.xlsx',
+                 checkpoint_interval: Optional[int] = None,
+                 write_mode: WriteMode = WriteMode.INSERT, sort_newest_first: bool = False) -> int:
+    """Save tickets to Excel file, loading and writing the workbook once."""
+    from .excel import ExcelBatchWriter
+    with ExcelBatchWriter(config.DATA_DIR / destination, checkpoint_interval=checkpoint_interval,
+                          write_mode=write_mode, sort_newest_first=sort_newest_first) as writer:
+        return writer.save_tickets(tickets)
+
+
+def export_tickets(tickets: Iterable[Ticket], destination: str = 'tickets.xlsx') -> int:
+    """Export tickets to a new Excel file, streaming rows with a write-only workbook."""
+    from .excel import ExcelStreamWriter
+    with ExcelStreamWriter(config.DATA_DIR / destination) as writer:
+        return writer.save_tickets(tickets)
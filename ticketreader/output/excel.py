@@ -1,33 +1,95 @@
 """Excel adapter for tickets."""
 import pathlib
 import logging
+import warnings
 import functools
-from typing import Optional, List, Iterator
+from datetime import datetime
+from typing import Callable, Dict, Optional, List, Iterable, Iterator
 
 from openpyxl import Workbook, load_workbook
 from openpyxl.worksheet.worksheet import Worksheet
-from openpyxl.worksheet.table import Table, TableStyleInfo
+from openpyxl.worksheet.table import Table, TableColumn, TableStyleInfo
+from openpyxl.worksheet.filters import AutoFilter
 from openpyxl.cell.cell import Cell
+from openpyxl.utils.cell import range_boundaries, get_column_letter
 
+from ticketreader import metrics
 from ticketreader.schemas import Ticket, UnitProduct, BulkProduct
 
+from .modes import WriteMode
+
 logging = logging.getLogger(__name__)
 
-DEFAULT_TABLE_STYLE = TableStyleInfo(name="DefaultTableStyle", showFirstColumn=False,
+DEFAULT_TABLE_STYLE = TableStyleInfo(name="TableStyleLight1", showFirstColumn=False,
                                      showLastColumn=False, showRowStripes=True, showColumnStripes=True)
 UNIT_PRODUCT_TABLE_HEADER = ["Supermercado", "Fecha de compra",
                              "ID de factura", "Cantidad", "Producto", "Precio"]
 TABLES_START_CELL = "C3"
+DATETIME_FORMAT = "%d/%m/%Y %H:%M:%S"
 
 
-class ExcelHandler:
-    """Excel adapter for tickets."""
+class TicketRowsMixin():
+    """Sheet names and table rows of a ticket."""
 
     # Sheet names
     TICKETS_SHEET: str = "Tickets"
     UNIT_PRODUCT_SHEET: str = "Productos unitarios"
     BULK_PRODUCT_SHEET: str = "Productos a granel"
 
+    def unit_product_list_generator(self, ticket: Ticket) -> Iterator[List[str | int | float]]:
+        """Build unit product list."""
+        unit_products = [
+            p for p in ticket.products if isinstance(p, UnitProduct)]
+        for product in unit_products:
+            yield [
+                ticket.supermarket.id.value,
+                f'{ticket.supermarket.address.street}, {ticket.supermarket.address.postal_code}, {ticket.supermarket.address.city}',
+                ticket.purchase_datetime.strftime(DATETIME_FORMAT),
+                ticket.invoice_id,
+                product.quantity,
+                product.name,
+                product.price_per_item,
+                product.total
+            ]
+
+        return UNIT_PRODUCT_TABLE_HEADER
+
+    def bulk_product_list_generator(self, ticket: Ticket) -> Iterator[List[str | int | float]]:
+        """Build bulk product list."""
+        bulk_products = [
+            p for p in ticket.products if isinstance(p, BulkProduct)]
+        for product in bulk_products:
+            yield [
+                ticket.supermarket.id.value,
+                f'{ticket.supermarket.address.street}, {ticket.supermarket.address.postal_code}, {ticket.supermarket.address.city}',
+                ticket.purchase_datetime.strftime(DATETIME_FORMAT),
+                ticket.invoice_id,
+                product.quantity,
+                product.name,
+                product.unit_of_measure,
+                product.price_per_unit,
+                product.total
+            ]
+
+        return UNIT_PRODUCT_TABLE_HEADER
+
+    def _get_total_row(self, ticket: Ticket) -> List[str | float]:
+        """Get total row."""
+        total_vat = [
+            iva_item.fee for iva_item in ticket.iva if iva_item.type == "TOTAL"]
+        return [
+            ticket.supermarket.id.value,
+            f'{ticket.supermarket.address.street}, {ticket.supermarket.address.postal_code}, {ticket.supermarket.address.city}',
+            ticket.purchase_datetime.strftime(DATETIME_FORMAT),
+            ticket.invoice_id,
+            total_vat[0] if total_vat else 0,
+            ticket.total,
+        ]
+
+
+class ExcelHandler(TicketRowsMixin):
+    """Excel adapter for tickets."""
+
     # Range
     TABLES_START_ROW = 4
     TABLES_START_COLUMN = 2
@@ -36,10 +98,18 @@ class ExcelHandler:
     BULK_PRODUCT_LAST_COLUMN = 12
     TICKET_IVA_LAST_COLUMN = 10
     TICKET_TOTAL_LAST_COLUMN = 16
+    PURCHASE_DATETIME_COLUMN = 5
 
-    def __init__(self, file_name: pathlib.Path):
-        """Initialize Excel adapter."""
+    def __init__(self, file_name: pathlib.Path, autosave: bool = True,
+                 write_mode: WriteMode = WriteMode.INSERT, sort_newest_first: bool = False):
+        """Initialize Excel adapter. With autosave, the workbook is written after every ticket.
+        In append mode, sort_newest_first sorts the tables by purchase date once, on close."""
         self._file_name = file_name
+        self.autosave = autosave
+        self.write_mode = write_mode
+        self.sort_newest_first = sort_newest_first
+        self._next_rows: Dict[str, int] = {}
+        """Next free table row per sheet, in append mode"""
         self.workbook = file_name
 
     @property
@@ -80,93 +150,288 @@ class ExcelHandler:
     def save_ticket(self, ticket: Ticket):
         """Save tickets to an Excel file."""
 
-        self._save_unit_products(ticket)
-        self._save_bulk_products(ticket)
-        self._save_total(ticket)
+        with metrics.stage("excel_rows"):
+            self._save_unit_products(ticket)
+            self._save_bulk_products(ticket)
+            self._save_total(ticket)
 
         # Save workbook
-        self.save_workbook()
+        if self.autosave:
+            self.save_workbook()
+
+    def save_tickets(self, tickets: Iterable[Ticket]) -> int:
+        """Save tickets as they are consumed from an iterable. Returns the number of saved tickets."""
+        saved = 0
+        for ticket in tickets:
+            logging.info(f"Saving ticket {ticket.invoice_id}")
+            self.save_ticket(ticket)
+            saved += 1
+        return saved
 
     def _save_unit_products(self, ticket: Ticket):
         """Save unit products to an Excel file."""
 
         for product_row in self.unit_product_list_generator(ticket):
-            self.unit_product_sheet.insert_rows(self.TABLES_START_ROW)
-            new_row = self.unit_product_sheet[self.TABLES_START_ROW]
-            new_table_row = new_row[self.TABLES_START_COLUMN:self.UNIT_PRODUCT_LAST_COLUMN]
-            for cell, value in zip(new_table_row, product_row):
-                cell.value = value
-
-    def unit_product_list_generator(self, ticket: Ticket) -> Iterator[List[str | int | float]]:
-        """Build unit product list."""
-        unit_products = [
-            p for p in ticket.products if isinstance(p, UnitProduct)]
-        for product in unit_products:
-            yield [
-                ticket.supermarket.id.value,
-                f'{ticket.supermarket.address.street}, {ticket.supermarket.address.postal_code}, {ticket.supermarket.address.city}',
-                ticket.purchase_datetime.strftime("%d/%m/%Y %H:%M:%S"),
-                ticket.invoice_id,
-                product.quantity,
-                product.name,
-                product.price_per_item,
-                product.total
-            ]
-
-        return UNIT_PRODUCT_TABLE_HEADER
+            self._write_row(self.unit_product_sheet, product_row, self.UNIT_PRODUCT_LAST_COLUMN)
 
     def _save_bulk_products(self, ticket: Ticket):
         """Save bulk products to an Excel file."""
 
         for product_row in self.bulk_product_list_generator(ticket):
-            self.bulk_product_sheet.insert_rows(self.TABLES_START_ROW)
-            new_row = self.bulk_product_sheet[self.TABLES_START_ROW]
-            new_table_row = new_row[self.TABLES_START_COLUMN:self.UNIT_PRODUCT_LAST_COLUMN]
-            for cell, value in zip(new_table_row, product_row):
-                cell.value = value
-
-    def bulk_product_list_generator(self, ticket: Ticket) -> Iterator[List[str | int | float]]:
-        """Build bulk product list."""
-        bulk_products = [
-            p for p in ticket.products if isinstance(p, BulkProduct)]
-        for product in bulk_products:
-            yield [
-                ticket.supermarket.id.value,
-                f'{ticket.supermarket.address.street}, {ticket.supermarket.address.postal_code}, {ticket.supermarket.address.city}',
-                ticket.purchase_datetime.strftime("%d/%m/%Y %H:%M:%S"),
-                ticket.invoice_id,
-                product.quantity,
-                product.name,
-                product.unit_of_measure,
-                product.price_per_unit,
-                product.total
-            ]
-
-        return UNIT_PRODUCT_TABLE_HEADER
+            self._write_row(self.bulk_product_sheet, product_row, self.UNIT_PRODUCT_LAST_COLUMN)
 
     def _save_total(self, ticket: Ticket):
         """Save ticket total to an Excel file."""
 
-        self.tickets_sheet.insert_rows(self.TABLES_START_ROW)
-        new_row = self.tickets_sheet[self.TABLES_START_ROW]
         total_row = self._get_total_row(ticket)
-        new_table_row = new_row[self.TABLES_START_COLUMN:self.TICKET_TOTAL_LAST_COLUMN]
-        for cell, value in zip(new_table_row, total_row):
+        self._write_row(self.tickets_sheet, total_row, self.TICKET_TOTAL_LAST_COLUMN)
+
+    def _write_row(self, sheet: Worksheet, values: List[str | int | float], last_column: int) -> None:
+        """Write a table row according to the write mode."""
+        if self.write_mode == WriteMode.APPEND:
+            row_index = self._next_row(sheet)
+            for column, value in enumerate(values, start=self.TABLES_START_COLUMN + 1):
+                sheet.cell(row=row_index, column=column, value=value)
+            self._next_rows[sheet.title] = row_index + 1
+            return
+
+        sheet.insert_rows(self.TABLES_START_ROW)
+        new_row = sheet[self.TABLES_START_ROW]
+        for cell, value in zip(new_row[self.TABLES_START_COLUMN:last_column], values):
             cell.value = value
 
-    def _get_total_row(self, ticket: Ticket) -> List[str | float]:
-        """Get total row."""
-        total_vat = [
-            iva_item.fee for iva_item in ticket.iva if iva_item.type == "TOTAL"]
-        return [
-            ticket.supermarket.id.value,
-            f'{ticket.supermarket.address.street}, {ticket.supermarket.address.postal_code}, {ticket.supermarket.address.city}',
-            ticket.purchase_datetime.strftime("%d/%m/%Y %H:%M:%S"),
-            ticket.invoice_id,
-            total_vat[0] if total_vat else 0,
-            ticket.total,
-        ]
+    def _next_row(self, sheet: Worksheet) -> int:
+        """Next free table row. The sheet is only scanned the first time."""
+        if sheet.title not in self._next_rows:
+            row_index = self.TABLES_START_ROW
+            column = self.TABLES_START_COLUMN + 1
+            for (value,) in sheet.iter_rows(min_row=row_index, min_col=column, max_col=column,
+                                            max_row=max(sheet.max_row, row_index), values_only=True):
+                if value is None:
+                    break
+                row_index += 1
+            self._next_rows[sheet.title] = row_index
+        return self._next_rows[sheet.title]
+
+    @property
+    def _sorts_tables(self) -> bool:
+        """Whether closing sorts appended rows"""
+        return self.sort_newest_first and self.write_mode == WriteMode.APPEND and bool(self._next_rows)
+
+    def _update_tables(self, sort: bool = False) -> None:
+        """Extend table ranges to cover the appended rows and sort them if requested."""
+        for sheet_title, next_row in self._next_rows.items():
+            sheet = self.workbook[sheet_title]
+            last_row = next_row - 1
+            table = self._appended_table(sheet)
+            if table is not None:
+                min_col, min_row, max_col, max_row = range_boundaries(table.ref)
+                if last_row > max_row:
+                    table.ref = f"{get_column_letter(min_col)}{min_row}:{get_column_letter(max_col)}{last_row}"
+                    if table.autoFilter is not None:
+                        table.autoFilter.ref = table.ref
+            if sort:
+                self._sort_newest_first(sheet, last_row)
+
+    def _appended_table(self, sheet: Worksheet) -> Optional[Table]:
+        """Table holding the appended rows, the one at the tables start cell"""
+        for table in sheet.tables.values():
+            min_col, min_row, max_col, max_row = range_boundaries(table.ref)
+            if min_col <= self.TABLES_START_COLUMN + 1 <= max_col and min_row <= self.TABLES_START_ROW - 1 <= max_row:
+                return table
+        return None
+
+    def _sort_newest_first(self, sheet: Worksheet, last_row: int) -> None:
+        """Sort table rows by purchase datetime, newest first. Rows of the same ticket keep their order."""
+        first_row, first_column = self.TABLES_START_ROW, self.TABLES_START_COLUMN + 1
+        table = self._appended_table(sheet)
+        last_column = range_boundaries(table.ref)[2] if table is not None else sheet.max_column
+        if last_row <= first_row:
+            return
+
+        rows = list(sheet.iter_rows(min_row=first_row, max_row=last_row, min_col=first_column,
+                                    max_col=last_column, values_only=True))
+        date_index = self.PURCHASE_DATETIME_COLUMN - first_column
+        rows.sort(key=lambda row: _as_datetime(row[date_index]), reverse=True)
+        for row_index, row in enumerate(rows, start=first_row):
+            for column, value in enumerate(row, start=first_column):
+                sheet.cell(row=row_index, column=column, value=value)
+
+    def save_workbook(self, sort: bool = False):
+        """Save workbook to file. Appended rows are sorted first if sort is set."""
+        with metrics.stage("excel_save"):
+            if self.write_mode == WriteMode.APPEND:
+                self._update_tables(sort=sort and self.sort_newest_first)
+            self.workbook.save(self._file_name)
+
+    def close(self):
+        """Sort the appended rows if requested and save the workbook."""
+        if self._sorts_tables:
+            self.save_workbook(sort=True)
+
+
+def _as_datetime(value: Optional[str | datetime]) -> datetime:
+    """Purchase datetime of a table row, used as sort key"""
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str):
+        try:
+            return datetime.strptime(value, DATETIME_FORMAT)
+        except ValueError:
+            pass
+    return datetime.min
+
+
+class ExcelBatchWriter(ExcelHandler):
+    """Excel writer for many tickets. The workbook is loaded once and written once
+    when the writer is closed, or every checkpoint_interval tickets if set.
+
+    Closing writes every ticket already added, also when leaving the with block on
+    an exception. Callers that keep a manifest save it after closing and on every
+    write, through on_flush, so a crash never leaves written tickets out of it.
+
+    Usage:
+        with ExcelBatchWriter(file_name=destination, checkpoint_interval=100,
+                              on_flush=manifest.save) as writer:
+            writer.save_tickets(tickets)
+    """
+
+    def __init__(self, file_name: pathlib.Path, checkpoint_interval: Optional[int] = None,
+                 write_mode: WriteMode = WriteMode.INSERT, sort_newest_first: bool = False,
+                 on_flush: Optional[Callable[[], None]] = None):
+        """Initialize Excel batch writer."""
+        super().__init__(file_name=file_name, autosave=False,
+                         write_mode=write_mode, sort_newest_first=sort_newest_first)
+        self.checkpoint_interval = checkpoint_interval
+        self.on_flush = on_flush
+        """Called after every workbook write"""
+        self._pending_tickets = 0
+
+    def save_ticket(self, ticket: Ticket):
+        """Add ticket to the workbook. It is written on the next checkpoint or on close.
+        Checkpoints are written before adding a ticket, so they hold every ticket
+        taken so far and nothing else."""
+        if self.checkpoint_interval and self._pending_tickets >= self.checkpoint_interval:
+            self.flush()
+        super().save_ticket(ticket)
+        self._pending_tickets += 1
+
+    def flush(self, sort: bool = False):
+        """Write the workbook if there are tickets pending, or rows to sort."""
+        if self._pending_tickets or sort:
+            logging.info(f"Writing {self._pending_tickets} tickets to {self._file_name}")
+            self.save_workbook(sort=sort)
+            self._pending_tickets = 0
+            if self.on_flush is not None:
+                self.on_flush()
+
+    def close(self):
+        """Write pending tickets. Appended rows are sorted here, once, if requested."""
+        self.flush(sort=self._sorts_tables)
+
+    def __enter__(self) -> "ExcelBatchWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        """Write pending tickets, also when leaving on an exception"""
+        self.close()
+
+
+class ExcelStreamWriter(TicketRowsMixin):
+    """Write-only Excel export. It creates a fresh workbook with the tickets and
+    products sheets and streams every row to disk, so memory does not grow with
+    the number of tickets. The file is written once, when the writer is closed.
+
+    Usage:
+        with ExcelStreamWriter(file_name=destination) as writer:
+            writer.save_tickets(tickets)
+    """
+
+    TITLE_ROW = 2
+    TABLES_START_COLUMN = 2
+
+    TICKETS_HEADER = ["Supermercado", "Dirección", "Fecha de compra", "ID factura", "IVA", "total"]
+    UNIT_PRODUCT_HEADER = ["Supermercado", "Dirección", "Fecha de compra", "ID factura",
+                           "Cantidad", "Descripción", "Precio por unidad", "Total"]
+    BULK_PRODUCT_HEADER = ["Supermercado", "Dirección", "Fecha de compra", "ID factura",
+                           "Cantidad", "Descripción", "Unidad", "Precio por unidad", "Total"]
+
+    def __init__(self, file_name: pathlib.Path):
+        """Initialize Excel stream writer."""
+        self._file_name = file_name
+        self.workbook = Workbook(write_only=True)
+        self._row_counts: Dict[str, int] = {}
+        self._headers: Dict[str, List[str]] = {}
+        self.tickets_sheet = self._create_sheet(self.TICKETS_SHEET, "Lista de tickets", self.TICKETS_HEADER)
+        self.unit_product_sheet = self._create_sheet(
+            self.UNIT_PRODUCT_SHEET, "Productos por unidad", self.UNIT_PRODUCT_HEADER)
+        self.bulk_product_sheet = self._create_sheet(
+            self.BULK_PRODUCT_SHEET, "Productos a granel", self.BULK_PRODUCT_HEADER)
+
+    def _create_sheet(self, sheet_name: str, title: str, header: List[str]) -> Worksheet:
+        """Create a sheet with the same title and header rows as the template."""
+        sheet = self.workbook.create_sheet(title=sheet_name)
+        padding = [None] * self.TABLES_START_COLUMN
+        for _ in range(self.TITLE_ROW - 1):
+            sheet.append([])
+        sheet.append(padding + [title])
+        sheet.append(padding + header)
+        self._row_counts[sheet_name] = 0
+        self._headers[sheet_name] = header
+        return sheet
+
+    def _append(self, sheet: Worksheet, values: List[str | int | float]) -> None:
+        """Stream a table row."""
+        sheet.append([None] * self.TABLES_START_COLUMN + values)
+        self._row_counts[sheet.title] += 1
+
+    def save_ticket(self, ticket: Ticket):
+        """Stream ticket rows."""
+        with metrics.stage("excel_rows"):
+            for product_row in self.unit_product_list_generator(ticket):
+                self._append(self.unit_product_sheet, product_row)
+            for product_row in self.bulk_product_list_generator(ticket):
+                self._append(self.bulk_product_sheet, product_row)
+            self._append(self.tickets_sheet, self._get_total_row(ticket))
+
+    def save_tickets(self, tickets: Iterable[Ticket]) -> int:
+        """Stream tickets as they are consumed from an iterable. Returns the number of saved tickets."""
+        saved = 0
+        for ticket in tickets:
+            self.save_ticket(ticket)
+            saved += 1
+        return saved
+
+    def _add_tables(self) -> None:
+        """Add an Excel table over the rows of every sheet."""
+        for index, sheet in enumerate((self.tickets_sheet, self.unit_product_sheet, self.bulk_product_sheet),
+                                      start=1):
+            header = self._headers[sheet.title]
+            first_column = get_column_letter(self.TABLES_START_COLUMN + 1)
+            last_column = get_column_letter(self.TABLES_START_COLUMN + len(header))
+            last_row = self.TITLE_ROW + 1 + max(self._row_counts[sheet.title], 1)
+            table = Table(displayName=f"Tabla{index}", ref=f"{first_column}{self.TITLE_ROW + 1}:{last_column}{last_row}")
+            # Write-only sheets cannot read the header cells back
+            table.tableColumns = [TableColumn(id=column_id, name=name)
+                                  for column_id, name in enumerate(header, start=1)]
+            table.autoFilter = AutoFilter(ref=table.ref)
+            table.tableStyleInfo = DEFAULT_TABLE_STYLE
+            with warnings.catch_warnings():
+                warnings.filterwarnings("ignore", message="In write-only mode")
+                sheet.add_table(table)
 
     def save_workbook(self):
-        """Save workbook to file."""
-        self.workbook.save(self._file_name)
+        """Write the workbook to file. A write-only workbook can only be written once."""
+        with metrics.stage("excel_save"):
+            self._add_tables()
+            self.workbook.save(self._file_name)
+
+    def close(self):
+        """Write the workbook to file."""
+        self.save_workbook()
+
+    def __enter__(self) -> "ExcelStreamWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
@@ -0,0 +1,53 @@
+"""JSON lines adapter for tickets. One ticket per line, appended to the file."""
+import os
+import logging
+from typing import Iterable
+
+from ticketreader import metrics
+from ticketreader.schemas import Ticket
+
+logger = logging.getLogger(__name__)
+
+
+class JSONLinesHandler:
+    """JSON lines adapter for tickets. The file is opened in append mode, so every
+    run adds its tickets after the existing ones.
+
+    Usage:
+        with JSONLinesHandler(file_name=config.DATA_DIR / 'tickets.jsonl') as jsonl_handler:
+            jsonl_handler.save_tickets(tickets)
+    """
+
+    def __init__(self, file_name: os.PathLike) -> None:
+        self._file_name = file_name
+        self._file = open(file_name, "a", encoding="utf-8")
+
+    def save_ticket(self, ticket: Ticket) -> None:
+        """Save one ticket"""
+        with metrics.stage("jsonl_write"):
+            self._file.write(ticket.model_dump_json())
+            self._file.write("\n")
+
+    def save_tickets(self, tickets: Iterable[Ticket]) -> int:
+        """Save tickets as they are consumed from an iterable. Returns the number of saved tickets."""
+        saved = 0
+        for ticket in tickets:
+            self.save_ticket(ticket)
+            saved += 1
+        self.flush()
+        logger.info(f"Saved {saved} tickets to {self._file_name}")
+        return saved
+
+    def flush(self) -> None:
+        """Flush the file."""
+        self._file.flush()
+
+    def close(self) -> None:
+        """Close the file."""
+        self._file.close()
+
+    def __enter__(self) -> "JSONLinesHandler":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
@@ -0,0 +1,11 @@
+"""Output options. Kept apart from the handlers so they can be used without
+importing openpyxl or pyarrow."""
+from enum import Enum
+
+
+class WriteMode(str, Enum):
+    """Row writing mode"""
+    INSERT = 'insert'
+    """Insert every row at the top of the table. Existing rows are shifted down."""
+    APPEND = 'append'
+    """Append rows after the last row of the table. Table ranges are updated on save."""
@@ -0,0 +1,177 @@
+"""Parquet adapter for tickets. It needs the optional pyarrow dependency:
+pip install ticketreader[parquet]"""
+import os
+import enum
+import uuid
+import typing
+import logging
+import pathlib
+import datetime
+from typing import Any, Dict, Iterable, List, Type
+
+from pydantic import BaseModel
+
+from ticketreader import metrics
+from ticketreader.schemas import Ticket, UnitProduct, BulkProduct, IVA
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError:
+    pa = None
+    ds = None
+
+logger = logging.getLogger(__name__)
+
+PARTITION_COLUMN = "purchase_month"
+"""Hive partition column, formatted YYYY-MM"""
+
+
+def _arrow_type(annotation: Any) -> "pa.DataType":
+    """Arrow type of a model field annotation"""
+    if typing.get_origin(annotation) is typing.Union:
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return _arrow_type(args[0])
+    if isinstance(annotation, type):
+        if issubclass(annotation, (str, enum.Enum)):
+            return pa.string()
+        if issubclass(annotation, bool):
+            return pa.bool_()
+        if issubclass(annotation, int):
+            return pa.int64()
+        if issubclass(annotation, float):
+            return pa.float64()
+        if issubclass(annotation, datetime.datetime):
+            return pa.timestamp("s")
+    raise TypeError(f"No arrow type for {annotation}")
+
+
+def arrow_fields(model: Type[BaseModel], prefix: str = "") -> List["pa.Field"]:
+    """Arrow fields of a model, computed fields included. Nested models are
+    flattened with their field name as prefix and list fields are left out."""
+    fields = []
+    annotations = {name: field.annotation for name, field in model.model_fields.items()}
+    annotations.update({name: field.return_type for name, field in model.model_computed_fields.items()})
+    for name, annotation in annotations.items():
+        if typing.get_origin(annotation) in (list, List):
+            continue
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            fields.extend(arrow_fields(annotation, prefix=f"{prefix}{name}_"))
+            continue
+        fields.append(pa.field(f"{prefix}{name}", _arrow_type(annotation)))
+    return fields
+
+
+def _flatten(values: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    """Flatten a model dump the same way arrow_fields flattens the model"""
+    row = {}
+    for name, value in values.items():
+        if isinstance(value, dict):
+            row.update(_flatten(value, prefix=f"{prefix}{name}_"))
+        elif not isinstance(value, list):
+            row[f"{prefix}{name}"] = value
+    return row
+
+
+class ParquetHandler:
+    """Parquet adapter for tickets. Tickets, unit products, bulk products and IVA
+    lines are written as four datasets partitioned by purchase month. Every flush
+    adds new files, so existing data is never rewritten.
+
+    Usage:
+        with ParquetHandler(directory=config.DATA_DIR / 'parquet') as parquet_handler:
+            parquet_handler.save_tickets(tickets)
+    """
+
+    DEFAULT_BATCH_SIZE = 10000
+    DEFAULT_COMPRESSION = "zstd"
+
+    def __init__(self, directory: os.PathLike, batch_size: int = DEFAULT_BATCH_SIZE,
+                 compression: str = DEFAULT_COMPRESSION) -> None:
+        if pa is None:
+            raise ImportError("pyarrow is required for Parquet output: pip install ticketreader[parquet]")
+
+        self.directory = pathlib.Path(directory)
+        self.batch_size = batch_size
+        self.compression = compression
+        self.schemas = self._build_schemas()
+        self._rows: Dict[str, List[Dict[str, Any]]] = {name: [] for name in self.schemas}
+        self._pending = 0
+
+    @staticmethod
+    def _build_schemas() -> Dict[str, "pa.Schema"]:
+        """Dataset schemas, derived from the ticket models"""
+        keys = [pa.field("invoice_id", pa.string()), pa.field(PARTITION_COLUMN, pa.string())]
+        return {
+            "tickets": pa.schema(arrow_fields(Ticket) + keys[1:]),
+            "unit_products": pa.schema(keys + arrow_fields(UnitProduct)),
+            "bulk_products": pa.schema(keys + arrow_fields(BulkProduct)),
+            "iva": pa.schema(keys + arrow_fields(IVA)),
+        }
+
+    def save_ticket(self, ticket: Ticket) -> None:
+        """Add one ticket. It is written once the batch is full or the handler is closed."""
+        month = ticket.purchase_datetime.strftime("%Y-%m")
+        keys = {"invoice_id": ticket.invoice_id, PARTITION_COLUMN: month}
+
+        ticket_row = _flatten(ticket.model_dump(exclude={"products", "iva"}))
+        ticket_row[PARTITION_COLUMN] = month
+        self._rows["tickets"].append(ticket_row)
+        for product in ticket.products:
+            table = "bulk_products" if isinstance(product, BulkProduct) else "unit_products"
+            self._rows[table].append({**keys, **product.model_dump()})
+        self._rows["iva"].extend({**keys, **iva.model_dump()} for iva in ticket.iva)
+
+        self._pending += 1
+        if self._pending >= self.batch_size:
+            self.flush()
+
+    def save_tickets(self, tickets: Iterable[Ticket]) -> int:
+        """Save tickets as they are consumed from an iterable. Returns the number of saved tickets."""
+        saved = 0
+        for ticket in tickets:
+            self.save_ticket(ticket)
+            saved += 1
+        self.flush()
+        return saved
+
+    def flush(self) -> None:
+        """Write the pending rows as new files in every dataset"""
+        if not self._pending:
+            return
+
+        basename = f"part-{uuid.uuid4().hex}-{{i}}.parquet"
+        for name, rows in self._rows.items():
+            if not rows:
+                continue
+            with metrics.stage("parquet_write"):
+                ds.write_dataset(
+                    pa.Table.from_pylist(rows, schema=self.schemas[name]),
+                    base_dir=self.directory / name,
+                    format="parquet",
+                    partitioning=[PARTITION_COLUMN],
+                    partitioning_flavor="hive",
+                    basename_template=basename,
+                    existing_data_behavior="overwrite_or_ignore",
+                    file_options=ds.ParquetFileFormat().make_write_options(compression=self.compression),
+                )
+            rows.clear()
+
+        logger.info(f"Saved {self._pending} tickets to {self.directory}")
+        self._pending = 0
+
+    def read(self, name: str) -> "pa.Table":
+        """Read one dataset: tickets, unit_products, bulk_products or iva"""
+        return ds.dataset(self.directory / name, schema=self.schemas[name], format="parquet",
+                          partitioning="hive").to_table()
+
+    def close(self) -> None:
+        """Write pending rows"""
+        self.flush()
+
+    def __enter__(self) -> "ParquetHandler":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
@@ -0,0 +1,209 @@
+"""SQL adapter for tickets. It uses a local SQLite database."""
+import os
+import sqlite3
+import logging
+from typing import Dict, Iterable, List, Tuple
+
+from ticketreader import metrics
+from ticketreader.schemas import Ticket, SuperMarket, UnitProduct, BulkProduct
+
+logger = logging.getLogger(__name__)
+
+SupermarketKey = Tuple[str, str, int, str]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS supermarkets (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    cif TEXT NOT NULL,
+    phone TEXT NOT NULL,
+    street TEXT NOT NULL,
+    postal_code INTEGER NOT NULL,
+    city TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_supermarkets_address ON supermarkets (cif, street, postal_code, city);
+
+CREATE TABLE IF NOT EXISTS tickets (
+    id INTEGER PRIMARY KEY,
+    invoice_id TEXT NOT NULL,
+    supermarket_id INTEGER NOT NULL REFERENCES supermarkets (id),
+    purchase_datetime TEXT NOT NULL,
+    total REAL NOT NULL,
+    total_iva REAL NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_tickets_invoice_id ON tickets (invoice_id);
+CREATE INDEX IF NOT EXISTS idx_tickets_purchase_datetime ON tickets (purchase_datetime);
+
+CREATE TABLE IF NOT EXISTS unit_products (
+    id INTEGER PRIMARY KEY,
+    ticket_id INTEGER NOT NULL REFERENCES tickets (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    brand TEXT,
+    quantity INTEGER NOT NULL,
+    price_per_item REAL NOT NULL,
+    total REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_unit_products_ticket_id ON unit_products (ticket_id);
+
+CREATE TABLE IF NOT EXISTS bulk_products (
+    id INTEGER PRIMARY KEY,
+    ticket_id INTEGER NOT NULL REFERENCES tickets (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    brand TEXT,
+    quantity REAL NOT NULL,
+    unit_of_measure TEXT NOT NULL,
+    price_per_unit REAL NOT NULL,
+    total REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_bulk_products_ticket_id ON bulk_products (ticket_id);
+
+CREATE TABLE IF NOT EXISTS iva (
+    id INTEGER PRIMARY KEY,
+    ticket_id INTEGER NOT NULL REFERENCES tickets (id) ON DELETE CASCADE,
+    type TEXT NOT NULL,
+    taxable_base REAL NOT NULL,
+    fee REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_iva_ticket_id ON iva (ticket_id);
+"""
+
+
+class SQLHandler:
+    """SQL adapter for tickets. Tickets are stored in normalized tables and written in
+    batches, each one inside a single transaction. Tickets whose invoice id is
+    already stored are skipped.
+
+    Usage:
+        with SQLHandler(database=config.DATA_DIR / 'tickets.sqlite3') as sql_handler:
+            sql_handler.save_tickets(tickets)
+    """
+
+    DEFAULT_BATCH_SIZE = 500
+
+    def __init__(self, database: os.PathLike | str, batch_size: int = DEFAULT_BATCH_SIZE):
+        """Initialize SQL adapter. The database and its tables are created if they don't exist."""
+        self._database = database
+        self.batch_size = batch_size
+        # The connection can be handed to a writer thread, it is never used concurrently
+        self.connection = sqlite3.connect(database, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+        self._supermarket_ids: Dict[SupermarketKey, int] = {}
+
+    def save_ticket(self, ticket: Ticket) -> int:
+        """Save one ticket. Returns the number of saved tickets, 0 if it was already stored."""
+        return self._save_batch([ticket])
+
+    def save_tickets(self, tickets: Iterable[Ticket]) -> int:
+        """Save tickets as they are consumed from an iterable. Returns the number of saved tickets.
+        The tickets already taken are saved even if the iterable raises."""
+        saved = 0
+        batch: List[Ticket] = []
+        try:
+            for ticket in tickets:
+                batch.append(ticket)
+                if len(batch) >= self.batch_size:
+                    pending, batch = batch, []
+                    saved += self._save_batch(pending)
+        finally:
+            if batch:
+                saved += self._save_batch(batch)
+        return saved
+
+    def _save_batch(self, tickets: List[Ticket]) -> int:
+        """Save tickets inside one transaction"""
+        cursor = self.connection.cursor()
+        with metrics.stage("sql_write"):
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                tickets = self._new_tickets(cursor, tickets)
+                if tickets:
+                    self._insert_tickets(cursor, tickets)
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                self._supermarket_ids.clear()
+                raise
+
+        logger.info(f"Saved {len(tickets)} tickets to {self._database}")
+        return len(tickets)
+
+    def _new_tickets(self, cursor: sqlite3.Cursor, tickets: List[Ticket]) -> List[Ticket]:
+        """Filter out tickets already stored or repeated in the batch"""
+        invoice_ids = [ticket.invoice_id for ticket in tickets]
+        placeholders = ", ".join("?" * len(invoice_ids))
+        stored = {row[0] for row in cursor.execute(
+            f"SELECT invoice_id FROM tickets WHERE invoice_id IN ({placeholders})", invoice_ids)}
+
+        new_tickets = []
+        for ticket in tickets:
+            if ticket.invoice_id in stored:
+                logger.info(f"Skipping ticket {ticket.invoice_id}. Already stored")
+                continue
+            stored.add(ticket.invoice_id)
+            new_tickets.append(ticket)
+        return new_tickets
+
+    def _insert_tickets(self, cursor: sqlite3.Cursor, tickets: List[Ticket]) -> None:
+        """Insert tickets and their products and IVA lines"""
+        cursor.executemany(
+            "INSERT INTO tickets (invoice_id, supermarket_id, purchase_datetime, total, total_iva) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(ticket.invoice_id, self._supermarket_id(cursor, ticket.supermarket),
+              ticket.purchase_datetime.isoformat(sep=" "), ticket.total, ticket.total_iva)
+             for ticket in tickets])
+
+        invoice_ids = [ticket.invoice_id for ticket in tickets]
+        placeholders = ", ".join("?" * len(invoice_ids))
+        ticket_ids = dict(cursor.execute(
+            f"SELECT invoice_id, id FROM tickets WHERE invoice_id IN ({placeholders})", invoice_ids))
+
+        unit_rows, bulk_rows, iva_rows = [], [], []
+        for ticket in tickets:
+            ticket_id = ticket_ids[ticket.invoice_id]
+            for product in ticket.products:
+                if isinstance(product, UnitProduct):
+                    unit_rows.append((ticket_id, product.name, product.brand, product.quantity,
+                                      product.price_per_item, product.total))
+                elif isinstance(product, BulkProduct):
+                    bulk_rows.append((ticket_id, product.name, product.brand, product.quantity,
+                                      product.unit_of_measure, product.price_per_unit, product.total))
+            iva_rows.extend((ticket_id, iva.type, iva.taxable_base, iva.fee) for iva in ticket.iva)
+
+        cursor.executemany(
+            "INSERT INTO unit_products (ticket_id, name, brand, quantity, price_per_item, total) "
+            "VALUES (?, ?, ?, ?, ?, ?)", unit_rows)
+        cursor.executemany(
+            "INSERT INTO bulk_products (ticket_id, name, brand, quantity, unit_of_measure, price_per_unit, total) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", bulk_rows)
+        cursor.executemany(
+            "INSERT INTO iva (ticket_id, type, taxable_base, fee) VALUES (?, ?, ?, ?)", iva_rows)
+
+    def _supermarket_id(self, cursor: sqlite3.Cursor, supermarket: SuperMarket) -> int:
+        """Get supermarket id, inserting it the first time it is seen"""
+        address = supermarket.address
+        key = (supermarket.cif, address.street, address.postal_code, address.city)
+        if key not in self._supermarket_ids:
+            cursor.execute(
+                "INSERT OR IGNORE INTO supermarkets (name, cif, phone, street, postal_code, city) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (supermarket.id.value, supermarket.cif, supermarket.phone, *key[1:]))
+            row = cursor.execute(
+                "SELECT id FROM supermarkets WHERE cif = ? AND street = ? AND postal_code = ? AND city = ?",
+                key).fetchone()
+            self._supermarket_ids[key] = row[0]
+        return self._supermarket_ids[key]
+
+    def flush(self) -> None:
+        """Nothing to write. Every batch is committed when it is saved."""
+
+    def close(self):
+        """Close the database connection."""
+        self.connection.close()
+
+    def __enter__(self) -> "SQLHandler":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
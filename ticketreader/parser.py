@@ -2,6 +2,7 @@
 import os
 import abc
 import logging
+from enum import Enum
 from typing import TypeVar, Generic
 
 from ticketreader.schemas import Ticket
@@ -11,6 +12,14 @@ logger = logging.getLogger(__name__)
 TicketType = TypeVar("TicketType", bound=Ticket)
 
 
+class ParserEngine(str, Enum):
+    """Engine used to read the ticket files"""
+    TABULA = 'tabula'
+    """Tabula tables. Needs a Java runtime unless the single pass extraction mode is used"""
+    PYPDF = 'pypdf'
+    """Pure Python state machine over the pypdf text lines"""
+
+
 class ParserStrategy(abc.ABC, Generic[TicketType]):
     """Parser strategy interface"""
 
@@ -0,0 +1,89 @@
+"""Pattern registry module. Ticket patterns are compiled once per supermarket, and
+the header fields are matched with a single combined scan."""
+import re
+import logging
+from enum import Enum
+from datetime import datetime
+from typing import Dict, Mapping, NamedTuple, Sequence, Tuple, Type
+
+from ticketreader.schemas import SuperMarketType
+
+logger = logging.getLogger(__name__)
+
+TICKET_DATETIME_FORMAT = "%d/%m/%Y %H:%M"
+
+
+def parse_ticket_datetime(value: str) -> datetime:
+    """Parse a dd/mm/yyyy HH:MM datetime. Well formed values are sliced directly,
+    anything else goes through strptime."""
+    if (len(value) == 16 and value[2] == value[5] == "/" and value[10] == " " and value[13] == ":"):
+        try:
+            return datetime(int(value[6:10]), int(value[3:5]), int(value[0:2]),
+                            int(value[11:13]), int(value[14:16]))
+        except ValueError:
+            pass
+    return datetime.strptime(value, TICKET_DATETIME_FORMAT)
+
+
+class HeaderMatch(NamedTuple):
+    """Header field match"""
+    groups: Tuple[str, ...]
+    line: int
+    """Index of the matched line"""
+
+
+class HeaderScanner:
+    """Matches many header fields in one pass. The field patterns are joined in a
+    single alternation that skips the lines where no field matches; the fields
+    still missing are only searched on the lines where it matches, so the result
+    is the same as searching every pattern on its own."""
+
+    def __init__(self, patterns: Mapping[str, str]) -> None:
+        self.pattern = re.compile("|".join(f"(?:{pattern})" for pattern in patterns.values()))
+        self._patterns: Dict[str, re.Pattern] = {name: re.compile(pattern) for name, pattern in patterns.items()}
+
+    def scan(self, lines: Sequence[str]) -> Dict[str, HeaderMatch]:
+        """Scan the lines and return the first match of every field. Lines are scanned
+        one by one so that no pattern matches across a line break."""
+        matches: Dict[str, HeaderMatch] = {}
+        for index, line in enumerate(lines):
+            if self.pattern.search(line) is None:
+                continue
+            for name, pattern in self._patterns.items():
+                if name in matches:
+                    continue
+                match = pattern.search(line)
+                if match is not None:
+                    matches[name] = HeaderMatch(groups=match.groups(), line=index)
+            if len(matches) == len(self._patterns):
+                return matches
+        return matches
+
+
+class SupermarketPatterns:
+    """Compiled patterns of one supermarket"""
+
+    def __init__(self, patterns: Type[Enum], header_fields: Sequence[str]) -> None:
+        self.compiled: Dict[str, re.Pattern] = {pattern.name: re.compile(pattern.value) for pattern in patterns}
+        self.header = HeaderScanner({name: patterns[name].value for name in header_fields})
+
+    def __getitem__(self, name: str) -> re.Pattern:
+        return self.compiled[name]
+
+
+_registry: Dict[SuperMarketType, SupermarketPatterns] = {}
+
+
+def register_patterns(supermarket: SuperMarketType, patterns: Type[Enum],
+                      header_fields: Sequence[str]) -> SupermarketPatterns:
+    """Compile and register the patterns of a supermarket"""
+    _registry[supermarket] = SupermarketPatterns(patterns=patterns, header_fields=header_fields)
+    logger.debug(f"Registered {len(patterns)} patterns for {supermarket.value}")
+    return _registry[supermarket]
+
+
+def get_patterns(supermarket: SuperMarketType) -> SupermarketPatterns:
+    """Compiled patterns of a supermarket"""
+    if supermarket not in _registry:
+        raise KeyError(f"No patterns registered for {supermarket.value}")
+    return _registry[supermarket]
@@ -0,0 +1,181 @@
+"""Supermarket registry module. Every supermarket registers a cheap detector and its
+parsers, so ticket files from mixed chains are routed after a single peek at their
+first page instead of trying every parser in turn."""
+import os
+import re
+import logging
+import pathlib
+import importlib
+import itertools
+import contextlib
+from concurrent.futures import Executor
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Tuple
+
+from ticketreader import exceptions
+from ticketreader import metrics
+from ticketreader import utils
+from ticketreader.cache import ParseCache
+from ticketreader.parser import ParserEngine
+from ticketreader.schemas import ParseResult, SuperMarketType, Ticket
+from ticketreader.strategies import ExtractionMode
+
+logger = logging.getLogger(__name__)
+
+SUPERMARKET_PACKAGES = ["ticketreader.mercadona"]
+"""Packages that register a supermarket when imported"""
+PEEK_CHARS = 512
+"""First page characters kept for detection"""
+
+
+class TicketPeek(NamedTuple):
+    """What detectors see of a ticket file: the start of its first page text and its metadata"""
+    file_path: pathlib.Path
+    text: str
+    metadata: Mapping[str, str]
+
+
+Detector = Callable[[TicketPeek], bool]
+"""Whether a ticket file belongs to a supermarket"""
+
+
+class SupermarketParser(NamedTuple):
+    """Registered supermarket"""
+    supermarket: SuperMarketType
+    detector: Detector
+    parse: Callable[..., Ticket]
+    """Parse one file: parse(file_path, engine=..., mode=...)"""
+    iter_results: Callable[..., Iterator[ParseResult]]
+    """Parse many files lazily, in order: iter_results(file_paths, mode=..., workers=..., cache=..., engine=...,
+    executor=...)"""
+    worker_pool: Optional[Callable[[int, ParserEngine, ExtractionMode], Executor]] = None
+    """Open the process pool of iter_results: worker_pool(workers, engine, mode)"""
+    valid_extensions: Tuple[str, ...] = (".pdf", ".PDF")
+
+
+_registry: Dict[SuperMarketType, SupermarketParser] = {}
+_loaded = False
+
+
+def register_supermarket(parser: SupermarketParser) -> SupermarketParser:
+    """Register the detector and parsers of a supermarket"""
+    _registry[parser.supermarket] = parser
+    logger.debug(f"Registered parser for {parser.supermarket.value}")
+    return parser
+
+
+def supermarkets() -> List[SupermarketParser]:
+    """Registered supermarkets, in registration order"""
+    global _loaded
+    if not _loaded:
+        for package in SUPERMARKET_PACKAGES:
+            importlib.import_module(package)
+        _loaded = True
+    return list(_registry.values())
+
+
+def cif_detector(*cifs: str) -> Detector:
+    """Detector matching any of the CIFs in the first page text, with or without the dash"""
+    pattern = re.compile("|".join(re.escape(cif).replace(r"\-", "-?") for cif in cifs))
+    return lambda peek: pattern.search(peek.text) is not None
+
+
+def peek_ticket(file_path: os.PathLike) -> TicketPeek:
+    """Read the start of the first page text and the document metadata. Only the
+    first page is decoded."""
+    from pypdf import PdfReader
+    with metrics.stage("detection"):
+        reader = PdfReader(file_path)
+        text = reader.pages[0].extract_text()[:PEEK_CHARS] if reader.pages else ""
+        metadata = {key: str(value) for key, value in (reader.metadata or {}).items()}
+    return TicketPeek(file_path=pathlib.Path(file_path), text=text, metadata=metadata)
+
+
+def detect_supermarket(file_path: os.PathLike) -> SupermarketParser:
+    """Find the supermarket of a ticket file"""
+    file_path = pathlib.Path(file_path)
+    candidates = [parser for parser in supermarkets() if file_path.suffix in parser.valid_extensions]
+    if not candidates:
+        raise exceptions.WrongFileExtension(f"No supermarket reads {file_path.suffix} files")
+
+    peek = peek_ticket(file_path)
+    for parser in candidates:
+        if parser.detector(peek):
+            metrics.increment("ticketreader_detected_total", supermarket=parser.supermarket.name)
+            return parser
+    metrics.increment("ticketreader_detected_total", supermarket="unknown")
+    raise exceptions.UnknownSupermarket(f"Supermarket of ticket {file_path} not recognized")
+
+
+def parse_ticket(file_path: os.PathLike,
+                 engine: ParserEngine = ParserEngine.TABULA,
+                 mode: ExtractionMode = ExtractionMode.TABULA) -> Ticket:
+    """Parse a ticket of any registered supermarket"""
+    parser = detect_supermarket(file_path)
+    return parser.parse(file_path=pathlib.Path(file_path), engine=engine, mode=mode)
+
+
+def _detected(file_paths: Iterable[pathlib.Path]) -> Iterator[Tuple[Optional[SuperMarketType], pathlib.Path, Optional[str]]]:
+    """Detect files one at a time, as they are pulled: (supermarket, file_path, error).
+    Files with no registered extension are skipped."""
+    for file_path in file_paths:
+        try:
+            parser = detect_supermarket(file_path)
+        except exceptions.WrongFileExtension:
+            logger.info(f"Skipping file {file_path}. Not a ticket")
+            continue
+        except Exception as e:
+            logger.error(f"Error detecting ticket {file_path}: {e}")
+            yield None, file_path, f"{type(e).__name__}: {e}"
+            continue
+        yield parser.supermarket, file_path, None
+
+
+def iter_tickets(file_paths: Iterable[pathlib.Path],
+                 engine: ParserEngine = ParserEngine.TABULA,
+                 mode: ExtractionMode = ExtractionMode.TABULA,
+                 workers: int = 1,
+                 caches: Optional[Mapping[SuperMarketType, ParseCache]] = None) -> Iterator[ParseResult]:
+    """Parse ticket files of mixed supermarkets lazily, in file order. Files are
+    detected as the parsers pull them, so detection overlaps parsing and nothing is
+    read ahead. Every run of consecutive files of one supermarket is parsed by its
+    parser, with its cache. With more workers, each supermarket opens its process
+    pool once, on its first run, and every later run reuses it until the iteration
+    ends. Detection decodes the first page of every file once more, before its
+    parser reads it. Files of no registered supermarket are yielded as failed results."""
+    with contextlib.ExitStack() as stack:
+        pools: Dict[SuperMarketType, Executor] = {}
+        for supermarket, run in itertools.groupby(_detected(file_paths), key=lambda detected: detected[0]):
+            if supermarket is None:
+                for _, file_path, error in run:
+                    yield ParseResult(file_path=file_path, error=error)
+                continue
+
+            parser = _registry[supermarket]
+            if workers > 1 and parser.worker_pool is not None and supermarket not in pools:
+                pools[supermarket] = stack.enter_context(parser.worker_pool(workers, engine, mode))
+            yield from parser.iter_results(
+                file_paths=(file_path for _, file_path, _ in run), engine=engine, mode=mode, workers=workers,
+                cache=(caches or {}).get(supermarket), executor=pools.get(supermarket))
+
+
+@utils.log_time(logger_name=__name__)
+def parse_directory(directory_path: os.PathLike,
+                    engine: ParserEngine = ParserEngine.TABULA,
+                    mode: ExtractionMode = ExtractionMode.TABULA,
+                    workers: int = 1,
+                    recursive: bool = False,
+                    caches: Optional[Mapping[SuperMarketType, ParseCache]] = None) -> List[Ticket]:
+    """Parse the tickets of a directory that mixes supermarkets. Files that fail are
+    logged and skipped."""
+    if not os.path.isdir(directory_path):
+        raise ValueError(f"File path {directory_path} is not a directory")
+
+    from ticketreader.mercadona import iter_ticket_files
+    results = list(iter_tickets(iter_ticket_files(directory_path, recursive=recursive), engine=engine,
+                                mode=mode, workers=workers, caches=caches))
+
+    failed = [result for result in results if not result.ok]
+    if failed:
+        logger.warning(f"{len(failed)} of {len(results)} tickets could not be parsed")
+
+    return [result.ticket for result in results if result.ticket is not None]  # type: ignore
@@ -1,23 +1,53 @@
 """Schemas for ticketreader app."""
+import pathlib
 from enum import Enum, auto
 from datetime import datetime
-from typing import Optional, List, Annotated, Union
+from typing import Any, Optional, List, Annotated, Type, TypeVar, Union
 from pydantic.functional_validators import BeforeValidator
 from pydantic import BaseModel, Field, computed_field, field_validator
 
+from ticketreader import metrics
+
 
 def comma_separated_float(value: str) -> float:
     """Convert comma separated float"""
     if isinstance(value, str):
         return float(value.replace(",", "."))
-    elif isinstance(value, float):
-        return value
+    elif isinstance(value, (float, int)):
+        return float(value)
     raise TypeError("Wrong type for comma separated float")
 
 
 CommaSeparatedFloat = Annotated[float, BeforeValidator(comma_separated_float)]
 """Comma separated float type"""
 
+ModelType = TypeVar("ModelType", bound=BaseModel)
+
+
+class ValidationMode(str, Enum):
+    """How much of the parsed data goes through pydantic validation"""
+    FULL = 'full'
+    """Every model is validated"""
+    SAMPLED = 'sampled'
+    """Tickets are validated, but only one of every VALIDATION_SAMPLE_RATE items"""
+    OFF = 'off'
+    """Nothing is validated. Values must be already normalized"""
+
+
+VALIDATION_SAMPLE_RATE = 10
+
+
+def build_model(model: Type[ModelType], validation: ValidationMode = ValidationMode.FULL,
+                index: int = 0, **values: Any) -> ModelType:
+    """Build a model, skipping validation when the mode allows it. Values must already
+    have their final types (floats, ints...) since model_construct does not cast them.
+    The index of the item in its list picks the sampled items."""
+    if validation == ValidationMode.FULL or (
+            validation == ValidationMode.SAMPLED and index % VALIDATION_SAMPLE_RATE == 0):
+        with metrics.stage("model_validation"):
+            return model(**values)
+    return model.model_construct(**values)
+
 
 class SuperMarketType(str, Enum):
     """Supermarket type"""
@@ -93,3 +123,16 @@ class Ticket(BaseModel):
     def total_iva(self) -> float:
         """Total price with IVA"""
         return sum([iva_item.fee for iva_item in self.iva])
+
+
+class ParseResult(BaseModel):
+    """Result of parsing one ticket file. Either the ticket or the error is set."""
+    file_path: pathlib.Path = Field(title="Ticket file path")
+    ticket: Optional[Ticket] = Field(title="Parsed ticket", default=None)
+    error: Optional[str] = Field(title="Error message", default=None)
+    sha256: Optional[str] = Field(title="File contents hash, if it was computed while parsing", default=None)
+
+    @property
+    def ok(self) -> bool:
+        """Whether the ticket was parsed"""
+        return self.ticket is not None
@@ -0,0 +1,283 @@
+"""Ingestion service module. A long-lived asyncio front end that parses ticket files
+as they arrive, in a process pool, and writes the tickets in batches."""
+import os
+import asyncio
+import logging
+import pathlib
+import functools
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from ticketreader import api
+from ticketreader import mercadona
+from ticketreader import metrics
+from ticketreader import output
+from ticketreader.cache import ParseCache
+from ticketreader.manifest import IngestReport, Manifest
+from ticketreader.parser import ParserEngine
+from ticketreader.schemas import ParseResult, Ticket
+from ticketreader.strategies import ExtractionMode
+
+logger = logging.getLogger(__name__)
+
+FileSignature = Tuple[int, int]
+"""File size and modification time"""
+
+
+class IngestionService:
+    """Asyncio ingestion service. Files go through a bounded queue to a process pool
+    and the parsed tickets through a second bounded queue to the writer, which saves
+    them in batches. When the writer falls behind both queues fill up and enqueue
+    waits, so memory stays bounded however fast files arrive.
+
+    Usage:
+        async with IngestionService(writer=output.SQLHandler(database), workers=4) as service:
+            await service.enqueue(file_path)
+            await service.watch(inbox)  # until cancelled
+    """
+
+    DEFAULT_BATCH_SIZE = 50
+    DEFAULT_BATCH_TIMEOUT = 1.0
+    """Seconds the writer waits to fill a batch before writing what it has"""
+    DEFAULT_POLL_INTERVAL = 2.0
+
+    def __init__(self, writer: output.TicketWriter, workers: int = 1,
+                 engine: ParserEngine = ParserEngine.TABULA,
+                 mode: ExtractionMode = ExtractionMode.TABULA,
+                 cache: Optional[ParseCache] = None,
+                 manifest: Optional[Manifest] = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 batch_timeout: float = DEFAULT_BATCH_TIMEOUT,
+                 queue_size: Optional[int] = None,
+                 executor: Optional[Executor] = None,
+                 progress: Optional[Callable[[IngestReport], None]] = None) -> None:
+        if not callable(getattr(writer, "flush", None)):
+            raise TypeError(f"{type(writer).__name__} has no flush(). The ingestion service needs every "
+                            f"batch on disk before recording its files in the manifest")
+        self.writer = writer
+        """Output handler with flush(). It is used from the writer thread and closed by the caller"""
+        self.workers = workers
+        self.engine = engine
+        self.mode = mode
+        self.cache = cache
+        self.manifest = manifest
+        """Manifest, saved after every written batch"""
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.queue_size = queue_size or workers * 4
+        self.progress = progress
+        self.report = IngestReport()
+
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._write_executor: Optional[ThreadPoolExecutor] = None
+        self._files: Optional["asyncio.Queue[pathlib.Path]"] = None
+        self._results: Optional["asyncio.Queue[ParseResult]"] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self) -> "IngestionService":
+        """Start the parse and writer tasks"""
+        if self._tasks:
+            return self
+        if self._executor is None:
+            self._executor = mercadona._worker_pool(self.workers, self.engine, self.mode)
+        # One writer thread, so output handlers never see concurrent calls
+        self._write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ticketreader-writer")
+        self._files = asyncio.Queue(maxsize=self.queue_size)
+        self._results = asyncio.Queue(maxsize=max(self.batch_size, self.queue_size))
+        self._tasks = [asyncio.create_task(self._parse_files()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._write_batches()))
+        logger.info(f"Ingestion service started with {self.workers} workers")
+        return self
+
+    async def enqueue(self, file_path: os.PathLike) -> bool:
+        """Add a ticket file. Waits while the queue is full. Returns False when the
+        manifest shows the file was already processed."""
+        if self._files is None:
+            raise RuntimeError("Ingestion service not started")
+        file_path = pathlib.Path(file_path)
+        if self.manifest is not None and self.manifest.is_unchanged(file_path):
+            logger.debug(f"Skipping file {file_path}. Already processed")
+            self.report.skipped += 1
+            metrics.increment(api.TICKETS_TOTAL, status="skipped")
+            return False
+        await self._files.put(file_path)
+        return True
+
+    async def join(self) -> None:
+        """Wait until every enqueued file is parsed and its ticket written"""
+        if self._files is None or self._results is None:
+            return
+        await self._files.join()
+        await self._results.join()
+
+    async def close(self) -> None:
+        """Write the pending tickets and stop the tasks and the executors"""
+        if not self._tasks:
+            return
+        await self.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        if self._owns_executor and self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self._write_executor is not None:
+            self._write_executor.shutdown()
+            self._write_executor = None
+        logger.info(f"Ingestion service stopped: {self.report}")
+
+    async def __aenter__(self) -> "IngestionService":
+        return await self.start()
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+    async def watch(self, inbox: os.PathLike, interval: float = DEFAULT_POLL_INTERVAL,
+                    recursive: bool = False) -> None:
+        """Poll an inbox directory and enqueue every new or changed ticket file. A file
+        is enqueued once its size and modification time are the same in two polls,
+        so files still being copied are left for later. Runs until cancelled."""
+        if not os.path.isdir(inbox):
+            raise ValueError(f"File path {inbox} is not a directory")
+
+        logger.info(f"Watching {inbox} every {interval} seconds")
+        seen: Dict[pathlib.Path, FileSignature] = {}
+        enqueued: Dict[pathlib.Path, FileSignature] = {}
+        while True:
+            signatures = await asyncio.to_thread(_scan_inbox, inbox, recursive)
+            for file_path, signature in signatures.items():
+                if enqueued.get(file_path) == signature:
+                    continue
+                if seen.get(file_path) == signature:
+                    enqueued[file_path] = signature
+                    await self.enqueue(file_path)
+                seen[file_path] = signature
+            await asyncio.sleep(interval)
+
+    async def _parse_files(self) -> None:
+        """Parse task. Waits while the results queue is full."""
+        assert self._files is not None and self._results is not None
+        while True:
+            file_path = await self._files.get()
+            try:
+                result = await self._parse(file_path)
+                await self._results.put(result)
+            except Exception as e:
+                logger.error(f"Error parsing ticket {file_path}: {e}")
+                await self._results.put(ParseResult(file_path=file_path, error=f"{type(e).__name__}: {e}"))
+            finally:
+                self._files.task_done()
+
+    async def _parse(self, file_path: pathlib.Path) -> ParseResult:
+        """Parse a file in the executor, unless it is in the parse cache"""
+        digest, result = mercadona._cached_result(file_path, self.cache)
+        if result is not None:
+            return result
+
+        loop = asyncio.get_running_loop()
+        result, snapshot = await loop.run_in_executor(self._executor, functools.partial(
+            mercadona._parse_worker_file, file_path=file_path, engine=self.engine, mode=self.mode))
+        metrics.REGISTRY.merge(snapshot)
+        return mercadona._store_result(digest, result, self.cache)
+
+    async def _write_batches(self) -> None:
+        """Writer task"""
+        assert self._results is not None
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._write(batch)
+            except Exception:
+                logger.error(f"Error writing {len(batch)} tickets", exc_info=True)
+            finally:
+                for _ in batch:
+                    self._results.task_done()
+
+    async def _next_batch(self) -> List[ParseResult]:
+        """Wait for one result, then take more until the batch is full or times out"""
+        assert self._results is not None
+        loop = asyncio.get_running_loop()
+        batch = [await self._results.get()]
+        deadline = loop.time() + self.batch_timeout
+        while len(batch) < self.batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._results.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _write(self, batch: List[ParseResult]) -> None:
+        """Write the new tickets of a batch. The manifest only records the files once
+        their tickets are written, so a failed write is retried on the next run."""
+        tickets: List[Ticket] = []
+        written: List[ParseResult] = []
+        duplicates = 0
+        invoice_ids: Set[str] = set()
+        for result in batch:
+            if result.ticket is None:
+                self.report.failed += 1
+                metrics.increment(api.TICKETS_TOTAL, status="failed")
+                continue
+            invoice_id = result.ticket.invoice_id
+            if invoice_id in invoice_ids or (self.manifest is not None and self.manifest.has_invoice(invoice_id)):
+                logger.info(f"Skipping ticket {invoice_id}. Already written")
+                duplicates += 1
+            else:
+                invoice_ids.add(invoice_id)
+                tickets.append(result.ticket)
+            written.append(result)
+
+        loop = asyncio.get_running_loop()
+        if tickets:
+            try:
+                await loop.run_in_executor(self._write_executor, self._save, tickets)
+            except Exception:
+                self.report.failed += len(written)
+                metrics.increment(api.TICKETS_TOTAL, len(written), status="failed")
+                raise
+
+        self.report.new += len(tickets)
+        self.report.duplicates += duplicates
+        metrics.increment(api.TICKETS_TOTAL, len(tickets), status="new")
+        metrics.increment(api.TICKETS_TOTAL, duplicates, status="duplicated")
+        if self.manifest is not None and written:
+            await loop.run_in_executor(self._write_executor, self._record, written)
+        if self.progress is not None:
+            self.progress(self.report)
+
+    def _save(self, tickets: List[Ticket]) -> None:
+        """Save tickets and flush them to disk"""
+        self.writer.save_tickets(tickets)
+        self.writer.flush()  # type: ignore[attr-defined]
+
+    def _record(self, written: List[ParseResult]) -> None:
+        """Record the written files in the manifest and save it. Files are hashed here,
+        in the writer thread, not in the event loop."""
+        assert self.manifest is not None
+        for result in written:
+            self.manifest.record(result.file_path, result.ticket, sha256=result.sha256)
+        self.manifest.save()
+
+
+def _scan_inbox(inbox: os.PathLike, recursive: bool) -> Dict[pathlib.Path, FileSignature]:
+    """Size and modification time of every ticket file in the inbox"""
+    signatures = {}
+    for directory, _, file_names in os.walk(inbox):
+        for file_name in sorted(file_names):
+            file_path = pathlib.Path(directory, file_name)
+            if file_path.suffix not in mercadona.VALID_EXTENSIONS:
+                continue
+            try:
+                stat = file_path.stat()
+            except FileNotFoundError:
+                continue
+            signatures[file_path] = (stat.st_size, stat.st_mtime_ns)
+        if not recursive:
+            break
+    return signatures
@@ -1,7 +1,21 @@
-"""Strategies for reading tickets."""
+"""Strategies for reading tickets. Strategy modules are imported on first use."""
+from typing import TYPE_CHECKING
 
-# State strategy. PyPDF context
-from .statestrategy import StateParserStrategy, PyPDFParseContext
+from ticketreader.utils import lazy_attributes
 
-# Using Tabula - https://pypi.org/project/tabula-py/
-from .tabulastrategy import TabulaParserStrategy
+from .modes import ExtractionMode, PageSelection
+
+__getattr__, __dir__ = lazy_attributes(__name__, {
+    # State strategy. PyPDF context
+    "StateParserStrategy": ".statestrategy",
+    "PyPDFParseContext": ".statestrategy",
+    # Using Tabula - https://pypi.org/project/tabula-py/
+    "TabulaParserStrategy": ".tabulastrategy",
+    # Glyph positions read once with pypdf
+    "DocumentLayout": ".layout",
+})
+
+if TYPE_CHECKING:
+    from .statestrategy import StateParserStrategy, PyPDFParseContext
+    from .tabulastrategy import TabulaParserStrategy
+    from .layout import DocumentLayout
@@ -0,0 +1,347 @@
+"""Text layout module. It reads text positions from a PDF file once, through the pypdf
+text extraction visitors, so that the rows can be split into any number of column
+layouts in memory."""
+import io
+import os
+import csv
+import bisect
+import logging
+import functools
+from typing import Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+from pypdf import PdfReader, PageObject
+from pypdf.generic import ArrayObject, DictionaryObject
+
+logger = logging.getLogger(__name__)
+
+Matrix = List[float]
+
+DEFAULT_GLYPH_WIDTH = 500.0
+"""Glyph width (in thousandths of an em) used when the font does not define one"""
+
+
+def mult(m: Matrix, n: Matrix) -> Matrix:
+    """Multiply two PDF transformation matrices"""
+    return [
+        m[0] * n[0] + m[1] * n[2],
+        m[0] * n[1] + m[1] * n[3],
+        m[2] * n[0] + m[3] * n[2],
+        m[2] * n[1] + m[3] * n[3],
+        m[4] * n[0] + m[5] * n[2] + n[4],
+        m[4] * n[1] + m[5] * n[3] + n[5],
+    ]
+
+
+class Glyph(NamedTuple):
+    """Glyph placed on a page. Coordinates are measured from the top left corner."""
+    text: str
+    x: float
+    y: float
+    width: float
+    size: float
+
+
+Area = Tuple[float, float, float, float]
+"""Top, left, bottom and right, like the tabula area option"""
+
+DESCENT = 0.25
+"""Share of the font size below the baseline"""
+
+COLUMN_TOLERANCE = 0.01
+"""Distance to a column boundary within which a glyph is taken to be on it"""
+
+
+class TextRow(NamedTuple):
+    """Text of a row and its vertical extent, measured from the top"""
+    text: str
+    top: float
+    bottom: float
+
+
+class FontMetrics:
+    """Glyph widths of a font, by character code. Widths are in thousandths of an em."""
+
+    def __init__(self, font_dict: Optional[DictionaryObject]) -> None:
+        font_dict = font_dict.get_object() if font_dict is not None else DictionaryObject()
+        self.two_bytes = font_dict.get("/Subtype") == "/Type0"
+        self.widths: Dict[int, float] = {}
+        self.default_width = DEFAULT_GLYPH_WIDTH
+        if "/Widths" in font_dict:
+            first_char = int(font_dict.get("/FirstChar", 0))
+            for offset, width in enumerate(font_dict["/Widths"].get_object()):
+                self.widths[first_char + offset] = float(width)
+        elif "/DescendantFonts" in font_dict:
+            descendant = font_dict["/DescendantFonts"].get_object()[0].get_object()
+            self.default_width = float(descendant.get("/DW", 1000))
+            entries = list(descendant.get("/W", ArrayObject()).get_object())
+            while len(entries) > 1:
+                start, second = int(entries[0]), entries[1].get_object()
+                if isinstance(second, list):
+                    for offset, width in enumerate(second):
+                        self.widths[start + offset] = float(width)
+                    entries = entries[2:]
+                else:
+                    for code in range(start, int(second) + 1):
+                        self.widths[code] = float(entries[2])
+                    entries = entries[3:]
+
+    def codes(self, raw: bytes) -> List[int]:
+        """Character codes of a string operand"""
+        if self.two_bytes:
+            return [int.from_bytes(raw[index:index + 2], "big") for index in range(0, len(raw) - 1, 2)]
+        return list(raw)
+
+    def width(self, code: int) -> float:
+        return self.widths.get(code, self.default_width)
+
+
+class PageLayout:
+    """Glyphs of a single page"""
+
+    def __init__(self, number: int, mediabox: Tuple[float, float, float, float], glyphs: List[Glyph]) -> None:
+        self.number = number
+        """Page number, starting at 1 like tabula"""
+        self.mediabox = mediabox
+        self.glyphs = glyphs
+
+    @property
+    def area(self) -> Area:
+        """Page area in the same order used for the tabula area option"""
+        box = self.mediabox
+        return box[1], box[0], box[3], box[2]
+
+    @functools.cached_property
+    def rows(self) -> List[List[Glyph]]:
+        """Glyphs grouped in text rows, sorted top to bottom and left to right"""
+        rows: List[List[Glyph]] = []
+        row_y: Optional[float] = None
+        for glyph in sorted(self.glyphs, key=lambda g: (round(g.y, 1), g.x)):
+            if row_y is None or glyph.y - row_y > glyph.size / 2:
+                rows.append([])
+                row_y = glyph.y
+            rows[-1].append(glyph)
+        for row in rows:
+            row.sort(key=lambda g: g.x)
+        return [row for row in rows if not all(glyph.text.isspace() for glyph in row)]
+
+    @functools.cached_property
+    def text_rows(self) -> List[TextRow]:
+        """Text and extent of every row, in the same order as rows"""
+        return [TextRow(text=_join_glyphs(row),
+                        top=min(glyph.y - glyph.size for glyph in row),
+                        bottom=max(glyph.y + glyph.size * DESCENT for glyph in row))
+                for row in self.rows]
+
+    def gap_above(self, index: int) -> float:
+        """Vertical position halfway between a row and the one above it"""
+        rows = self.text_rows
+        if index == 0:
+            return self.area[0]
+        return (rows[index - 1].bottom + rows[index].top) / 2
+
+    def gap_below(self, index: int) -> float:
+        """Vertical position halfway between a row and the one below it"""
+        rows = self.text_rows
+        if index == len(rows) - 1:
+            return self.area[2]
+        return (rows[index].bottom + rows[index + 1].top) / 2
+
+    @classmethod
+    def from_page(cls, number: int, page: PageObject) -> "PageLayout":
+        """Read text positions from a pypdf page, through the visitors of its text extraction"""
+        box = page.mediabox
+        mediabox = (float(box[0]), float(box[1]), float(box[2]), float(box[3]))
+        collector = _TextCollector(page_top=mediabox[3])
+        page.extract_text(visitor_operand_after=collector.operand, visitor_text=collector.text)
+        return cls(number=number, mediabox=mediabox, glyphs=collector.glyphs)
+
+
+class DocumentLayout:
+    """Glyphs of every page of a PDF file"""
+
+    def __init__(self, pages: List[PageLayout]) -> None:
+        self.pages = pages
+
+    @classmethod
+    def from_pdf(cls, file_path: Union[os.PathLike, str]) -> "DocumentLayout":
+        """Open the PDF file once and read every page"""
+        reader = PdfReader(file_path)
+        return cls(pages=[PageLayout.from_page(number, page)
+                          for number, page in enumerate(reader.pages, start=1)])
+
+    def to_dataframe(self, columns: Sequence[float], areas: Optional[Mapping[int, Area]] = None) -> pd.DataFrame:
+        """Split the cached rows using the column boundaries. The result has the same
+        shape as tabula.read_pdf(..., columns=columns, pandas_options={'header': None}).
+        Areas map page numbers, starting at 1 like in tabula, to the area read from
+        each page; every whole page by default."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if areas is None:
+            areas = {page.number: page.area for page in self.pages}
+        for number, (top, _, bottom, _) in areas.items():
+            page = self.pages[number - 1]
+            for row, text_row in zip(page.rows, page.text_rows):
+                if not top <= (text_row.top + text_row.bottom) / 2 <= bottom:
+                    continue
+                cells = _split_row(row, columns)
+                if any(cells):
+                    writer.writerow(cells)
+
+        buffer.seek(0)
+        if not buffer.getvalue():
+            return pd.DataFrame(columns=range(len(columns)))
+        return pd.read_csv(buffer, header=None, names=range(len(columns)))
+
+
+def _split_row(row: List[Glyph], columns: Sequence[float]) -> List[str]:
+    """Split a row of glyphs in cells like tabula: a word goes to the column where its
+    left edge is, and it only moves on to the next column when a boundary lies between
+    the left edges of two of its glyphs."""
+    cells: List[List[Glyph]] = [[] for _ in columns]
+    last = len(columns) - 1
+    index = 0
+    previous: Optional[Glyph] = None
+    for glyph in row:
+        left = bisect.bisect_left(columns, glyph.x - COLUMN_TOLERANCE)
+        if previous is None or _has_gap(previous, glyph) or \
+                left > bisect.bisect_right(columns, previous.x + COLUMN_TOLERANCE):
+            index = min(left, last)
+        cells[index].append(glyph)
+        previous = glyph
+    return [_join_glyphs(cell) for cell in cells]
+
+
+def _has_gap(previous: Glyph, glyph: Glyph) -> bool:
+    """Whether two glyphs are apart enough to read a space between them"""
+    return glyph.x - (previous.x + previous.width) > glyph.size * 0.3
+
+
+def _join_glyphs(glyphs: List[Glyph]) -> str:
+    """Join glyphs of a cell adding the spaces that are only present as gaps"""
+    text = ""
+    previous: Optional[Glyph] = None
+    for glyph in glyphs:
+        if previous is not None and not (glyph.text.isspace() or previous.text.isspace()) and \
+                _has_gap(previous, glyph):
+            text += " "
+        text += glyph.text
+        previous = glyph
+    return text.strip()
+
+
+class _ShowText(NamedTuple):
+    """Text showing operation: its text matrix and its strings, with the TJ offsets"""
+    matrix: Matrix
+    items: List[Union[bytes, float]]
+
+
+class _Slot(NamedTuple):
+    """Place of a character code shown on the page, in PDF coordinates"""
+    x: float
+    y: float
+    width: float
+    size: float
+    boundary: bool
+    """First code of an operation or of a TJ string after an offset"""
+    space: bool
+
+
+class _TextCollector:
+    """Places the text given by the pypdf text extraction visitors. pypdf gives the
+    decoded text of every run and the matrix where it starts; the glyphs of a run are
+    placed from the font widths of their character codes, following the matrix of
+    every text showing operation in the run."""
+
+    def __init__(self, page_top: float) -> None:
+        self.page_top = page_top
+        self.glyphs: List[Glyph] = []
+        self._pending: List[_ShowText] = []
+        self._metrics: Dict[int, FontMetrics] = {}
+        self._last_matrix: Optional[Matrix] = None
+        self._last_advance = 0.0
+
+    def operand(self, operator: bytes, operands: list, cm: Matrix, tm: Matrix) -> None:
+        """visitor_operand_after. Keeps the operations that show text until pypdf
+        gives their decoded text."""
+        if operator in (b"Tj", b"'"):
+            items = [operands[0]]
+        elif operator == b'"':
+            items = [operands[2]]
+        elif operator == b"TJ":
+            items = list(operands[0])
+        else:
+            if operator == b"BT":
+                self._last_matrix = None
+            return
+        self._pending.append(_ShowText(matrix=mult(tm, cm), items=[
+            float(item) if isinstance(item, (int, float)) else _raw_bytes(item) for item in items]))
+
+    def text(self, text: str, cm: Matrix, tm: Matrix, font_dict: Optional[DictionaryObject],
+             font_size: float) -> None:
+        """visitor_text. Places the glyphs of a run of text."""
+        pending, self._pending = self._pending, []
+        text = text.rstrip("\n")
+        if not text.strip() or not pending:
+            return
+
+        metrics = self._font_metrics(font_dict)
+        slots = self._slots(pending, metrics, font_size)
+        if not slots:
+            return
+        slot = 0
+        for position, char in enumerate(text):
+            current = slots[min(slot, len(slots) - 1)]
+            if char.isspace() and slot < len(slots) and current.boundary and not current.space and (
+                    not metrics.two_bytes or len(text) - position > len(slots) - slot):
+                # Space added by pypdf between two operations, it takes no slot: the
+                # gap between the glyphs tells whether the text has a space there
+                continue
+            slot += 1
+            self.glyphs.append(Glyph(text=" " if char.isspace() else char, x=current.x, y=self.page_top - current.y,
+                                     width=current.width, size=current.size))
+
+    def _font_metrics(self, font_dict: Optional[DictionaryObject]) -> FontMetrics:
+        key = id(font_dict)
+        if key not in self._metrics:
+            try:
+                self._metrics[key] = FontMetrics(font_dict)
+            except Exception:
+                logger.debug("Font widths could not be read", exc_info=True)
+                self._metrics[key] = FontMetrics(None)
+        return self._metrics[key]
+
+    def _slots(self, pending: List[_ShowText], metrics: FontMetrics, font_size: float) -> List[_Slot]:
+        """Slot of every character code shown by the operations. pypdf does not move
+        the text matrix past the text shown, so an operation with the same matrix as
+        the previous one goes on where it ended."""
+        slots = []
+        for operation in pending:
+            matrix = operation.matrix
+            advance = self._last_advance if matrix == self._last_matrix else 0.0
+            size = font_size * (matrix[2] ** 2 + matrix[3] ** 2) ** 0.5
+            boundary = True
+            for item in operation.items:
+                if isinstance(item, float):
+                    advance -= item / 1000 * font_size
+                    boundary = True
+                    continue
+                for code in metrics.codes(item):
+                    width = metrics.width(code) / 1000 * font_size
+                    slots.append(_Slot(x=matrix[4] + advance * matrix[0], y=matrix[5] + advance * matrix[1],
+                                       width=width * matrix[0], size=size, boundary=boundary,
+                                       space=code == 32 and not metrics.two_bytes))
+                    advance += width
+                    boundary = False
+            self._last_matrix = matrix
+            self._last_advance = advance
+        return slots
+
+
+def _raw_bytes(operand) -> bytes:
+    """Bytes of a string operand, before any decoding"""
+    if hasattr(operand, "get_original_bytes"):
+        return operand.get_original_bytes()
+    if isinstance(operand, str):
+        return operand.encode("latin-1", "replace")
+    return bytes(operand)
@@ -0,0 +1,20 @@
+"""Strategy options. Kept apart from the strategies so they can be used without
+importing pandas, tabula or pypdf."""
+from enum import Enum
+
+
+class ExtractionMode(str, Enum):
+    """Extraction mode"""
+    TABULA = 'tabula'
+    """One tabula-py call per column layout"""
+    SINGLE_PASS = 'single_pass'
+    """Read glyph positions once and split them in every column layout in memory"""
+
+
+class PageSelection(str, Enum):
+    """Pages a column layout is extracted from"""
+    ALL = 'all'
+    FIRST = 'first'
+    """Only the first page, e.g. for the ticket header"""
+    LAST = 'last'
+    """Only the last page, e.g. for the tax summary"""
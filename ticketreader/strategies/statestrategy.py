@@ -1,10 +1,11 @@
 """State strategy module.  https://refactoring.guru/design-patterns/state"""
 import abc
 import logging
-from typing import Type
+from typing import Dict, Iterator, Type
 
 from pypdf import PdfReader, PageObject
 
+from ticketreader import metrics
 from ticketreader.parser import ParserStrategy
 from ticketreader.utils import FileHandlerMixin
 
@@ -66,6 +67,8 @@ class ParseContext(abc.ABC):
     INITIAL_STATE: Type[ParseState]
 
     def __init__(self, *args, **kwargs) -> None:
+        self._states: Dict[Type[ParseState], ParseState] = {}
+        """State instances, created once and reused on every transition"""
         self.change_state(self.INITIAL_STATE)
 
     @property
@@ -75,12 +78,20 @@ class ParseContext(abc.ABC):
 
     def change_state(self, state_type: Type[ParseState]) -> None:
         """Change state"""
+        state = self._states.get(state_type)
+        if state is None:
+            if not issubclass(state_type, ParseState):
+                raise TypeError(f"State must be a {ParseState.__name__}")
 
-        if not issubclass(state_type, ParseState):
-            raise TypeError(f"State must be a {ParseState.__name__}")
+            state = state_type()
+            state.context = self
+            self._states[state_type] = state
 
-        self._state = state_type()
-        self.state.context = self
+        self._state = state
+
+    def reset(self) -> None:
+        """Go back to the initial state so the context can parse another file"""
+        self.change_state(self.INITIAL_STATE)
 
     def parse(self, *args, **kwargs) -> None:
         """Parse file"""
@@ -92,17 +103,30 @@ class PyPDFParseContext(ParseContext, FileHandlerMixin):
 
     def parse(self, *args, **kwargs) -> None:
         """Parse file"""
-        reader = PdfReader(self.file_path)
+        with metrics.stage("pdf_open"):
+            reader = PdfReader(self.file_path)
         for page_num, page in enumerate(reader.pages):
             self._parse_page(page_num=page_num, page=page)
 
     def _parse_page(self, page_num: int, page: PageObject) -> None:
         """Parse page"""
 
-        text = page.extract_text(space_width=0.5)
-        lines = text.split("\n")
+        with metrics.stage("text_extract"):
+            text = page.extract_text(space_width=0.5)
+
+        logger.debug(f"parsing page {page_num}")
+
+        for line_num, line in enumerate(iter_lines(text)):
+            self.state.parse(line=line.strip(), line_num=line_num)
 
-        logger.debug(f"parsing page {page_num} with {len(lines)} lines")
 
-        for line_num, line in enumerate(lines):
-            self.state.parse(line=line, line_num=line_num)
+def iter_lines(text: str) -> Iterator[str]:
+    """Iterate the lines of a text without splitting it in a list"""
+    start = 0
+    while True:
+        end = text.find("\n", start)
+        if end == -1:
+            yield text[start:]
+            return
+        yield text[start:end]
+        start = end + 1
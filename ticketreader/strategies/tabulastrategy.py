@@ -2,51 +2,117 @@
 import functools
 import logging
 
-from typing import Tuple, List, TypeAlias
+from typing import Dict, Tuple, List, Optional, TypeAlias
 
 import pandas as pd
 import tabula.io as tabula
 from pypdf import PdfReader
 
+from ticketreader import metrics
 from ticketreader.utils import FileHandlerMixin
 from ticketreader.parser import ParserStrategy
 from ticketreader.utils import log_time
 
+from .layout import DocumentLayout
+from .modes import ExtractionMode, PageSelection
+
 TicketColumns: TypeAlias = Tuple[float, float, float, float]
+PageArea: TypeAlias = Tuple[float, float, float, float]
 logger = logging.getLogger(__name__)
 
 
 class TabulaParserStrategy(ParserStrategy, FileHandlerMixin):
     """Parser strategy based using tabula-py"""
 
-    def __init__(self, columns: List[TicketColumns]) -> None:
+    def __init__(self, columns: List[TicketColumns], mode: ExtractionMode = ExtractionMode.TABULA,
+                 pages: Optional[List[PageSelection]] = None) -> None:
         self.columns = columns
+        self.pages = pages or [PageSelection.ALL] * len(columns)
+        """Pages every column layout is extracted from"""
+        self.mode = mode
 
     @log_time(logger_name=__name__)
     def get_dataframes(self, **kwargs) -> List[pd.DataFrame]:
         """Get dataframe from PDF file using tabula-py"""
-        return [self._get_dataframe(columns=columns, **kwargs) for columns in self.columns]
+        return [self._get_dataframe(columns=columns, areas=self.layout_areas(index), **kwargs)
+                for index, columns in enumerate(self.columns)]
 
-    def _get_dataframe(self, columns: TicketColumns, **kwargs) -> pd.DataFrame:
-        """Get dataframe from PDF file using tabula-py"""
-        dataframes = tabula.read_pdf(
-            input_path=self.file_path,
-            pages='all',
-            pandas_options={'header': None},
-            multiple_tables=False,
-            area=self.get_document_size,
-            columns=columns,
-            silent=True,
-            **kwargs
-        )
-        if isinstance(dataframes, List):
+    @functools.cached_property
+    def layout(self) -> DocumentLayout:
+        """Glyph positions of the whole document, read once"""
+        with metrics.stage("layout_extract"):
+            return DocumentLayout.from_pdf(self.file_path)
+
+    def layout_areas(self, index: int) -> Dict[int, PageArea]:
+        """Pages and areas a column layout is read from, by page number. Subclasses can
+        crop them to the part of the document the layout applies to."""
+        return self.selection_areas(self.pages[index])
+
+    def selection_areas(self, pages: PageSelection) -> Dict[int, PageArea]:
+        """Whole page areas of a page selection, by page number starting at 1"""
+        count = len(self.page_areas)
+        if pages == PageSelection.FIRST:
+            numbers = [1]
+        elif pages == PageSelection.LAST:
+            numbers = [count]
+        else:
+            numbers = list(range(1, count + 1))
+        return {number: self.page_areas[number - 1] for number in numbers}
+
+    def _get_dataframe(self, columns: TicketColumns, areas: Dict[int, PageArea], **kwargs) -> pd.DataFrame:
+        """Get dataframe of the given page areas. Consecutive pages with the same area
+        are read in one tabula-py call."""
+        if self.mode == ExtractionMode.SINGLE_PASS:
+            with metrics.stage("layout_table"):
+                return self.layout.to_dataframe(columns=columns, areas=areas)
+
+        dataframes = []
+        for group, area in _page_groups(areas):
+            with metrics.stage("tabula_extract"):
+                result = tabula.read_pdf(
+                    input_path=self.file_path,
+                    pages=group,
+                    pandas_options={'header': None},
+                    multiple_tables=False,
+                    area=area,
+                    columns=columns,
+                    silent=True,
+                    **kwargs
+                )
+            if not isinstance(result, List):
+                raise ValueError("Dataframe is not a pandas.DataFrame")
+            dataframes.extend(result)
+
+        if not dataframes:
+            # One column per boundary, like the tables read when the last boundary is the page edge
+            return pd.DataFrame(columns=range(len(columns)))
+        if len(dataframes) == 1:
             return dataframes[0]
-        raise ValueError("Dataframe is not a pandas.DataFrame")
+        return pd.concat(dataframes, ignore_index=True)
 
     @functools.cached_property
-    def get_document_size(self) -> Tuple[float, float, float, float]:
-        """Get document size"""
-        reader = PdfReader(self.file_path)
-        ticket = reader.pages[0]
-        box = ticket.mediabox
-        return box[1], box[0], box[3], box[2]
+    def page_areas(self) -> List[PageArea]:
+        """Area of every page, from its own mediabox. The layout is used when it is
+        already read, so the file is not opened again."""
+        if self.mode == ExtractionMode.SINGLE_PASS or "layout" in self.__dict__:
+            return [page.area for page in self.layout.pages]
+        with metrics.stage("pdf_open"):
+            reader = PdfReader(self.file_path)
+            boxes = [page.mediabox for page in reader.pages]
+        return [(float(box[1]), float(box[0]), float(box[3]), float(box[2])) for box in boxes]
+
+    @property
+    def get_document_size(self) -> PageArea:
+        """Get document size, the area of the first page"""
+        return self.page_areas[0]
+
+
+def _page_groups(areas: Dict[int, PageArea]) -> List[Tuple[List[int], PageArea]]:
+    """Split pages in runs of consecutive pages with the same area"""
+    groups: List[Tuple[List[int], PageArea]] = []
+    for number, area in areas.items():
+        if groups and groups[-1][1] == area and groups[-1][0][-1] == number - 1:
+            groups[-1][0].append(number)
+        else:
+            groups.append(([number], area))
+    return groups
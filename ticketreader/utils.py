@@ -1,9 +1,14 @@
 """Utils module"""
 import os
+import hashlib
+import functools
 import pathlib
 import logging
+import importlib
+from typing import Any, Callable, List, Mapping, Tuple
 
 from ticketreader import exceptions
+from ticketreader import metrics
 
 class FileHandlerMixin():
     """File handler mixin"""
@@ -43,7 +48,35 @@ class FileHandlerMixin():
         if file_extension not in self.VALID_EXTENSIONS:
             raise exceptions.WrongFileExtension(f"File extension {file_extension} not valid. Valid extensions are: {self.VALID_EXTENSIONS}")
         
+def file_digest(file_path: os.PathLike, salt: bytes = b"") -> str:
+    """SHA-256 hex digest of the file contents, optionally salted"""
+    digest = hashlib.sha256(salt)
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def lazy_attributes(package: str, attributes: Mapping[str, str]) -> Tuple[Callable[[str], Any], Callable[[], List[str]]]:
+    """Module __getattr__ and __dir__ (PEP 562) that import attributes from their
+    submodule on first access. Attributes map names to relative module names."""
+    module_globals = importlib.import_module(package).__dict__
+
+    def __getattr__(name: str) -> Any:
+        if name not in attributes:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        value = getattr(importlib.import_module(attributes[name], package), name)
+        module_globals[name] = value
+        return value
+
+    def __dir__() -> List[str]:
+        return sorted(set(module_globals) | set(attributes))
+
+    return __getattr__, __dir__
+
+
 def log_time(logger_name:str):
+    """Timer decorator. Every call is logged and recorded in the function timings histogram."""
 
     logger = logging.getLogger(logger_name)
 
@@ -51,14 +84,17 @@ def log_time(logger_name:str):
         """Timer decorator"""
         import time
 
+        @functools.wraps(func)
         def wrapper(*args, **kwargs):
             """Wrapper"""
             start = time.perf_counter()
-            result = func(*args, **kwargs)
-            end = time.perf_counter()
-            logger.info(f"{func.__name__} took {end - start:.2f} seconds")
-            return result
-        
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                metrics.REGISTRY.observe(metrics.FUNCTION_SECONDS, elapsed, function=func.__qualname__)
+                logger.info(f"{func.__name__} took {elapsed:.2f} seconds")
+
         return wrapper
     
-    return timer
\ No newline at end of file
+    return timer